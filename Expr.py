@@ -1,22 +1,31 @@
 from typing import List
 
 from plox_token import PloxToken
+from inline_cache import InlineCache
 
 class Expr:
+	__slots__ = ()
+
 	def accept(self, visitor):
 		pass
 
 
 class Assign(Expr):
+	__slots__ = ("name", "value", "depth", "slot",)
+
 	def __init__(self, name: PloxToken, value: Expr):
 		self.name = name
 		self.value = value
+		self.depth = None
+		self.slot = None
 
 	def accept(self, visitor):
 		return visitor.visitAssign(self)
 
 
 class Binary(Expr):
+	__slots__ = ("left", "operator", "right",)
+
 	def __init__(self, left: Expr, operator: PloxToken, right: Expr):
 		self.left = left
 		self.operator = operator
@@ -27,6 +36,8 @@ class Binary(Expr):
 
 
 class Grouping(Expr):
+	__slots__ = ("expression",)
+
 	def __init__(self, expression: Expr):
 		self.expression = expression
 
@@ -35,6 +46,8 @@ class Grouping(Expr):
 
 
 class Literal(Expr):
+	__slots__ = ("value",)
+
 	def __init__(self, value: object):
 		self.value = value
 
@@ -43,6 +56,8 @@ class Literal(Expr):
 
 
 class ListExpr(Expr):
+	__slots__ = ("values",)
+
 	def __init__(self, values: List[Expr]):
 		self.values = values
 
@@ -51,6 +66,8 @@ class ListExpr(Expr):
 
 
 class Logical(Expr):
+	__slots__ = ("left", "operator", "right",)
+
 	def __init__(self, left: Expr, operator: PloxToken, right: Expr):
 		self.left = left
 		self.operator = operator
@@ -61,6 +78,8 @@ class Logical(Expr):
 
 
 class Unary(Expr):
+	__slots__ = ("operator", "right",)
+
 	def __init__(self, operator: PloxToken, right: Expr):
 		self.operator = operator
 		self.right = right
@@ -70,6 +89,8 @@ class Unary(Expr):
 
 
 class Subscriptable(Expr):
+	__slots__ = ("subscribee", "index",)
+
 	def __init__(self, subscribee: Expr, index: Expr):
 		self.subscribee = subscribee
 		self.index = index
@@ -79,6 +100,8 @@ class Subscriptable(Expr):
 
 
 class Call(Expr):
+	__slots__ = ("callee", "paren", "arguments",)
+
 	def __init__(self, callee: Expr, paren: PloxToken, arguments: List[Expr]):
 		self.callee = callee
 		self.paren = paren
@@ -88,43 +111,97 @@ class Call(Expr):
 		return visitor.visitCall(self)
 
 
+class Invoke(Expr):
+	__slots__ = ("obj", "name", "paren", "arguments", "cache",)
+
+	def __init__(self, obj: Expr, name: PloxToken, paren: PloxToken, arguments: List[Expr]):
+		self.obj = obj
+		self.name = name
+		self.paren = paren
+		self.arguments = arguments
+		self.cache = InlineCache()
+
+	def accept(self, visitor):
+		return visitor.visitInvoke(self)
+
+	def __getstate__(self):
+		return {name: getattr(self, name) for name in ("obj", "name", "paren", "arguments",)}
+
+	def __setstate__(self, state):
+		for name, value in state.items():
+			setattr(self, name, value)
+		self.cache = InlineCache()
+
+
 class Get(Expr):
+	__slots__ = ("obj", "name", "cache",)
+
 	def __init__(self, obj: Expr, name: PloxToken):
 		self.obj = obj
 		self.name = name
+		self.cache = InlineCache()
 
 	def accept(self, visitor):
 		return visitor.visitGet(self)
 
+	def __getstate__(self):
+		return {name: getattr(self, name) for name in ("obj", "name",)}
+
+	def __setstate__(self, state):
+		for name, value in state.items():
+			setattr(self, name, value)
+		self.cache = InlineCache()
+
 
 class Set(Expr):
+	__slots__ = ("obj", "name", "value", "cache",)
+
 	def __init__(self, obj: Expr, name: PloxToken, value: Expr):
 		self.obj = obj
 		self.name = name
 		self.value = value
+		self.cache = InlineCache()
 
 	def accept(self, visitor):
 		return visitor.visitSet(self)
 
+	def __getstate__(self):
+		return {name: getattr(self, name) for name in ("obj", "name", "value",)}
+
+	def __setstate__(self, state):
+		for name, value in state.items():
+			setattr(self, name, value)
+		self.cache = InlineCache()
+
 
 class Parent(Expr):
+	__slots__ = ("keyword", "method", "depth", "slot",)
+
 	def __init__(self, keyword: PloxToken, method: PloxToken):
 		self.keyword = keyword
 		self.method = method
+		self.depth = None
+		self.slot = None
 
 	def accept(self, visitor):
 		return visitor.visitParent(self)
 
 
 class This(Expr):
+	__slots__ = ("keyword", "depth", "slot",)
+
 	def __init__(self, keyword: PloxToken):
 		self.keyword = keyword
+		self.depth = None
+		self.slot = None
 
 	def accept(self, visitor):
 		return visitor.visitThis(self)
 
 
 class Conditional(Expr):
+	__slots__ = ("condition", "then_clause", "else_clause",)
+
 	def __init__(self, condition: Expr, then_clause: Expr, else_clause: Expr):
 		self.condition = condition
 		self.then_clause = then_clause
@@ -135,23 +212,128 @@ class Conditional(Expr):
 
 
 class Variable(Expr):
+	__slots__ = ("name", "depth", "slot",)
+
 	def __init__(self, name: PloxToken):
 		self.name = name
+		self.depth = None
+		self.slot = None
 
 	def accept(self, visitor):
 		return visitor.visitVariable(self)
 
 
 class FuncExpr(Expr):
+	__slots__ = ("params", "body", "type", "size",)
+
 	def __init__(self, params: List[PloxToken], body: list, type: str):
 		self.params = params
 		self.body = body
 		self.type = type
+		self.size = 0
 
 	def accept(self, visitor):
 		return visitor.visitFuncExpr(self)
 
 
+class Add(Binary):
+	__slots__ = ()
+
+	def accept(self, visitor):
+		return visitor.visitAdd(self)
+
+
+class Subtract(Binary):
+	__slots__ = ()
+
+	def accept(self, visitor):
+		return visitor.visitSubtract(self)
+
+
+class Multiply(Binary):
+	__slots__ = ()
+
+	def accept(self, visitor):
+		return visitor.visitMultiply(self)
+
+
+class Divide(Binary):
+	__slots__ = ()
+
+	def accept(self, visitor):
+		return visitor.visitDivide(self)
+
+
+class Greater(Binary):
+	__slots__ = ()
+
+	def accept(self, visitor):
+		return visitor.visitGreater(self)
+
+
+class GreaterEqual(Binary):
+	__slots__ = ()
+
+	def accept(self, visitor):
+		return visitor.visitGreaterEqual(self)
+
+
+class Less(Binary):
+	__slots__ = ()
+
+	def accept(self, visitor):
+		return visitor.visitLess(self)
+
+
+class LessEqual(Binary):
+	__slots__ = ()
+
+	def accept(self, visitor):
+		return visitor.visitLessEqual(self)
+
+
+class Equal(Binary):
+	__slots__ = ()
+
+	def accept(self, visitor):
+		return visitor.visitEqual(self)
+
+
+class NotEqual(Binary):
+	__slots__ = ()
+
+	def accept(self, visitor):
+		return visitor.visitNotEqual(self)
+
+
+class And(Logical):
+	__slots__ = ()
+
+	def accept(self, visitor):
+		return visitor.visitAnd(self)
+
+
+class Or(Logical):
+	__slots__ = ()
+
+	def accept(self, visitor):
+		return visitor.visitOr(self)
+
+
+class Negate(Unary):
+	__slots__ = ()
+
+	def accept(self, visitor):
+		return visitor.visitNegate(self)
+
+
+class Not(Unary):
+	__slots__ = ()
+
+	def accept(self, visitor):
+		return visitor.visitNot(self)
+
+
 class ExprVisitor:
 	def visitAssign(self, expr: Assign):
 		raise NotImplementedError
@@ -180,6 +362,9 @@ class ExprVisitor:
 	def visitCall(self, expr: Call):
 		raise NotImplementedError
 
+	def visitInvoke(self, expr: Invoke):
+		raise NotImplementedError
+
 	def visitGet(self, expr: Get):
 		raise NotImplementedError
 
@@ -201,3 +386,45 @@ class ExprVisitor:
 	def visitFuncExpr(self, expr: FuncExpr):
 		raise NotImplementedError
 
+	def visitAdd(self, expr: Add):
+		return self.visitBinary(expr)
+
+	def visitSubtract(self, expr: Subtract):
+		return self.visitBinary(expr)
+
+	def visitMultiply(self, expr: Multiply):
+		return self.visitBinary(expr)
+
+	def visitDivide(self, expr: Divide):
+		return self.visitBinary(expr)
+
+	def visitGreater(self, expr: Greater):
+		return self.visitBinary(expr)
+
+	def visitGreaterEqual(self, expr: GreaterEqual):
+		return self.visitBinary(expr)
+
+	def visitLess(self, expr: Less):
+		return self.visitBinary(expr)
+
+	def visitLessEqual(self, expr: LessEqual):
+		return self.visitBinary(expr)
+
+	def visitEqual(self, expr: Equal):
+		return self.visitBinary(expr)
+
+	def visitNotEqual(self, expr: NotEqual):
+		return self.visitBinary(expr)
+
+	def visitAnd(self, expr: And):
+		return self.visitLogical(expr)
+
+	def visitOr(self, expr: Or):
+		return self.visitLogical(expr)
+
+	def visitNegate(self, expr: Negate):
+		return self.visitUnary(expr)
+
+	def visitNot(self, expr: Not):
+		return self.visitUnary(expr)
+
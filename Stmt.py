@@ -5,107 +5,142 @@ from Expr import Expr
 
 
 class Stmt:
+	__slots__ = ()
+
 	def accept(self, visitor):
 		pass
 
 
 class Expression(Stmt):
-	def __init__(self, expression: Expr):
+	__slots__ = ("expression", "line",)
+
+	def __init__(self, expression: Expr, line: int):
 		self.expression = expression
+		self.line = line
 
 	def accept(self, visitor):
 		return visitor.visitExpression(self)
 
 
 class If(Stmt):
-	def __init__(self, condition: Expr, thenBranch: Stmt, elseBranch: Stmt):
+	__slots__ = ("condition", "thenBranch", "elseBranch", "line",)
+
+	def __init__(self, condition: Expr, thenBranch: Stmt, elseBranch: Stmt, line: int):
 		self.condition = condition
 		self.thenBranch = thenBranch
 		self.elseBranch = elseBranch
+		self.line = line
 
 	def accept(self, visitor):
 		return visitor.visitIf(self)
 
 
 class While(Stmt):
-	def __init__(self, condition: Expr, body: Stmt):
+	__slots__ = ("condition", "body", "line",)
+
+	def __init__(self, condition: Expr, body: Stmt, line: int):
 		self.condition = condition
 		self.body = body
+		self.line = line
 
 	def accept(self, visitor):
 		return visitor.visitWhile(self)
 
 
 class Print(Stmt):
-	def __init__(self, expression: Expr):
+	__slots__ = ("expression", "line",)
+
+	def __init__(self, expression: Expr, line: int):
 		self.expression = expression
+		self.line = line
 
 	def accept(self, visitor):
 		return visitor.visitPrint(self)
 
 
 class Block(Stmt):
+	__slots__ = ("statements", "size",)
+
 	def __init__(self, statements: List[Stmt]):
 		self.statements = statements
+		self.size = 0
 
 	def accept(self, visitor):
 		return visitor.visitBlock(self)
 
 
 class Var(Stmt):
+	__slots__ = ("name", "Initializer", "slot",)
+
 	def __init__(self, name: PloxToken, Initializer: Expr):
 		self.name = name
 		self.Initializer = Initializer
+		self.slot = None
 
 	def accept(self, visitor):
 		return visitor.visitVar(self)
 
 
 class Function(Stmt):
+	__slots__ = ("name", "function", "slot",)
+
 	def __init__(self, name: PloxToken, function: Expr):
 		self.name = name
 		self.function = function
+		self.slot = None
 
 	def accept(self, visitor):
 		return visitor.visitFunction(self)
 
 
 class Return(Stmt):
+	__slots__ = ("keyword", "value", "tail_call",)
+
 	def __init__(self, keyword: PloxToken, value: Expr):
 		self.keyword = keyword
 		self.value = value
+		self.tail_call = False
 
 	def accept(self, visitor):
 		return visitor.visitReturn(self)
 
 
 class Break(Stmt):
-	def __init__(self):
-		pass
+	__slots__ = ("line",)
+
+	def __init__(self, line: int):
+		self.line = line
 
 	def accept(self, visitor):
 		return visitor.visitBreak(self)
 
 
 class Continue(Stmt):
-	def __init__(self):
-		pass
+	__slots__ = ("line",)
+
+	def __init__(self, line: int):
+		self.line = line
 
 	def accept(self, visitor):
 		return visitor.visitContinue(self)
 
 
 class ClassStmt(Stmt):
+	__slots__ = ("name", "parentclass", "methods", "slot",)
+
 	def __init__(self, name: PloxToken, parentclass: Expr, methods: List[Function]):
 		self.name = name
 		self.parentclass = parentclass
 		self.methods = methods
+		self.slot = None
 
 	def accept(self, visitor):
 		return visitor.visitClassStmt(self)
 
 
 class Empty(Stmt):
+	__slots__ = ()
+
 	def __init__(self):
 		pass
 
@@ -0,0 +1,524 @@
+from typing import List, Dict, Tuple, Optional
+
+from Expr import *
+from Expr import Assign
+from Stmt import *
+from Stmt import Expression, Var
+from plox_token import PloxToken
+from tokenType import TokenType as TT
+
+
+# Instruction set. Operands follow their opcode inline in the code list.
+(
+    CONSTANT,       # const index                push constants[k]
+    NIL, TRUE, FALSE,
+    POP,
+    GET_LOCAL,      # slot
+    SET_LOCAL,      # slot                       assign, value stays on stack
+    STORE_LOCAL,    # slot                       pop into slot
+    NEW_CELL,       # slot                       fresh cell for a captured local
+    GET_CELL,       # slot
+    SET_CELL,       # slot
+    STORE_CELL,     # slot
+    GET_UPVALUE,    # upvalue index
+    SET_UPVALUE,    # upvalue index
+    GET_GLOBAL,     # const index (name token)
+    SET_GLOBAL,     # const index (name token)
+    DEFINE_GLOBAL,  # const index (name token)
+    GET_PROPERTY,   # const index (Get node)     the node doubles as the site's inline cache
+    CHECK_INSTANCE, # const index (name token)   error unless the top of stack is an instance
+    SET_PROPERTY,   # const index (Set node)
+    GET_METHOD,     # const index (Invoke node)  pushes callee and receiver
+    GET_PARENT,     # const index (method token)
+    EQUAL, NOT_EQUAL,
+    GREATER, GREATER_EQUAL, LESS, LESS_EQUAL,
+    ADD,
+    SUBTRACT,       # const index (operator token)
+    MULTIPLY,       # const index (operator token)
+    DIVIDE,         # const index (operator token)
+    NOT,
+    NEGATE,         # const index (operator token)
+    PRINT,
+    REPL_PRINT,
+    JUMP,           # target
+    JUMP_IF_FALSE,  # target                     leaves the condition on the stack
+    JUMP_IF_TRUE,   # target                     leaves the condition on the stack
+    POP_JUMP_IF_FALSE, # target
+    CALL,           # argc, const index (call site)
+    CALL_METHOD,    # argc, const index (call site)
+    CLOSURE,        # const index (FunctionProto)
+    RETURN,
+    CLASS,          # const index (name token), has parent
+    PARENT_OF,
+    METHOD,         # const index (method name)
+    BUILD_LIST,     # count
+    INDEX,          # const index ((subscribee, index) expressions)
+) = range(49)
+
+OP_NAMES = [
+    "CONSTANT", "NIL", "TRUE", "FALSE", "POP",
+    "GET_LOCAL", "SET_LOCAL", "STORE_LOCAL", "NEW_CELL", "GET_CELL", "SET_CELL", "STORE_CELL",
+    "GET_UPVALUE", "SET_UPVALUE", "GET_GLOBAL", "SET_GLOBAL", "DEFINE_GLOBAL",
+    "GET_PROPERTY", "CHECK_INSTANCE", "SET_PROPERTY", "GET_METHOD", "GET_PARENT",
+    "EQUAL", "NOT_EQUAL", "GREATER", "GREATER_EQUAL", "LESS", "LESS_EQUAL",
+    "ADD", "SUBTRACT", "MULTIPLY", "DIVIDE", "NOT", "NEGATE",
+    "PRINT", "REPL_PRINT", "JUMP", "JUMP_IF_FALSE", "JUMP_IF_TRUE", "POP_JUMP_IF_FALSE",
+    "CALL", "CALL_METHOD", "CLOSURE", "RETURN", "CLASS", "PARENT_OF", "METHOD",
+    "BUILD_LIST", "INDEX",
+]
+
+OPERAND_COUNT = {
+    NIL: 0, TRUE: 0, FALSE: 0, POP: 0, EQUAL: 0, NOT_EQUAL: 0,
+    GREATER: 0, GREATER_EQUAL: 0, LESS: 0, LESS_EQUAL: 0, ADD: 0, NOT: 0,
+    PRINT: 0, REPL_PRINT: 0, RETURN: 0, PARENT_OF: 0,
+    CALL: 2, CALL_METHOD: 2, CLASS: 2,
+}
+
+
+class FunctionProto:
+    """Compiled form of a function body (or of one top-level statement)."""
+    def __init__(self, name: str | None, declaration: FuncExpr | None, kind: str) -> None:
+        self.name = name
+        self.declaration = declaration
+        self.kind = kind
+        self.arity = len(declaration.params) if declaration else 0
+        self.code : List[int] = []
+        self.constants : List[object] = []
+        self.num_slots = 0
+        self.upvalues : List[Tuple[bool, int]] = []
+        self.cell_slots : Tuple[int, ...] = ()
+        self.is_method = kind in ("method", "initializer")
+        self.is_initializer = kind == "initializer"
+
+    def __repr__(self) -> str:
+        return f"<proto [{self.name or 'script'}]>"
+
+
+class CallSite:
+    """Constant attached to CALL instructions; natives still get the argument expressions."""
+    def __init__(self, paren: PloxToken, arguments: List[Expr]) -> None:
+        self.paren = paren
+        self.arguments = arguments
+
+
+class _Local:
+    def __init__(self, name: str, depth: int, slot: int, cell: bool) -> None:
+        self.name = name
+        self.depth = depth
+        self.slot = slot
+        self.cell = cell
+
+
+class _Loop:
+    def __init__(self) -> None:
+        self.breaks : List[int] = []
+        self.continues : List[int] = []
+
+
+class _FunctionState:
+    def __init__(self, enclosing: Optional["_FunctionState"], proto: FunctionProto) -> None:
+        self.enclosing = enclosing
+        self.proto = proto
+        self.locals : List[_Local] = []
+        self.upvalues : Dict[Tuple[bool, int], int] = dict()
+        self.scope_depth = 0
+        self.loops : List[_Loop] = []
+        self.cell_params : List[int] = []
+        self.constants : Dict[int, int] = dict()
+
+
+class BytecodeCompiler(ExprVisitor, StmtVisitor):
+    """Compiles resolved statements into FunctionProtos for the VM.
+
+    Locals live in per-frame slot arrays. Locals captured by an inner
+    function are boxed in single-element list cells when declared; which
+    declarations are captured is only known after their scope is compiled,
+    so a statement is compiled a second time whenever new captures show up.
+    """
+    def __init__(self, repl: bool = False) -> None:
+        self.repl = repl
+        self.captured : set = set()
+        self.fn : _FunctionState = None
+
+    def compile(self, statement: Stmt) -> FunctionProto:
+        while True:
+            known = len(self.captured)
+            proto = FunctionProto(None, None, "script")
+            self.fn = _FunctionState(None, proto)
+            self._stmt(statement)
+            self._emit(NIL, RETURN)
+            self._finish()
+            if len(self.captured) == known:
+                return proto
+
+    ################ Statements ####################
+
+    def visitEmpty(self, stmt: Empty) -> None:
+        return
+
+    def visitBlock(self, stmt: Block) -> None:
+        self._begin_scope()
+        for statement in stmt.statements:
+            self._stmt(statement)
+        self._end_scope()
+
+    def visitExpression(self, stmt: Expression) -> None:
+        self._expr(stmt.expression)
+        self._emit(REPL_PRINT if self.repl else POP)
+
+    def visitIf(self, stmt: If) -> None:
+        self._expr(stmt.condition)
+        else_jump = self._emit_jump(POP_JUMP_IF_FALSE)
+        self._stmt(stmt.thenBranch)
+        if stmt.elseBranch:
+            end_jump = self._emit_jump(JUMP)
+            self._patch(else_jump)
+            self._stmt(stmt.elseBranch)
+            self._patch(end_jump)
+        else:
+            self._patch(else_jump)
+
+    def visitWhile(self, stmt: While) -> None:
+        loop_start = len(self.fn.proto.code)
+        self._expr(stmt.condition)
+        exit_jump = self._emit_jump(POP_JUMP_IF_FALSE)
+        loop = _Loop()
+        self.fn.loops.append(loop)
+        body = stmt.body
+        # a continue re-runs the last statement of the body (the for-loop increment)
+        if isinstance(body, Block) and body.statements:
+            self._begin_scope()
+            for statement in body.statements[:-1]:
+                self._stmt(statement)
+            continue_target = len(self.fn.proto.code)
+            self._stmt(body.statements[-1])
+            self._end_scope()
+        else:
+            continue_target = loop_start
+            self._stmt(body)
+        self.fn.loops.pop()
+        self._emit(JUMP, loop_start)
+        self._patch(exit_jump)
+        for jump in loop.continues:
+            self._patch(jump, continue_target)
+        for jump in loop.breaks:
+            self._patch(jump)
+
+    def visitBreak(self, stmt: Break) -> None:
+        if self.fn.loops:
+            self.fn.loops[-1].breaks.append(self._emit_jump(JUMP))
+
+    def visitContinue(self, stmt: Continue) -> None:
+        if self.fn.loops:
+            self.fn.loops[-1].continues.append(self._emit_jump(JUMP))
+
+    def visitPrint(self, stmt: Print) -> None:
+        self._expr(stmt.expression)
+        self._emit(PRINT)
+
+    def visitVar(self, stmt: Var) -> None:
+        declared = self._declare(stmt.name.lexeme, stmt.name)
+        if stmt.Initializer is not None:
+            self._expr(stmt.Initializer)
+        else:
+            self._emit(NIL)
+        self._define(declared, stmt.name)
+
+    def visitFunction(self, stmt: Function) -> None:
+        declared = self._declare(stmt.name.lexeme, stmt.name)
+        self._function(stmt.name.lexeme, stmt.function, stmt.function.type)
+        self._define(declared, stmt.name)
+
+    def visitClassStmt(self, stmt: ClassStmt) -> None:
+        declared = self._declare(stmt.name.lexeme, stmt.name)
+        has_parent = stmt.parentclass is not None
+        if has_parent:
+            self.visitVariable(stmt.parentclass)
+        self._emit(CLASS, self._constant(stmt.name), int(has_parent))
+        if has_parent:
+            self._begin_scope()
+            parent = self._declare("parent", stmt)
+            self._emit(PARENT_OF)
+            self._define(parent, stmt.name)
+        for method in stmt.methods:
+            name = method.name.lexeme
+            self._function(name, method.function, "initializer" if name == "init" else "method")
+            self._emit(METHOD, self._constant(name))
+        if has_parent:
+            self._end_scope()
+        self._define(declared, stmt.name)
+
+    def visitReturn(self, stmt: Return) -> None:
+        if self.fn.proto.is_initializer:
+            self._get_local(self.fn.locals[0])
+        elif stmt.value:
+            self._expr(stmt.value)
+        else:
+            self._emit(NIL)
+        self._emit(RETURN)
+
+    ################ Expressions ###################
+
+    def visitFuncExpr(self, expr: FuncExpr) -> None:
+        self._function(None, expr, expr.type)
+
+    def visitAssign(self, expr: Assign) -> None:
+        self._expr(expr.value)
+        self._named(expr.name, SET_LOCAL, SET_CELL, SET_UPVALUE, SET_GLOBAL)
+
+    def visitLiteral(self, expr: Literal) -> None:
+        if expr.value is None:
+            self._emit(NIL)
+        elif expr.value is True:
+            self._emit(TRUE)
+        elif expr.value is False:
+            self._emit(FALSE)
+        else:
+            self._emit(CONSTANT, self._constant(expr.value))
+
+    def visitListExpr(self, expr: ListExpr) -> None:
+        for value in expr.values:
+            self._expr(value)
+        self._emit(BUILD_LIST, len(expr.values))
+
+    def visitVariable(self, expr: Variable) -> None:
+        self._named(expr.name, GET_LOCAL, GET_CELL, GET_UPVALUE, GET_GLOBAL)
+
+    def visitThis(self, expr: This) -> None:
+        self._named(expr.keyword, GET_LOCAL, GET_CELL, GET_UPVALUE, GET_GLOBAL)
+
+    def visitParent(self, expr: Parent) -> None:
+        self._named(expr.keyword, GET_LOCAL, GET_CELL, GET_UPVALUE, GET_GLOBAL)
+        self._named(PloxToken(TT.THIS, "this", None, expr.keyword.line),
+                    GET_LOCAL, GET_CELL, GET_UPVALUE, GET_GLOBAL)
+        self._emit(GET_PARENT, self._constant(expr.method))
+
+    def visitLogical(self, expr: Logical) -> None:
+        self._expr(expr.left)
+        jump = self._emit_jump(JUMP_IF_TRUE if expr.operator.type == TT.OR else JUMP_IF_FALSE)
+        self._emit(POP)
+        self._expr(expr.right)
+        self._patch(jump)
+
+    def visitGrouping(self, expr: Grouping) -> None:
+        self._expr(expr.expression)
+
+    def visitUnary(self, expr: Unary) -> None:
+        self._expr(expr.right)
+        if expr.operator.type == TT.MINUS:
+            self._emit(NEGATE, self._constant(expr.operator))
+        else:
+            self._emit(NOT)
+
+    def visitBinary(self, expr: Binary) -> None:
+        self._expr(expr.left)
+        self._expr(expr.right)
+        match expr.operator.type:
+            case TT.MINUS: self._emit(SUBTRACT, self._constant(expr.operator))
+            case TT.SLASH: self._emit(DIVIDE, self._constant(expr.operator))
+            case TT.STAR: self._emit(MULTIPLY, self._constant(expr.operator))
+            case TT.PLUS: self._emit(ADD)
+            case TT.GREATER: self._emit(GREATER)
+            case TT.GREATER_EQUAL: self._emit(GREATER_EQUAL)
+            case TT.LESS: self._emit(LESS)
+            case TT.LESS_EQUAL: self._emit(LESS_EQUAL)
+            case TT.EQUAL_EQUAL: self._emit(EQUAL)
+            case TT.BANG_EQUAL: self._emit(NOT_EQUAL)
+            case _: self._emit(POP, POP, NIL)
+
+    def visitCall(self, expr: Call) -> None:
+        site = self._constant(CallSite(expr.paren, expr.arguments))
+        self._expr(expr.callee)
+        for arg in expr.arguments:
+            self._expr(arg)
+        self._emit(CALL, len(expr.arguments), site)
+
+    def visitInvoke(self, expr: Invoke) -> None:
+        site = self._constant(CallSite(expr.paren, expr.arguments))
+        self._expr(expr.obj)
+        self._emit(GET_METHOD, self._constant(expr))
+        for arg in expr.arguments:
+            self._expr(arg)
+        self._emit(CALL_METHOD, len(expr.arguments), site)
+
+    def visitSubscriptable(self, expr: Subscriptable) -> None:
+        self._expr(expr.subscribee)
+        self._expr(expr.index)
+        self._emit(INDEX, self._constant((expr.subscribee, expr.index)))
+
+    def visitGet(self, expr: Get) -> None:
+        self._expr(expr.obj)
+        self._emit(GET_PROPERTY, self._constant(expr))
+
+    def visitSet(self, expr: Set) -> None:
+        self._expr(expr.obj)
+        # checked before the value is evaluated, as the tree-walker does; a
+        # literal can't raise an error of its own, so SET_PROPERTY's check will do
+        if not isinstance(expr.value, Literal):
+            self._emit(CHECK_INSTANCE, self._constant(expr.name))
+        self._expr(expr.value)
+        self._emit(SET_PROPERTY, self._constant(expr))
+
+    def visitConditional(self, expr: Conditional) -> None:
+        self._expr(expr.condition)
+        else_jump = self._emit_jump(POP_JUMP_IF_FALSE)
+        self._expr(expr.then_clause)
+        end_jump = self._emit_jump(JUMP)
+        self._patch(else_jump)
+        self._expr(expr.else_clause)
+        self._patch(end_jump)
+
+    ################################################
+
+    def _function(self, name: str | None, declaration: FuncExpr, kind: str) -> None:
+        proto = FunctionProto(name, declaration, kind)
+        enclosing = self.fn
+        self.fn = _FunctionState(enclosing, proto)
+        self.fn.scope_depth = 1
+        if proto.is_method:
+            self._add_local("this", declaration)
+        for param in declaration.params:
+            self._add_local(param.lexeme, param)
+        self.fn.cell_params = [local.slot for local in self.fn.locals if local.cell]
+        for statement in declaration.body:
+            self._stmt(statement)
+        if proto.is_initializer:
+            self._get_local(self.fn.locals[0])
+        else:
+            self._emit(NIL)
+        self._emit(RETURN)
+        self._finish()
+        self.fn = enclosing
+        self._emit(CLOSURE, self._constant(proto))
+
+    def _finish(self) -> None:
+        proto = self.fn.proto
+        proto.upvalues = list(self.fn.upvalues.keys())
+        proto.cell_slots = tuple(self.fn.cell_params)
+
+    def _declare(self, name: str, key: object) -> _Local | None:
+        if self.fn.enclosing is None and self.fn.scope_depth == 0:
+            return None
+        local = self._add_local(name, key)
+        if local.cell:
+            self._emit(NEW_CELL, local.slot)
+        return local
+
+    def _define(self, local: _Local | None, token: PloxToken) -> None:
+        if local is None:
+            self._emit(DEFINE_GLOBAL, self._constant(token))
+        elif local.cell:
+            self._emit(STORE_CELL, local.slot)
+        else:
+            self._emit(STORE_LOCAL, local.slot)
+
+    def _add_local(self, name: str, key: object) -> _Local:
+        fn = self.fn
+        local = _Local(name, fn.scope_depth, len(fn.locals), key in self.captured)
+        local.key = key
+        fn.locals.append(local)
+        fn.proto.num_slots = max(fn.proto.num_slots, len(fn.locals))
+        return local
+
+    def _get_local(self, local: _Local) -> None:
+        self._emit(GET_CELL if local.cell else GET_LOCAL, local.slot)
+
+    def _named(self, token: PloxToken, local_op: int, cell_op: int, upvalue_op: int, global_op: int) -> None:
+        name = token.lexeme
+        local = self._resolve_local(self.fn, name)
+        if local is not None:
+            self._emit(cell_op if local.cell else local_op, local.slot)
+            return
+        upvalue = self._resolve_upvalue(self.fn, name)
+        if upvalue is not None:
+            self._emit(upvalue_op, upvalue)
+            return
+        self._emit(global_op, self._constant(token))
+
+    @staticmethod
+    def _resolve_local(fn: _FunctionState, name: str) -> _Local | None:
+        for local in reversed(fn.locals):
+            if local.name == name:
+                return local
+        return None
+
+    def _resolve_upvalue(self, fn: _FunctionState, name: str) -> int | None:
+        if fn.enclosing is None:
+            return None
+        local = self._resolve_local(fn.enclosing, name)
+        if local is not None:
+            self.captured.add(local.key)
+            return self._add_upvalue(fn, True, local.slot)
+        upvalue = self._resolve_upvalue(fn.enclosing, name)
+        if upvalue is not None:
+            return self._add_upvalue(fn, False, upvalue)
+        return None
+
+    @staticmethod
+    def _add_upvalue(fn: _FunctionState, is_local: bool, index: int) -> int:
+        key = (is_local, index)
+        if key not in fn.upvalues:
+            fn.upvalues[key] = len(fn.upvalues)
+        return fn.upvalues[key]
+
+    def _begin_scope(self) -> None:
+        self.fn.scope_depth += 1
+
+    def _end_scope(self) -> None:
+        fn = self.fn
+        fn.scope_depth -= 1
+        while fn.locals and fn.locals[-1].depth > fn.scope_depth:
+            fn.locals.pop()
+
+    def _stmt(self, stmt: Stmt) -> None:
+        if stmt is not None:
+            stmt.accept(self)
+
+    def _expr(self, expr: Expr) -> None:
+        expr.accept(self)
+
+    def _emit(self, *code: int) -> None:
+        self.fn.proto.code.extend(code)
+
+    def _emit_jump(self, op: int) -> int:
+        self._emit(op, -1)
+        return len(self.fn.proto.code) - 1
+
+    def _patch(self, operand: int, target: int | None = None) -> None:
+        code = self.fn.proto.code
+        code[operand] = len(code) if target is None else target
+
+    def _constant(self, value: object) -> int:
+        index = self.fn.constants.get(id(value))
+        if index is None:
+            constants = self.fn.proto.constants
+            index = self.fn.constants[id(value)] = len(constants)
+            constants.append(value)
+        return index
+
+
+def disassemble(proto: FunctionProto, indent: str = "") -> str:
+    lines = [f"{indent}== {proto.name or '<script>'} (slots: {proto.num_slots}, upvalues: {len(proto.upvalues)}) =="]
+    nested = []
+    code = proto.code
+    ip = 0
+    while ip < len(code):
+        op = code[ip]
+        count = OPERAND_COUNT.get(op, 1)
+        operands = code[ip + 1: ip + 1 + count]
+        text = f"{indent}{ip:04d} {OP_NAMES[op]:<18}"
+        if operands:
+            text += " ".join(str(operand) for operand in operands)
+        if op == CLOSURE:
+            nested.append(proto.constants[operands[0]])
+        if op in (CONSTANT, GET_GLOBAL, SET_GLOBAL, DEFINE_GLOBAL, GET_PROPERTY, SET_PROPERTY,
+                  GET_METHOD, GET_PARENT, CLASS, METHOD, CLOSURE):
+            constant = proto.constants[operands[0]]
+            if isinstance(constant, (Get, Set, Invoke)):
+                constant = constant.name
+            text += f"  ({constant.lexeme if isinstance(constant, PloxToken) else constant})"
+        lines.append(text)
+        ip += 1 + count
+    for function in nested:
+        lines.append(disassemble(function, indent + "    "))
+    return "\n".join(lines)
@@ -0,0 +1,662 @@
+from typing import List, Dict, Tuple, Callable, Type
+
+from error_types import RunTimeError
+
+from Expr import *
+from Expr import Assign
+from Stmt import *
+from Stmt import Expression, Var
+from plox_token import PloxToken
+from tokenType import TokenType as TT
+from plox_callable import *
+from completions import Completion, BREAK, CONTINUE, RETURN, TAIL_CALL
+from environment import Environment
+from interpreter import Interpreter
+
+
+Code = Callable[[Environment], object]
+
+
+class ClosureCompiler(ExprVisitor, StmtVisitor):
+    """Turns resolved Expr/Stmt trees into nested Python closures.
+
+    Every node is visited exactly once; operators, resolved depths and the
+    closures of child nodes are captured so that running the program is a
+    chain of plain function calls taking the current Environment.
+    """
+    def __init__(self, interpreter: Interpreter) -> None:
+        self.interpreter = interpreter
+
+    def compile(self, stmt: Stmt) -> Code:
+        return stmt.accept(self)
+
+    def compile_block(self, statements: List[Stmt]) -> Code:
+        code = [(self.compile(statement), bool(self._escapes(statement))) for statement in statements]
+        if not any(escapes for _, escapes in code):
+            code = [stmt for stmt, _ in code]
+            if len(code) == 1:
+                return self._quiet(code[0], statements[0])
+
+            def run(env):
+                for stmt in code:
+                    stmt(env)
+            return run
+        if len(code) == 1:
+            return code[0][0]
+
+        def run(env):
+            for stmt, escapes in code:
+                if escapes:
+                    completion = stmt(env)
+                    if completion is not None:
+                        return completion
+                else:
+                    stmt(env)
+        return run
+
+    def _expr(self, expr: Expr) -> Code:
+        return expr.accept(self)
+
+    def _escapes(self, stmt: Stmt) -> set:
+        """Completions that can leave stmt. Only statements that can complete
+        abruptly have their result checked; the rest may return anything."""
+        if isinstance(stmt, Break): return {BREAK}
+        if isinstance(stmt, Continue): return {CONTINUE}
+        if isinstance(stmt, Return): return {RETURN}
+        if isinstance(stmt, Block):
+            return set().union(*(self._escapes(statement) for statement in stmt.statements))
+        if isinstance(stmt, If):
+            escapes = self._escapes(stmt.thenBranch)
+            if stmt.elseBranch:
+                escapes = escapes | self._escapes(stmt.elseBranch)
+            return escapes
+        if isinstance(stmt, While):
+            return self._escapes(stmt.body) & {RETURN}
+        return set()
+
+    def _quiet(self, code: Code, stmt: Stmt) -> Code:
+        # expression statements return their value; hide it where it would
+        # be read as a completion
+        if not isinstance(stmt, Expression):
+            return code
+
+        def run(env):
+            code(env)
+        return run
+
+    ################ Statements ####################
+
+    def visitEmpty(self, stmt: Empty) -> Code:
+        def run(env):
+            return
+        return run
+
+    def visitBlock(self, stmt: Block) -> Code:
+        body = self.compile_block(stmt.statements)
+        size = stmt.size
+
+        def run(env):
+            return body(Environment(env, size))
+        return run
+
+    def visitExpression(self, stmt: Expression) -> Code:
+        expression = self._expr(stmt.expression)
+        interpreter = self.interpreter
+        if not interpreter.repl:
+            return expression
+        stringify = interpreter._stringify
+
+        def run(env):
+            value = expression(env)
+            if not interpreter.print_flag:
+                print(stringify(value))
+        return run
+
+    def visitIf(self, stmt: If) -> Code:
+        condition = self._expr(stmt.condition)
+        then_branch = self._quiet(self.compile(stmt.thenBranch), stmt.thenBranch)
+        truthy = Interpreter._isTruthy
+        if stmt.elseBranch is None:
+            def run(env):
+                if truthy(condition(env)):
+                    return then_branch(env)
+            return run
+        else_branch = self._quiet(self.compile(stmt.elseBranch), stmt.elseBranch)
+
+        def run(env):
+            if truthy(condition(env)):
+                return then_branch(env)
+            return else_branch(env)
+        return run
+
+    def visitWhile(self, stmt: While) -> Code:
+        condition = self._expr(stmt.condition)
+        body = self.compile(stmt.body)
+        truthy = Interpreter._isTruthy
+        if not self._escapes(stmt.body):
+            def run(env):
+                while truthy(condition(env)):
+                    body(env)
+            return run
+        body = self._quiet(body, stmt.body)
+        last = None
+        if isinstance(stmt.body, Block) and stmt.body.statements:
+            last = self._quiet(self.compile(stmt.body.statements[-1]), stmt.body.statements[-1])
+            size = stmt.body.size
+
+        def run(env):
+            while truthy(condition(env)):
+                completion = body(env)
+                if completion is None:
+                    continue
+                if completion is BREAK:
+                    break
+                if completion is CONTINUE:
+                    if last is None:
+                        continue
+                    completion = last(Environment(env, size))
+                    if completion is None:
+                        continue
+                return completion
+        return run
+
+    def visitBreak(self, stmt: Break) -> Code:
+        def run(env):
+            return BREAK
+        return run
+
+    def visitContinue(self, stmt: Continue) -> Code:
+        def run(env):
+            return CONTINUE
+        return run
+
+    def visitPrint(self, stmt: Print) -> Code:
+        expression = self._expr(stmt.expression)
+        interpreter = self.interpreter
+        stringify = interpreter._stringify
+
+        def run(env):
+            interpreter.print_flag = True
+            print(stringify(expression(env)))
+        return run
+
+    def visitVar(self, stmt: Var) -> Code:
+        if stmt.Initializer is None:
+            initializer = self.visitLiteral(Literal(None))
+        else:
+            initializer = self._expr(stmt.Initializer)
+        slot = stmt.slot
+        if slot is None:
+            values = self.interpreter.globals.values
+            name = stmt.name.lexeme
+
+            def run(env):
+                values[name] = initializer(env)
+            return run
+
+        def run(env):
+            env.values[slot] = initializer(env)
+        return run
+
+    def visitClassStmt(self, stmt: ClassStmt) -> Code:
+        parent_expr = stmt.parentclass
+        parent = self._expr(parent_expr) if parent_expr else None
+        methods = [(method.name.lexeme, method.function) for method in stmt.methods]
+        for _, function in methods:
+            self._function_body(function)
+        name = stmt.name.lexeme
+        slot = stmt.slot
+        values = self.interpreter.globals.values
+
+        def run(env):
+            parentclass = None
+            if parent:
+                parentclass = parent(env)
+                if not isinstance(parentclass, ploxClass):
+                    raise RunTimeError(parent_expr.name, "A parent class must be a class")
+            scope = values if slot is None else env.values
+            scope[name if slot is None else slot] = None
+            closure = env
+            if parent:
+                closure = Environment(env, 1)
+                closure.values[0] = parentclass
+            table : Dict[str, ploxFunction] = dict()
+            for method_name, function in methods:
+                table[method_name] = ploxFunction(method_name, function, closure, method_name == "init")
+            scope[name if slot is None else slot] = ploxClass(name, parentclass, table)
+        return run
+
+    def visitFunction(self, stmt: Function) -> Code:
+        name = stmt.name.lexeme
+        function = stmt.function
+        self._function_body(function)
+        slot = stmt.slot
+        if slot is None:
+            values = self.interpreter.globals.values
+
+            def run(env):
+                values[name] = ploxFunction(name, function, env)
+            return run
+
+        def run(env):
+            env.values[slot] = ploxFunction(name, function, env)
+        return run
+
+    def visitReturn(self, stmt: Return) -> Code:
+        interpreter = self.interpreter
+        if stmt.tail_call:
+            if isinstance(stmt.value, Invoke):
+                target = self._invoke_target(stmt.value)
+            else:
+                target = self._call_target(stmt.value)
+
+            def run(env):
+                interpreter.return_value = target(env)
+                return TAIL_CALL
+            return run
+        if stmt.value is None:
+            def run(env):
+                interpreter.return_value = None
+                return RETURN
+            return run
+        value = self._expr(stmt.value)
+
+        def run(env):
+            interpreter.return_value = value(env)
+            return RETURN
+        return run
+
+    ################ Expressions ###################
+
+    def visitFuncExpr(self, expr: FuncExpr) -> Code:
+        self._function_body(expr)
+
+        def ev(env):
+            return ploxFunction(None, expr, env)
+        return ev
+
+    def visitAssign(self, expr: Assign) -> Code:
+        value = self._expr(expr.value)
+        hops = expr.depth
+        slot = expr.slot
+        if hops is not None:
+            if hops == 0:
+                def ev(env):
+                    result = env.values[slot] = value(env)
+                    return result
+                return ev
+
+            def ev(env):
+                result = value(env)
+                for _ in range(hops):
+                    env = env.enclosing
+                env.values[slot] = result
+                return result
+            return ev
+        token = expr.name
+        globals = self.interpreter.globals
+
+        def ev(env):
+            result = value(env)
+            globals.assign_existing(token, result)
+            return result
+        return ev
+
+    def visitLiteral(self, expr: Literal) -> Code:
+        value = expr.value
+
+        def ev(env):
+            return value
+        return ev
+
+    def visitListExpr(self, expr: ListExpr) -> Code:
+        values = [self._expr(value) for value in expr.values]
+
+        def ev(env):
+            return [value(env) for value in values]
+        return ev
+
+    def visitVariable(self, expr: Variable) -> Code:
+        return self._lookup(expr.name, expr)
+
+    def visitThis(self, expr: This) -> Code:
+        return self._lookup(expr.keyword, expr)
+
+    def _lookup(self, token: PloxToken, expr: Variable | This) -> Code:
+        name = token.lexeme
+        hops = expr.depth
+        slot = expr.slot
+        if hops is not None:
+            if hops == 0:
+                def ev(env):
+                    return env.values[slot]
+            elif hops == 1:
+                def ev(env):
+                    return env.enclosing.values[slot]
+            else:
+                def ev(env):
+                    for _ in range(hops):
+                        env = env.enclosing
+                    return env.values[slot]
+            return ev
+        values = self.interpreter.globals.values
+
+        def ev(env):
+            if name in values:
+                return values[name]
+            raise RunTimeError(token, f"Undefined variable {{{name}}}")
+        return ev
+
+    def visitLogical(self, expr: Logical) -> Code:
+        left = self._expr(expr.left)
+        right = self._expr(expr.right)
+        truthy = Interpreter._isTruthy
+        if expr.operator.type == TT.OR:
+            def ev(env):
+                value = left(env)
+                if truthy(value): return value
+                return right(env)
+        else:
+            def ev(env):
+                value = left(env)
+                if not truthy(value): return value
+                return right(env)
+        return ev
+
+    def visitGrouping(self, expr: Grouping) -> Code:
+        return self._expr(expr.expression)
+
+    def visitUnary(self, expr: Unary) -> Code:
+        right = self._expr(expr.right)
+        operator = expr.operator
+        match operator.type:
+            case TT.MINUS:
+                def ev(env):
+                    value = right(env)
+                    if not isinstance(value, float):
+                        raise RunTimeError(operator, "Operand must be a number")
+                    return - value
+            case TT.BANG:
+                truthy = Interpreter._isTruthy
+
+                def ev(env):
+                    return not truthy(right(env))
+        return ev
+
+    def visitBinary(self, expr: Binary) -> Code:
+        left = self._expr(expr.left)
+        right = self._expr(expr.right)
+        operator = expr.operator
+        numify = Interpreter._numify
+        stringify = Interpreter._stringify
+
+        def numbers(a, b):
+            if not isinstance(a, float) or not isinstance(b, float):
+                raise RunTimeError(operator, "Operands must be numbers")
+
+        match operator.type:
+            # Arithmatic -------------------------------------------
+            case TT.MINUS:
+                def ev(env):
+                    a = left(env); b = right(env)
+                    numbers(a, b)
+                    return a - b
+            case TT.SLASH:
+                def ev(env):
+                    a = left(env); b = right(env)
+                    numbers(a, b)
+                    try:
+                        return a / b
+                    except ZeroDivisionError:
+                        raise RunTimeError(operator, "Tried dividing by zero")
+            case TT.STAR:
+                def ev(env):
+                    a = left(env); b = right(env)
+                    numbers(a, b)
+                    return a * b
+            case TT.PLUS:
+                def ev(env):
+                    a = left(env); b = right(env)
+                    if isinstance(a, str) or isinstance(b, str):
+                        return stringify(a) + stringify(b)
+                    return numify(a) + numify(b)
+            # Comparison -------------------------------------------
+            case TT.GREATER:
+                def ev(env):
+                    return numify(left(env)) > numify(right(env))
+            case TT.GREATER_EQUAL:
+                def ev(env):
+                    return numify(left(env)) >= numify(right(env))
+            case TT.LESS:
+                def ev(env):
+                    return numify(left(env)) < numify(right(env))
+            case TT.LESS_EQUAL:
+                def ev(env):
+                    return numify(left(env)) <= numify(right(env))
+            # Comaprison - equality --------------------------------
+            case TT.EQUAL_EQUAL:
+                def ev(env):
+                    return left(env) == right(env)
+            case TT.BANG_EQUAL:
+                def ev(env):
+                    return not (left(env) == right(env))
+            case _:
+                def ev(env):
+                    left(env); right(env)
+        return ev
+
+    def visitCall(self, expr: Call) -> Code:
+        callee = self._expr(expr.callee)
+        arguments = [(arg, self._expr(arg)) for arg in expr.arguments]
+        paren = expr.paren
+        interpreter = self.interpreter
+
+        def ev(env):
+            function = callee(env)
+            args = [{"expr": arg, "value": value(env)} for arg, value in arguments]
+            if not isinstance(function, ploxCallable):
+                raise RunTimeError(paren, "Tried to call non-callable object")
+            if len(args) != function.arity():
+                raise RunTimeError(paren, f"Expected {function.arity()} arguments, but got {len(args)}")
+            return function.call(interpreter, args)
+        return ev
+
+    def _call_target(self, expr: Call) -> Code:
+        """Like visitCall, but hands back (callee, None, arguments) instead of calling."""
+        callee = self._expr(expr.callee)
+        arguments = [(arg, self._expr(arg)) for arg in expr.arguments]
+        paren = expr.paren
+
+        def ev(env):
+            function = callee(env)
+            args = [{"expr": arg, "value": value(env)} for arg, value in arguments]
+            if not isinstance(function, ploxCallable):
+                raise RunTimeError(paren, "Tried to call non-callable object")
+            if len(args) != function.arity():
+                raise RunTimeError(paren, f"Expected {function.arity()} arguments, but got {len(args)}")
+            return function, None, args
+        return ev
+
+    def visitInvoke(self, expr: Invoke) -> Code:
+        target = self._invoke_target(expr)
+        interpreter = self.interpreter
+
+        def ev(env):
+            method, instance, args = target(env)
+            if instance is None:
+                return method.call(interpreter, args)
+            return method.invoke(interpreter, instance, args)
+        return ev
+
+    def _invoke_target(self, expr: Invoke) -> Code:
+        """(callee, receiver, arguments) of obj.name(...); the receiver is None
+        when the name is a field holding a callable."""
+        obj = self._expr(expr.obj)
+        arguments = [(arg, self._expr(arg)) for arg in expr.arguments]
+        name = expr.name
+        lexeme = name.lexeme
+        paren = expr.paren
+        cached_shape = None
+        cached_class = None
+        cached_method = None
+
+        def ev(env):
+            nonlocal cached_shape, cached_class, cached_method
+            instance = obj(env)
+            if not isinstance(instance, ploxInstance):
+                raise RunTimeError(name, "Only instances have properties")
+            shape = instance.shape
+            if shape is cached_shape and instance.klass is cached_class:
+                method = cached_method
+            else:
+                slot = shape.slots.get(lexeme)
+                if slot is not None:
+                    method = instance.values[slot]
+                    args = [{"expr": arg, "value": value(env)} for arg, value in arguments]
+                    if not isinstance(method, ploxCallable):
+                        raise RunTimeError(paren, "Tried to call non-callable object")
+                    if len(args) != method.arity():
+                        raise RunTimeError(paren, f"Expected {method.arity()} arguments, but got {len(args)}")
+                    return method, None, args
+                method = instance.klass.find_method(lexeme)
+                if method is None:
+                    raise RunTimeError(name, f"Undefined property {{{lexeme}}}")
+                cached_shape = shape
+                cached_class = instance.klass
+                cached_method = method
+            args = [{"expr": arg, "value": value(env)} for arg, value in arguments]
+            if len(args) != method.arity():
+                raise RunTimeError(paren, f"Expected {method.arity()} arguments, but got {len(args)}")
+            return method, instance, args
+        return ev
+
+    def visitSubscriptable(self, expr: Subscriptable) -> Code:
+        subscribee_expr = expr.subscribee
+        index_expr = expr.index
+        subscribee = self._expr(subscribee_expr)
+        index = self._expr(index_expr)
+
+        def ev(env):
+            obj = subscribee(env)
+            if not isinstance(obj, list) and not isinstance(obj, str):
+                raise RunTimeError(subscribee_expr, "Only subscriptable objects currently available are lists and strings")
+            i = index(env)
+            try:
+                i = int(i)
+            except:
+                raise RunTimeError(index_expr, "Index must be a number. Other types of indexing not yet implemented")
+            if i > len(obj):
+                raise RunTimeError(index_expr, f"Index {{{i}}} is out of range")
+            return obj[i]
+        return ev
+
+    def visitGet(self, expr: Get) -> Code:
+        obj = self._expr(expr.obj)
+        name = expr.name
+
+        lexeme = name.lexeme
+        cached_shape = None
+        cached_slot = 0
+
+        def ev(env):
+            nonlocal cached_shape, cached_slot
+            instance = obj(env)
+            if isinstance(instance, ploxInstance):
+                shape = instance.shape
+                if shape is cached_shape:
+                    return instance.values[cached_slot]
+                slot = shape.slots.get(lexeme)
+                if slot is not None:
+                    cached_shape = shape
+                    cached_slot = slot
+                    return instance.values[slot]
+                return instance.get(name)
+            raise RunTimeError(name, "Only instances have properties")
+        return ev
+
+    def visitSet(self, expr: Set) -> Code:
+        obj = self._expr(expr.obj)
+        value = self._expr(expr.value)
+        name = expr.name
+
+        lexeme = name.lexeme
+        cached_shape = None
+        next_shape = None
+        cached_slot = 0
+
+        def ev(env):
+            nonlocal cached_shape, next_shape, cached_slot
+            instance = obj(env)
+            if not isinstance(instance, ploxInstance):
+                raise RunTimeError(name, "Only instances have fields")
+            result = value(env)
+            shape = instance.shape
+            if shape is cached_shape:
+                if next_shape is shape:
+                    instance.values[cached_slot] = result
+                else:
+                    instance.shape = next_shape
+                    instance.values.append(result)
+                return result
+            instance.set(name, result)
+            cached_shape = shape
+            next_shape = instance.shape
+            cached_slot = next_shape.slots[lexeme]
+            return result
+        return ev
+
+    def visitParent(self, expr: Parent) -> Code:
+        depth = expr.depth
+        slot = expr.slot
+        method = expr.method
+
+        def ev(env):
+            superclass : ploxClass = env.fetchAt(depth, slot)
+            instance : ploxInstance = env.fetchAt(depth - 1, 0)
+            function = superclass.find_method(method.lexeme)
+            if function is None:
+                raise RunTimeError(method, f"Undefined property {{{method.lexeme}}}")
+            return function.bind(instance)
+        return ev
+
+    def visitConditional(self, expr: Conditional) -> Code:
+        condition = self._expr(expr.condition)
+        then_clause = self._expr(expr.then_clause)
+        else_clause = self._expr(expr.else_clause)
+        truthy = Interpreter._isTruthy
+
+        def ev(env):
+            if truthy(condition(env)):
+                return then_clause(env)
+            return else_clause(env)
+        return ev
+
+    ################################################
+
+    def _function_body(self, function: FuncExpr) -> None:
+        self.interpreter._compile_body(function.body, self.compile_block(function.body))
+
+
+class ClosureInterpreter(Interpreter):
+    """Interpreter that runs closure-compiled code instead of visiting nodes.
+
+    Runtime objects (environments, functions, classes and natives) are shared
+    with the tree-walker, so both engines produce identical output.
+    """
+    def __init__(self, error: Callable[[Type[Exception]], None], repl: bool = False):
+        super().__init__(error, repl)
+        self.compiler = ClosureCompiler(self)
+        self.bodies : Dict[int, Tuple[List[Stmt], Code]] = dict()
+
+    def _compile_body(self, statements: List[Stmt], code: Code) -> None:
+        self.bodies[id(statements)] = (statements, code)
+
+    def _exec(self, stmt: Stmt) -> None:
+        self.compiler.compile(stmt)(self.env)
+
+    def _exec_block(self, statements: List[Stmt], env: Environment) -> Completion | None:
+        entry = self.bodies.get(id(statements))
+        if entry is None:
+            entry = (statements, self.compiler.compile_block(statements))
+            self.bodies[id(statements)] = entry
+        return entry[1](env)
@@ -0,0 +1,18 @@
+class Completion:
+    """How a statement finished, when not normally. Statements hand one of
+    these back to the enclosing loop or function instead of raising; a
+    returned value is left in the interpreter's return_value. For TAIL_CALL
+    that is the (callee, this, arguments) the function should continue with."""
+    __slots__ = ("kind",)
+
+    def __init__(self, kind: str):
+        self.kind = kind
+
+    def __repr__(self) -> str:
+        return f"<completion {self.kind}>"
+
+
+BREAK = Completion("break")
+CONTINUE = Completion("continue")
+RETURN = Completion("return")
+TAIL_CALL = Completion("tail call")
@@ -4,45 +4,46 @@ from typing import Type
 from plox_token import PloxToken
 
 class Environment:
-    def __init__(self, raisable: Type[Exception], enclosing: Environment | None = None):
+    """A local scope. Variables live in a fixed-size list; the Resolver hands
+    out each variable's (depth, slot) pair, so lookups never hash a name."""
+    __slots__ = ("values", "enclosing")
+
+    def __init__(self, enclosing: Environment | GlobalEnvironment | None = None, size: int = 0):
+        self.values = [None] * size
+        self.enclosing = enclosing
+
+    def assignAt(self, distance: int, slot: int, value: object) -> None:
+        self.ancestor(distance).values[slot] = value
+
+    def fetchAt(self, distance: int, slot: int) -> object:
+        return self.ancestor(distance).values[slot]
+
+    def ancestor(self, distance: int) -> Environment:
+        env = self
+        for _ in range(distance):
+            env = env.enclosing
+        return env
+
+
+class GlobalEnvironment:
+    """The global scope, looked up by name since globals are late-bound."""
+    def __init__(self, raisable: Type[Exception]):
         self.raisable = raisable
         self.values = dict()
-        self.enclosing: Environment = enclosing
+        self.enclosing = None
 
     def assign(self, name: PloxToken, value: object) -> None:
         self.values[name.lexeme] = value
 
     def assign_existing(self, token: PloxToken, value: object) -> None:
         name = token.lexeme
-        if name in self.values.keys():
+        if name in self.values:
             self.values[name] = value
             return
-        if self.enclosing is not None:
-            self.enclosing.assign_existing(token, value)
-            return
         raise self.raisable(token, f"Undefined variable {{{name}}}")
 
-    def assignAt(self, distance: int, token: PloxToken, value: object) -> None:
-        name = token.lexeme
-        self.ancestor(distance).values[name] = value
-    
     def fetch(self, token: PloxToken) -> object:
         name = token.lexeme
-        if name in self.values.keys():
-            return self.values.get(name)
-        if self.enclosing is not None:
-            return self.enclosing.fetch(token)
-
+        if name in self.values:
+            return self.values[name]
         raise self.raisable(token, f"Undefined variable {{{name}}}")
-
-    def fetchAt(self, distance: int, token: PloxToken) -> object:
-        name = token.lexeme
-        return self.ancestor(distance).values[name]
-    
-    def ancestor(self, distance: int) -> Environment:
-        env = self
-        for _ in range(distance - 1):
-            # print(_, distance)
-            env = env.enclosing
-            # print(env.values)
-        return env
@@ -0,0 +1,113 @@
+from __future__ import annotations
+from typing import Dict, List, Callable
+
+from error_types import RunTimeError
+from Stmt import Stmt, Block, Empty
+from plox_callable import ploxFunction, ploxClass, ploxInstance
+from completions import Completion
+from interpreter import Interpreter
+from profiler import first_line
+
+# event -> what its callbacks are called with
+EVENTS = {
+    "call": "(function, arguments, this) before a Lox function or method runs",
+    "return": "(function, value) after it returned, once per call even when it returned through tail calls",
+    "line": "(line, statement) before each statement runs",
+    "instance": "(instance) after a class call created and initialized an instance",
+    "error": "(error) when a runtime error ends the program, before it is reported",
+}
+
+
+class Hooks:
+    """The callbacks subscribed to each interpreter event."""
+    def __init__(self) -> None:
+        self.call : List[Callable] = []
+        self.ret : List[Callable] = []
+        self.line : List[Callable] = []
+        self.instance : List[Callable] = []
+        self.error : List[Callable] = []
+        self.lines : Dict[Stmt, int] = dict()
+        # hooked functions executing, innermost last, see hookedFunction
+        self.running : List[ploxFunction] = []
+
+    def _callbacks(self, event: str) -> List[Callable]:
+        if event not in EVENTS:
+            raise ValueError(f"unknown event {{{event}}}, expected one of: {', '.join(EVENTS)}")
+        return self.ret if event == "return" else getattr(self, event)
+
+    def add(self, event: str, callback: Callable) -> None:
+        self._callbacks(event).append(callback)
+
+    def remove(self, event: str, callback: Callable) -> None:
+        self._callbacks(event).remove(callback)
+
+    def __bool__(self) -> bool:
+        return bool(self.call or self.ret or self.line or self.instance or self.error)
+
+    def line_of(self, stmt: Stmt) -> int:
+        line = self.lines.get(stmt)
+        if line is None:
+            line = self.lines[stmt] = first_line(stmt)
+        return line
+
+
+class hookedFunction(ploxFunction):
+    """A ploxFunction reporting its calls and returns to the interpreter's hooks."""
+    def invoke(self, interpreter: HookedInterpreter, this: ploxInstance | None, arguments: list) -> object:
+        hooks = interpreter.hooks
+        # the functions this call continues into through tail calls are
+        # pushed by execute; each gets its return event once the value is known
+        start = len(hooks.running)
+        try:
+            value = super().invoke(interpreter, this, arguments)
+        finally:
+            chain = hooks.running[start:]
+            del hooks.running[start:]
+        for finished in reversed(chain):
+            for callback in hooks.ret:
+                callback(finished, value)
+        return value
+
+    def execute(self, interpreter: HookedInterpreter, this: ploxInstance | None, arguments: list) -> Completion | None:
+        hooks = interpreter.hooks
+        for callback in hooks.call:
+            callback(self, [argument["value"] for argument in arguments], this if self.isMethod else None)
+        hooks.running.append(self)
+        return super().execute(interpreter, this, arguments)
+
+
+class hookedClass(ploxClass):
+    """A ploxClass reporting the instances it creates."""
+    def call(self, interpreter: HookedInterpreter, arguments: list) -> object:
+        instance = super().call(interpreter, arguments)
+        for callback in interpreter.hooks.instance:
+            callback(instance)
+        return instance
+
+
+class HookedInterpreter(Interpreter):
+    """The tree-walker with events reported to {hooks}. Interpreter.add_hook
+    switches an interpreter to this class on the first subscription, and
+    remove_hook back once nothing is subscribed, so unobserved programs never
+    run any of it."""
+    function_type = hookedFunction
+    class_type = hookedClass
+
+    def interpret(self, statements: List[Stmt]) -> None:
+        error = self.error
+        def report(err: RunTimeError) -> None:
+            for callback in self.hooks.error:
+                callback(err)
+            error(err)
+        self.error = report
+        try:
+            super().interpret(statements)
+        finally:
+            self.error = error
+
+    def _exec(self, stmt: Stmt) -> Completion | None:
+        if self.hooks.line and type(stmt) not in (Block, Empty):
+            line = self.hooks.line_of(stmt)
+            for callback in self.hooks.line:
+                callback(line, stmt)
+        return stmt.accept(self)
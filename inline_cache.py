@@ -0,0 +1,17 @@
+class InlineCache:
+    """What one property site saw last, so the next lookup on an instance of
+    the same shape skips the name lookup. Get and Set sites cache the shape
+    and its field slot; a Set that added the field also keeps the shape it
+    moved the instance to. Invoke sites cache the shape and class, and the
+    method they resolve to.
+
+    Syntax tree nodes hold one but leave it out of pickles, so a cached
+    program starts with empty caches."""
+    __slots__ = ("shape", "slot", "next_shape", "klass", "method")
+
+    def __init__(self) -> None:
+        self.shape = None
+        self.slot = None
+        self.next_shape = None
+        self.klass = None
+        self.method = None
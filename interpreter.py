@@ -8,20 +8,29 @@ from Stmt import Expression, Var
 from plox_token import PloxToken
 from tokenType import TokenType as TT
 from plox_callable import *
-from unwind_exceptions import *
+from completions import Completion, BREAK, CONTINUE, RETURN, TAIL_CALL
 from natives import *
-from environment import Environment
+from environment import Environment, GlobalEnvironment
+from quickening import *
 
 
 class Interpreter(ExprVisitor, StmtVisitor):
     #TODO: get the comma operator to work
+    # what Lox functions, methods and classes are created as; instrumented
+    # subclasses of the interpreter swap in their own
+    function_type = ploxFunction
+    class_type = ploxClass
+
     def __init__(self, error: Callable[[Type[Exception]], None], repl: bool = False):
         self.error = error
         self.repl = repl
         self.print_flag = False
-        self.globals = Environment(RunTimeError) # Global scope objects reside on line -9
-        self.locals : Dict[Expr, int] = dict()
+        self.return_value = None
+        self.globals = GlobalEnvironment(RunTimeError) # Global scope objects reside on line -9
         self.env = self.globals
+        self.hooks = None
+        # quickened nodes' guard failures, see _deoptimize
+        self.guard_failures : Dict[Expr, int] = dict()
         self.natives()
 
     def natives(self) -> None:
@@ -30,6 +39,28 @@ class Interpreter(ExprVisitor, StmtVisitor):
         self.globals.assign(PloxToken(TT.IDENTIFIER, "struct", None, -9), Struct())
         self.globals.assign(PloxToken(TT.IDENTIFIER, "input", None, -9), Input())
         self.globals.assign(PloxToken(TT.IDENTIFIER, "help", None, -9), Help())
+        self.globals.assign(PloxToken(TT.IDENTIFIER, "getc", None, -9), GetC())
+        self.globals.assign(PloxToken(TT.IDENTIFIER, "chr", None, -9), Chr())
+        self.globals.assign(PloxToken(TT.IDENTIFIER, "exit", None, -9), Exit())
+        self.globals.assign(PloxToken(TT.IDENTIFIER, "print_error", None, -9), PrintError())
+
+    def add_hook(self, event: str, callback: Callable) -> None:
+        """Subscribe {callback} to an event in hooks.EVENTS. The first
+        subscription switches this interpreter to the instrumented
+        HookedInterpreter; functions and classes created before that aren't
+        observed."""
+        from hooks import Hooks, HookedInterpreter
+        if type(self) not in (Interpreter, HookedInterpreter):
+            raise NotImplementedError("hooks are only supported by the tree-walking interpreter")
+        if self.hooks is None:
+            self.hooks = Hooks()
+        self.hooks.add(event, callback)
+        self.__class__ = HookedInterpreter
+
+    def remove_hook(self, event: str, callback: Callable) -> None:
+        self.hooks.remove(event, callback)
+        if not self.hooks:
+            self.__class__ = Interpreter
 
     def interpret(self, statements: List[Stmt]) -> None:
         try:
@@ -44,8 +75,8 @@ class Interpreter(ExprVisitor, StmtVisitor):
     def visitEmpty(self, stmt: Empty) -> None:
         return
 
-    def visitBlock(self, stmt: Block) -> None:
-        self._exec_block(stmt.statements, Environment(RunTimeError, self.env))
+    def visitBlock(self, stmt: Block) -> Completion | None:
+        return self._exec_block(stmt.statements, Environment(self.env, stmt.size))
 
     def visitExpression(self, stmt: Expression) -> None:
         value = self._eval(stmt.expression)
@@ -53,27 +84,30 @@ class Interpreter(ExprVisitor, StmtVisitor):
             value = self._stringify(value)
             print(value)
 
-    def visitIf(self, stmt: If) -> None:
+    def visitIf(self, stmt: If) -> Completion | None:
         if self._isTruthy(self._eval(stmt.condition)):
-            self._exec(stmt.thenBranch)
+            return self._exec(stmt.thenBranch)
         elif stmt.elseBranch:
-            self._exec(stmt.elseBranch)
+            return self._exec(stmt.elseBranch)
 
-    def visitWhile(self, stmt: While) -> None:
+    def visitWhile(self, stmt: While) -> Completion | None:
         while self._isTruthy(self._eval(stmt.condition)):
-            try:
-                self._exec(stmt.body)
-            except BreakException:
-                break
-            except ContinueException:
-                self._exec_block([stmt.body.statements[-1]], Environment(RunTimeError, self.env))
+            completion = self._exec(stmt.body)
+            if completion is None:
                 continue
+            if completion is BREAK:
+                break
+            if completion is CONTINUE:
+                completion = self._exec_block([stmt.body.statements[-1]], Environment(self.env, stmt.body.size))
+                if completion is None:
+                    continue
+            return completion
 
-    def visitBreak(self, stmt: Break) -> None:
-        raise BreakException
+    def visitBreak(self, stmt: Break) -> Completion:
+        return BREAK
 
-    def visitContinue(self, stmt: Continue) -> None:
-        raise ContinueException
+    def visitContinue(self, stmt: Continue) -> Completion:
+        return CONTINUE
 
     def visitPrint(self, stmt: Print) -> None:
         self.print_flag = True
@@ -84,7 +118,7 @@ class Interpreter(ExprVisitor, StmtVisitor):
         value = None
         if stmt.Initializer is not None:
             value = self._eval(stmt.Initializer)
-        self.env.assign(stmt.name, value)
+        self._define(stmt.name, stmt.slot, value)
 
     def visitClassStmt(self, stmt: ClassStmt) -> None:
         parentclass = None
@@ -92,39 +126,42 @@ class Interpreter(ExprVisitor, StmtVisitor):
             parentclass = self._eval(stmt.parentclass)
             if not isinstance(parentclass, ploxClass):
                 raise RunTimeError(stmt.parentclass.name, "A parent class must be a class")
-        self.env.assign(stmt.name, None)
+        self._define(stmt.name, stmt.slot, None)
         if stmt.parentclass:
-            self.env = Environment(RunTimeError, self.env)
-            self.env.assign(PloxToken(TT.PARENT, "parent", None, stmt.name.line), parentclass)
+            self.env = Environment(self.env, 1)
+            self.env.values[0] = parentclass
         methods : Dict[str, ploxFunction] = dict()
         for method in stmt.methods:
             name = method.name.lexeme
-            func = ploxFunction(name, method.function, self.env, name == "init")
+            func = self.function_type(name, method.function, self.env, name == "init")
             methods[name] = func
-        klass = ploxClass(stmt.name.lexeme, parentclass, methods)
+        klass = self.class_type(stmt.name.lexeme, parentclass, methods)
         if parentclass:
             self.env = self.env.enclosing
-        self.env.assign_existing(stmt.name, klass)
+        self._define(stmt.name, stmt.slot, klass)
 
     def visitFunction(self, stmt: Function) -> None:
         name = stmt.name
-        func = ploxFunction(name.lexeme, stmt.function, self.env)
-        self.env.assign(name, func)
+        func = self.function_type(name.lexeme, stmt.function, self.env)
+        self._define(name, stmt.slot, func)
 
-    def visitReturn(self, stmt: Return) -> None:
+    def visitReturn(self, stmt: Return) -> Completion:
+        if stmt.tail_call:
+            self.return_value = self._call_target(stmt.value)
+            return TAIL_CALL
         value = None
         if stmt.value:
             value = self._eval(stmt.value)
-        raise ReturnException(value)
+        self.return_value = value
+        return RETURN
 
     def visitFuncExpr(self, expr: FuncExpr) -> object:
-        return ploxFunction(None, expr, self.env)
+        return self.function_type(None, expr, self.env)
 
     def visitAssign(self, expr: Assign) -> object:
         value = self._eval(expr.value)
-        distance = self.locals.get(expr)
-        if distance:
-            self.env.assignAt(distance, expr.name, value)
+        if expr.depth is not None:
+            self.env.assignAt(expr.depth, expr.slot, value)
         else:
             self.globals.assign_existing(expr.name, value)
         return value
@@ -145,89 +182,224 @@ class Interpreter(ExprVisitor, StmtVisitor):
         #     return value
         # raise RunTimeError(expr.name, f"Variable {{{expr.name.lexeme}}} must be initialized in order to be accessed")
 
-    def look_up_var(self, name: PloxToken, expr: Expr) -> object:
-        distance = self.locals.get(expr)
-        if distance:
-            return self.env.fetchAt(distance, name)
+    def look_up_var(self, name: PloxToken, expr: Variable | This) -> object:
+        if expr.depth is not None:
+            return self.env.fetchAt(expr.depth, expr.slot)
         return self.globals.fetch(name)
 
-    def visitLogical(self, expr: Logical) -> object:
+    def visitOr(self, expr: Or) -> object:
+        left = self._eval(expr.left)
+        if self._isTruthy(left): return left
+        return self._eval(expr.right)
+
+    def visitAnd(self, expr: And) -> object:
         left = self._eval(expr.left)
-        if expr.operator.type == TT.OR:
-            if self._isTruthy(left): return left
-        elif expr.operator.type == TT.AND:
-            if not self._isTruthy(left):
-                return left
+        if not self._isTruthy(left): return left
         return self._eval(expr.right)
 
     def visitGrouping(self, expr: Grouping) -> object:
         return self._eval(expr.expression)
 
-    def visitUnary(self, expr: Unary) -> object:
+    # The parser gives each operator its own node class. Where an operator
+    # takes more than one kind of operand, its node quickens: the first
+    # evaluation rewrites it into a class from quickening specialized on the
+    # operand types it saw, whose visit guards on them and hands other
+    # operands back to the generic code. Specialized visits evaluate the
+    # operands with accept directly.
+
+    def visitNegate(self, expr: Negate) -> object:
+        right = expr.right.accept(self)
+        if type(right) is float:
+            return - right
+        raise RunTimeError(expr.operator, "Operand must be a number")
+
+    def visitNot(self, expr: Not) -> object:
+        return not self._isTruthy(expr.right.accept(self))
+
+    def visitSubtract(self, expr: Subtract) -> object:
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if type(left) is float and type(right) is float:
+            return left - right
+        raise RunTimeError(expr.operator, "Operands must be numbers")
+
+    def visitMultiply(self, expr: Multiply) -> object:
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if type(left) is float and type(right) is float:
+            return left * right
+        raise RunTimeError(expr.operator, "Operands must be numbers")
+
+    def visitDivide(self, expr: Divide) -> object:
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if type(left) is not float or type(right) is not float:
+            raise RunTimeError(expr.operator, "Operands must be numbers")
+        if not right:
+            raise RunTimeError(expr.operator, "Tried dividing by zero")
+        return left / right
+
+    def visitAdd(self, expr: Add) -> object:
+        left = self._eval(expr.left)
         right = self._eval(expr.right)
-
-        match expr.operator.type:
-            case TT.MINUS:
-                self._check_number(expr.operator, right)
-                return - right
-            case TT.BANG:
-                return not self._isTruthy(right)
-            
-    def visitBinary(self, expr: Binary) -> object:
+        if type(left) is float and type(right) is float:
+            self._quicken(expr, AddNumbers)
+        elif type(left) is str and type(right) is str:
+            self._quicken(expr, ConcatStrings)
+        return self._add(left, right)
+
+    def visitAddNumbers(self, expr: AddNumbers) -> object:
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if type(left) is float and type(right) is float:
+            return left + right
+        self._deoptimize(expr, Add)
+        return self._add(left, right)
+
+    def visitConcatStrings(self, expr: ConcatStrings) -> object:
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if type(left) is str and type(right) is str:
+            return self._stringify(left) + self._stringify(right)
+        self._deoptimize(expr, Add)
+        return self._add(left, right)
+
+    def _add(self, left: object, right: object) -> object:
+        if isinstance(left, str) or isinstance(right, str):
+            return self._stringify(left) + self._stringify(right)
+        return self._numify(left) + self._numify(right)
+
+    # comparisons turn operands that aren't numbers into numbers first
+    def visitGreater(self, expr: Greater) -> object:
         left = self._eval(expr.left)
         right = self._eval(expr.right)
-
-        match expr.operator.type:
-            # Arithmatic -------------------------------------------
-            case TT.MINUS:
-                self._check_number(expr.operator, left, right)
-                return left - right
-            case TT.SLASH:
-                self._check_number(expr.operator, left, right)
-                try:
-                    return left / right
-                except ZeroDivisionError:
-                    raise RunTimeError(expr.operator, "Tried dividing by zero")
-            case TT.STAR:
-                self._check_number(expr.operator, left, right)
-                return left * right
-            case TT.PLUS:
-                if isinstance(left, str) or isinstance(right, str):
-                    return self._stringify(left) + self._stringify(right)
-                else:
-                    return self._numify(left) + self._numify(right)
-            # Comparison -------------------------------------------
-            case TT.GREATER:
-                # self._check_number(expr.operator, left, right)
-                return self._numify(left) > self._numify(right)
-            case TT.GREATER_EQUAL:
-                # self._check_number(expr.operator, left, right)
-                return self._numify(left) >= self._numify(right)
-            case TT.LESS:
-                # self._check_number(expr.operator, left, right)
-                return self._numify(left) < self._numify(right)
-            case TT.LESS_EQUAL:
-                # self._check_number(expr.operator, left, right)
-                return self._numify(left) <= self._numify(right)
-            # Comaprison - equality --------------------------------
-            case TT.EQUAL_EQUAL:
-                return left == right
-            case TT.BANG_EQUAL:
-                return not (left == right)
+        if type(left) is float and type(right) is float:
+            self._quicken(expr, GreaterNumbers)
+        return self._numify(left) > self._numify(right)
+
+    def visitGreaterNumbers(self, expr: GreaterNumbers) -> object:
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if type(left) is float and type(right) is float:
+            return left > right
+        self._deoptimize(expr, Greater)
+        return self._numify(left) > self._numify(right)
+
+    def visitGreaterEqual(self, expr: GreaterEqual) -> object:
+        left = self._eval(expr.left)
+        right = self._eval(expr.right)
+        if type(left) is float and type(right) is float:
+            self._quicken(expr, GreaterEqualNumbers)
+        return self._numify(left) >= self._numify(right)
+
+    def visitGreaterEqualNumbers(self, expr: GreaterEqualNumbers) -> object:
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if type(left) is float and type(right) is float:
+            return left >= right
+        self._deoptimize(expr, GreaterEqual)
+        return self._numify(left) >= self._numify(right)
+
+    def visitLess(self, expr: Less) -> object:
+        left = self._eval(expr.left)
+        right = self._eval(expr.right)
+        if type(left) is float and type(right) is float:
+            self._quicken(expr, LessNumbers)
+        return self._numify(left) < self._numify(right)
+
+    def visitLessNumbers(self, expr: LessNumbers) -> object:
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if type(left) is float and type(right) is float:
+            return left < right
+        self._deoptimize(expr, Less)
+        return self._numify(left) < self._numify(right)
+
+    def visitLessEqual(self, expr: LessEqual) -> object:
+        left = self._eval(expr.left)
+        right = self._eval(expr.right)
+        if type(left) is float and type(right) is float:
+            self._quicken(expr, LessEqualNumbers)
+        return self._numify(left) <= self._numify(right)
+
+    def visitLessEqualNumbers(self, expr: LessEqualNumbers) -> object:
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if type(left) is float and type(right) is float:
+            return left <= right
+        self._deoptimize(expr, LessEqual)
+        return self._numify(left) <= self._numify(right)
+
+    def visitEqual(self, expr: Equal) -> object:
+        return expr.left.accept(self) == expr.right.accept(self)
+
+    def visitNotEqual(self, expr: NotEqual) -> object:
+        return not (expr.left.accept(self) == expr.right.accept(self))
+
+    def _quicken(self, expr: Binary, specialized: type) -> None:
+        if self.guard_failures.get(expr, 0) < RESPECIALIZE_LIMIT:
+            expr.__class__ = specialized
+
+    def _deoptimize(self, expr: Binary, generic: type) -> None:
+        """A specialized node's guard failed: turn it back into the generic
+        {generic}, which specializes it again on the next operands unless it
+        has failed RESPECIALIZE_LIMIT times."""
+        self.guard_failures[expr] = self.guard_failures.get(expr, 0) + 1
+        expr.__class__ = generic
 
     def visitCall(self, expr: Call) -> object:
-        callee : ploxCallable = self._eval(expr.callee)
+        callee = self._eval(expr.callee)
+        args = self._arguments(callee, expr.paren, expr.arguments)
+        return callee.call(self, args)
 
+    def _arguments(self, callee: ploxCallable, paren: PloxToken, arguments: List[Expr]) -> list:
         args = []
-        for arg in expr.arguments:
+        for arg in arguments:
             args.append({"expr": arg, "value": self._eval(arg)})
         if not isinstance(callee, ploxCallable):
-            raise RunTimeError(expr.paren, "Tried to call non-callable object")
+            raise RunTimeError(paren, "Tried to call non-callable object")
 
         if len(args) != callee.arity():
-            raise RunTimeError(expr.paren,f"Expected {callee.arity()} arguments, but got {len(args)}")
+            raise RunTimeError(paren,f"Expected {callee.arity()} arguments, but got {len(args)}")
+        return args
+
+    def visitInvoke(self, expr: Invoke) -> object:
+        method, obj, args = self._invoke_target(expr)
+        if obj is None:
+            return method.call(self, args)
+        return method.invoke(self, obj, args)
+
+    def _invoke_target(self, expr: Invoke) -> tuple:
+        """Callee, receiver and arguments of obj.name(...); the receiver is
+        None when the name is a field holding a callable."""
+        obj = self._eval(expr.obj)
+        if not isinstance(obj, ploxInstance):
+            raise RunTimeError(expr.name, "Only instances have properties")
 
-        return callee.call(self, args)
+        # inline cache: a shape without a field of this name, on the same class,
+        # always resolves to the same method
+        cache = expr.cache
+        if obj.shape is cache.shape and obj.klass is cache.klass:
+            method = cache.method
+        else:
+            slot = obj.shape.slots.get(expr.name.lexeme)
+            if slot is not None:
+                callee = obj.values[slot]
+                return callee, None, self._arguments(callee, expr.paren, expr.arguments)
+            method = obj.klass.find_method(expr.name.lexeme)
+            if method is None:
+                raise RunTimeError(expr.name, f"Undefined property {{{expr.name.lexeme}}}")
+            cache.shape = obj.shape
+            cache.klass = obj.klass
+            cache.method = method
+
+        return method, obj, self._arguments(method, expr.paren, expr.arguments)
+
+    def _call_target(self, expr: Call | Invoke) -> tuple:
+        if isinstance(expr, Invoke):
+            return self._invoke_target(expr)
+        callee = self._eval(expr.callee)
+        return callee, None, self._arguments(callee, expr.paren, expr.arguments)
 
     def visitSubscriptable(self, expr: Subscriptable) -> object:
         subscribee = self._eval(expr.subscribee)
@@ -245,6 +417,15 @@ class Interpreter(ExprVisitor, StmtVisitor):
     def visitGet(self, expr: Get) -> object:
         obj = self._eval(expr.obj)
         if isinstance(obj, ploxInstance):
+            # inline cache: the last shape seen here and its field slot
+            cache = expr.cache
+            if obj.shape is cache.shape:
+                return obj.values[cache.slot]
+            slot = obj.shape.slots.get(expr.name.lexeme)
+            if slot is not None:
+                cache.shape = obj.shape
+                cache.slot = slot
+                return obj.values[slot]
             return obj.get(expr.name)
 
         raise RunTimeError(expr.name, "Only instances have properties")
@@ -255,16 +436,29 @@ class Interpreter(ExprVisitor, StmtVisitor):
             raise RunTimeError(expr.name, "Only instances have fields")
 
         value = self._eval(expr.value)
+        # inline cache: either an existing field's slot, or the transition
+        # taken when this site adds the field to the cached shape
+        shape = obj.shape
+        cache = expr.cache
+        if shape is cache.shape:
+            if cache.next_shape is shape:
+                obj.values[cache.slot] = value
+            else:
+                obj.shape = cache.next_shape
+                obj.values.append(value)
+            return value
         obj.set(expr.name, value)
+        cache.shape = shape
+        cache.next_shape = obj.shape
+        cache.slot = obj.shape.slots[expr.name.lexeme]
         return value
 
     def visitThis(self, expr: This) -> object:
         return self.look_up_var(expr.keyword, expr)
 
     def visitParent(self, expr: Parent) -> object:
-        distance = self.locals.get(expr)
-        superclass : ploxClass = self.env.fetchAt(distance, expr.keyword)
-        obj : ploxInstance = self.env.fetchAt(distance - 1, PloxToken(TT.THIS, "this", None, expr.keyword.line))
+        superclass : ploxClass = self.env.fetchAt(expr.depth, expr.slot)
+        obj : ploxInstance = self.env.fetchAt(expr.depth - 1, 0)
         method = superclass.find_method(expr.method.lexeme)
         if method is None:
             raise RunTimeError(expr.method, f"Undefined property {{{expr.method.lexeme}}}")
@@ -330,18 +524,23 @@ class Interpreter(ExprVisitor, StmtVisitor):
             else:
                 raise RunTimeError(operator, "Operands must be numbers")
 
-    def _exec(self, stmt: Stmt) -> None:
-        stmt.accept(self)
+    def _exec(self, stmt: Stmt) -> Completion | None:
+        return stmt.accept(self)
 
-    def _resolve(self, expr: Expr, depth: int) -> None:
-        self.locals[expr] = depth
+    def _define(self, name: PloxToken, slot: int | None, value: object) -> None:
+        if slot is None:
+            self.globals.assign(name, value)
+        else:
+            self.env.values[slot] = value
 
-    def _exec_block(self, statements: List[Stmt], env: Environment) -> None:
+    def _exec_block(self, statements: List[Stmt], env: Environment) -> Completion | None:
         previous = self.env
         try:
             self.env = env
             for statement in statements:
-                self._exec(statement)
+                completion = self._exec(statement)
+                if completion is not None:
+                    return completion
         finally:
             self.env = previous
 
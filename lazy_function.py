@@ -0,0 +1,56 @@
+from typing import Callable, List
+
+from error_types import ParserError
+from plox_token import PloxToken
+from Expr import FuncExpr
+from Stmt import Stmt
+
+_body = FuncExpr.body
+_size = FuncExpr.size
+
+
+class LazyFuncExpr(FuncExpr):
+    """A FuncExpr whose body has only been brace-matched by the parser.
+    The body is parsed, then resolved against the scopes the Resolver saved
+    at the declaration (and optimized, under -O), the first time {body} or
+    {size} is read, which for the tree-walker is the function's first call."""
+    __slots__ = ("parse_body", "resolve_body", "optimize_body")
+
+    def __init__(self, params: List[PloxToken], type: str, parse_body: Callable[[], List[Stmt]]):
+        self.parse_body = parse_body
+        self.resolve_body : Callable[[FuncExpr], None] | None = None
+        self.optimize_body : Callable[[FuncExpr], None] | None = None
+        super().__init__(params, None, type)
+
+    def deferred(self) -> bool:
+        return self.parse_body is not None
+
+    def materialize(self) -> None:
+        parse, resolve, optimize = self.parse_body, self.resolve_body, self.optimize_body
+        self.parse_body = self.resolve_body = self.optimize_body = None
+        try:
+            if parse: _body.__set__(self, parse())
+            if resolve: resolve(self)
+        except ParserError:
+            # the errors are reported again if the body is asked for again
+            self.parse_body, self.resolve_body, self.optimize_body = parse, resolve, optimize
+            raise
+        if optimize: optimize(self)
+
+    @property
+    def body(self) -> List[Stmt]:
+        if self.parse_body or self.resolve_body: self.materialize()
+        return _body.__get__(self)
+
+    @body.setter
+    def body(self, statements: List[Stmt]) -> None:
+        _body.__set__(self, statements)
+
+    @property
+    def size(self) -> int:
+        if self.parse_body or self.resolve_body: self.materialize()
+        return _size.__get__(self)
+
+    @size.setter
+    def size(self, size: int) -> None:
+        _size.__set__(self, size)
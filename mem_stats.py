@@ -0,0 +1,149 @@
+from __future__ import annotations
+import gc
+import sys
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Callable, Type, TextIO
+
+from Expr import FuncExpr
+from Stmt import *
+from plox_callable import ploxFunction, ploxClass, ploxInstance
+from completions import Completion
+from environment import Environment
+from interpreter import Interpreter
+from profiler import first_line
+
+# who created an environment, told apart by the frame calling _exec_block
+ENVIRONMENT_ORIGINS = {
+    Interpreter.visitBlock.__code__: "block",
+    ploxFunction.execute.__code__: "call",
+    Interpreter.visitWhile.__code__: "while continue",
+}
+KINDS = ["Environment (block)", "Environment (call)", "Environment (while continue)", "Environment (class parent)",
+         "ploxFunction", "bound method", "ploxClass", "ploxInstance"]
+
+
+class MemStats:
+    """Runtime objects allocated by kind and by the Lox line that allocated
+    them, with tracemalloc's view of the memory in use."""
+    def __init__(self) -> None:
+        self.allocations : Counter = Counter()
+        self.by_line : Dict[int, Counter] = dict()
+        self.line = 0
+        self.live : Counter = Counter()
+        self.unreachable = 0
+        self.peak = 0
+        self.current = 0
+
+    def allocate(self, kind: str, count: int = 1) -> None:
+        self.allocations[kind] += count
+        line = self.by_line.get(self.line)
+        if line is None:
+            line = self.by_line[self.line] = Counter()
+        line[kind] += count
+
+    def start(self) -> None:
+        tracemalloc.start()
+
+    def finish(self) -> None:
+        self.current, self.peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # what only reference cycles kept alive, then what the program still holds
+        self.unreachable = gc.collect()
+        for obj in gc.get_objects():
+            kind = type(obj)
+            if kind is Environment:
+                self.live["Environment"] += 1
+            elif isinstance(obj, ploxFunction):
+                self.live["bound method" if obj.this is not None else "ploxFunction"] += 1
+            elif isinstance(obj, ploxClass):
+                self.live["ploxClass"] += 1
+            elif isinstance(obj, ploxInstance):
+                self.live["ploxInstance"] += 1
+
+    def report(self, source: str | None = None, out: TextIO | None = None, limit: int = 15) -> None:
+        print(f"{'allocated':>10} {'live at end':>12}  kind", file=out)
+        for kind in KINDS:
+            live = "" if kind.startswith("Environment") else self.live[kind]
+            print(f"{self.allocations[kind]:>10} {live:>12}  {kind}", file=out)
+        print(f"{'':>10} {self.live['Environment']:>12}  Environment (all)", file=out)
+        print(f"\nunreachable objects freed by the garbage collector at the end: {self.unreachable}", file=out)
+        print(f"traced memory: peak {self.peak / 1024:.0f} KiB, {self.current / 1024:.0f} KiB at the end", file=out)
+
+        source_lines = source.splitlines() if source else []
+        lines = sorted(self.by_line.items(), key=lambda item: -sum(item[1].values()))
+        print(f"\n{'objects':>9} {'env':>8} {'fun':>8} {'bound':>8} {'inst':>8}  line", file=out)
+        for line, kinds in lines[:limit]:
+            environments = sum(count for kind, count in kinds.items() if kind.startswith("Environment"))
+            text = source_lines[line - 1].strip() if 0 < line <= len(source_lines) else ""
+            print(f"{sum(kinds.values()):>9} {environments:>8} {kinds['ploxFunction']:>8} {kinds['bound method']:>8} "
+                  f"{kinds['ploxInstance']:>8}  {line:>5}: {text}", file=out)
+
+
+class countedFunction(ploxFunction):
+    # bind isn't handed the interpreter, so the counts it adds to are shared
+    stats : MemStats | None = None
+
+    def bind(self, instance: ploxInstance, owner: ploxClass | None = None) -> ploxFunction:
+        countedFunction.stats.allocate("bound method")
+        return super().bind(instance, owner)
+
+
+class countedClass(ploxClass):
+    def call(self, interpreter: MemStatsInterpreter, arguments: list) -> object:
+        interpreter.stats.allocate("ploxInstance")
+        return super().call(interpreter, arguments)
+
+
+class MemStatsInterpreter(Interpreter):
+    """The tree-walker counting the environments, functions, bound methods,
+    classes and instances it creates, swapped in for --mem-stats."""
+    function_type = countedFunction
+    class_type = countedClass
+
+    def __init__(self, error: Callable[[Type[Exception]], None], repl: bool = False):
+        super().__init__(error, repl)
+        self.stats = countedFunction.stats = MemStats()
+        self.statement_lines : Dict[Stmt, int] = dict()
+
+    def interpret(self, statements: List[Stmt]) -> None:
+        self.stats.start()
+        try:
+            super().interpret(statements)
+        finally:
+            self.stats.finish()
+
+    def visitClassStmt(self, stmt: ClassStmt) -> None:
+        self.stats.allocate("ploxFunction", len(stmt.methods))
+        self.stats.allocate("ploxClass")
+        if stmt.parentclass:
+            self.stats.allocate("Environment (class parent)")
+        super().visitClassStmt(stmt)
+
+    def visitFunction(self, stmt: Function) -> None:
+        self.stats.allocate("ploxFunction")
+        super().visitFunction(stmt)
+
+    def visitFuncExpr(self, expr: FuncExpr) -> object:
+        self.stats.allocate("ploxFunction")
+        return super().visitFuncExpr(expr)
+
+    def _exec_block(self, statements: List[Stmt], env: Environment) -> Completion | None:
+        origin = ENVIRONMENT_ORIGINS.get(sys._getframe(1).f_code, "block")
+        self.stats.allocate(f"Environment ({origin})")
+        return super()._exec_block(statements, env)
+
+    def _exec(self, stmt: Stmt) -> Completion | None:
+        if type(stmt) is Block and self.stats.line or type(stmt) is Empty:
+            # a block's environment counts against the statement it belongs to,
+            # and the placeholder ending loop bodies isn't on a line of its own
+            return stmt.accept(self)
+        line = self.statement_lines.get(stmt)
+        if line is None:
+            line = self.statement_lines[stmt] = first_line(stmt)
+        stats = self.stats
+        enclosing, stats.line = stats.line, line
+        try:
+            return stmt.accept(self)
+        finally:
+            stats.line = enclosing
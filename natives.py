@@ -1,8 +1,33 @@
 from time import time, sleep
+import sys
 from typing import Generator
 
 from plox_callable import *
+from Expr import Expr, FuncExpr, Variable, Get, Set, Assign
 from error_types import RunTimeError
+from quickening import fields
+
+
+def argument_token(node: object) -> PloxToken | None:
+    """The first token in a native's argument expression, which its errors
+    are reported at; None for a literal, which keeps no token."""
+    if isinstance(node, dict):
+        return argument_token(node["expr"])
+    if isinstance(node, PloxToken):
+        return node
+    if isinstance(node, list):
+        for item in node:
+            token = argument_token(item)
+            if token: return token
+        return None
+    if isinstance(node, FuncExpr):
+        # reading the body of a lazily parsed function would parse it
+        return argument_token(node.params)
+    if isinstance(node, Expr):
+        for name in fields(node):
+            token = argument_token(getattr(node, name))
+            if token: return token
+    return None
 
 
 class Native(ploxCallable):
@@ -72,6 +97,69 @@ class Sleep(Native):
         return "<native fun>"
 
 
+class GetC(Native):
+    def arity(self) -> int:
+        return 0
+
+    def call(self, interpreter, args: list) -> float:
+        char = sys.stdin.read(1)
+        return float(ord(char)) if char else -1.0
+
+    def help(self) -> str:
+        return "Reads one character from standard input and returns its code, or -1 at the end of input"
+
+    def __repr__(self) -> str:
+        return "<native fun>"
+
+
+class Chr(Native):
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter, args: list) -> str:
+        code = args[0]["value"]
+        if not isinstance(code, float) or not 0 <= code < 0x110000:
+            raise RunTimeError(argument_token(args[0]), "argument must be a character code")
+        return chr(int(code))
+
+    def help(self) -> str:
+        return "Returns the one-character string with the given character code"
+
+    def __repr__(self) -> str:
+        return "<native fun>"
+
+
+class Exit(Native):
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter, args: list) -> None:
+        code = args[0]["value"]
+        if not isinstance(code, float):
+            raise RunTimeError(argument_token(args[0]), "argument must be a number")
+        exit(int(code))
+
+    def help(self) -> str:
+        return "Ends the program with the given exit status"
+
+    def __repr__(self) -> str:
+        return "<native fun>"
+
+
+class PrintError(Native):
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter, args: list) -> None:
+        print(interpreter._stringify(args[0]["value"]), file=sys.stderr)
+
+    def help(self) -> str:
+        return "Prints its argument to standard error"
+
+    def __repr__(self) -> str:
+        return "<native fun>"
+
+
 class Struct(Native):
     def arity(self) -> int:
         return 1
@@ -79,29 +167,28 @@ class Struct(Native):
     def call(self, interpreter, args:list) -> str:
         callable = args[0]["value"]
         if isinstance(callable, ploxFunction):
-            try:
-                inp = args[0]["expr"].name.lexeme
-            except:
-                inp = "EXPRESSION"
+            inp = self._label(args[0]["expr"])
             return "\n".join(self._struct_func(inp, callable, "function"))
 
         elif isinstance(callable, ploxClass):
-            try:
-                inp = args[0]["expr"].name.lexeme
-            except:
-                inp = "EXPRESSION"
+            inp = self._label(args[0]["expr"])
             return "\n".join(self._struct_class(inp, callable))
         elif isinstance(callable, ploxInstance):
-            try:
-                inp = args[0]["expr"].name.lexeme
-            except:
-                inp = "EXPRESSION"
+            inp = self._label(args[0]["expr"])
             return "\n".join(self._struct_instance(inp, callable))
         else:
             raise NotImplementedError
     
     def __repr__(self) -> str:
         return "<native fun>"
+
+    @staticmethod
+    def _label(expr: Expr) -> str:
+        # the name the argument was read from or stored to; an Invoke's name
+        # is the method called, not the value
+        if isinstance(expr, (Variable, Get, Set, Assign)):
+            return expr.name.lexeme
+        return "EXPRESSION"
  
     def _struct_class(self, name: str, callable: ploxClass) -> Generator[str, None, None]:
         yield "--------------------------"
@@ -0,0 +1,215 @@
+from typing import List
+
+from Expr import *
+from Expr import Assign
+from Stmt import *
+from Stmt import Expression, Var
+from tokenType import TokenType as TT
+from interpreter import Interpreter
+from lazy_function import LazyFuncExpr
+from error_types import RunTimeError
+
+class Optimizer(ExprVisitor, StmtVisitor):
+    """Rewrites a resolved tree before it runs: folds operators over literals,
+    drops Grouping wrappers and Empty statements and prunes constant ifs.
+
+    Folding evaluates the node with an Interpreter, so results follow Plox's
+    own semantics; a node whose evaluation fails is left for runtime to report.
+    """
+    def __init__(self) -> None:
+        self.evaluator = Interpreter(lambda err: None)
+
+    def optimize(self, statements: List[Stmt]) -> List[Stmt]:
+        return self._stmts(statements)
+
+    ################ Statements ####################
+
+    def visitEmpty(self, stmt: Empty) -> Stmt:
+        return stmt
+
+    def visitBlock(self, stmt: Block) -> Stmt:
+        stmt.statements = self._stmts(stmt.statements)
+        return stmt
+
+    def visitExpression(self, stmt: Expression) -> Stmt:
+        stmt.expression = self._expr(stmt.expression)
+        return stmt
+
+    def visitIf(self, stmt: If) -> Stmt:
+        stmt.condition = self._expr(stmt.condition)
+        stmt.thenBranch = self._stmt(stmt.thenBranch)
+        if stmt.elseBranch:
+            stmt.elseBranch = self._stmt(stmt.elseBranch)
+        if isinstance(stmt.condition, Literal):
+            if Interpreter._isTruthy(stmt.condition.value):
+                return stmt.thenBranch
+            return stmt.elseBranch or Empty()
+        return stmt
+
+    def visitWhile(self, stmt: While) -> Stmt:
+        stmt.condition = self._expr(stmt.condition)
+        body = stmt.body
+        if isinstance(body, Block):
+            keep_last = self._has_continue(body)
+            # {continue} re-runs the last statement of the body, so that one
+            # stays even if it is the Empty placeholder
+            last = body.statements[-1] if keep_last and body.statements else None
+            body.statements = self._stmts(body.statements, last)
+        else:
+            stmt.body = self._stmt(body)
+        return stmt
+
+    def visitPrint(self, stmt: Print) -> Stmt:
+        stmt.expression = self._expr(stmt.expression)
+        return stmt
+
+    def visitVar(self, stmt: Var) -> Stmt:
+        if stmt.Initializer is not None:
+            stmt.Initializer = self._expr(stmt.Initializer)
+        return stmt
+
+    def visitClassStmt(self, stmt: ClassStmt) -> Stmt:
+        for method in stmt.methods:
+            self.visitFuncExpr(method.function)
+        return stmt
+
+    def visitFunction(self, stmt: Function) -> Stmt:
+        self.visitFuncExpr(stmt.function)
+        return stmt
+
+    def visitReturn(self, stmt: Return) -> Stmt:
+        if stmt.value:
+            stmt.value = self._expr(stmt.value)
+        return stmt
+
+    def visitBreak(self, stmt: Break) -> Stmt:
+        return stmt
+
+    def visitContinue(self, stmt: Continue) -> Stmt:
+        return stmt
+
+    ################ Expressions ###################
+
+    def visitFuncExpr(self, expr: FuncExpr) -> Expr:
+        if isinstance(expr, LazyFuncExpr) and expr.deferred():
+            # optimized once it is parsed, reading {body} now would parse it
+            expr.optimize_body = self.visitFuncExpr
+            return expr
+        expr.body = self._stmts(expr.body)
+        return expr
+
+    def visitAssign(self, expr: Assign) -> Expr:
+        expr.value = self._expr(expr.value)
+        return expr
+
+    def visitVariable(self, expr: Variable) -> Expr:
+        return expr
+
+    def visitLogical(self, expr: Logical) -> Expr:
+        expr.left = self._expr(expr.left)
+        expr.right = self._expr(expr.right)
+        if isinstance(expr.left, Literal):
+            truthy = Interpreter._isTruthy(expr.left.value)
+            if (expr.operator.type == TT.OR) == truthy:
+                return expr.left
+            return expr.right
+        return expr
+
+    def visitGrouping(self, expr: Grouping) -> Expr:
+        return self._expr(expr.expression)
+
+    def visitLiteral(self, expr: Literal) -> Expr:
+        return expr
+
+    def visitListExpr(self, expr: ListExpr) -> Expr:
+        expr.values = [self._expr(value) for value in expr.values]
+        return expr
+
+    def visitUnary(self, expr: Unary) -> Expr:
+        expr.right = self._expr(expr.right)
+        if isinstance(expr.right, Literal):
+            return self._fold(expr)
+        return expr
+
+    def visitBinary(self, expr: Binary) -> Expr:
+        expr.left = self._expr(expr.left)
+        expr.right = self._expr(expr.right)
+        if isinstance(expr.left, Literal) and isinstance(expr.right, Literal):
+            if (expr.left.value is None or expr.right.value is None) and \
+               expr.operator.type not in (TT.EQUAL_EQUAL, TT.BANG_EQUAL):
+                # the interpreter fails on nil operands outside a RunTimeError;
+                # that stays a runtime matter
+                return expr
+            return self._fold(expr)
+        return expr
+
+    def visitCall(self, expr: Call) -> Expr:
+        expr.callee = self._expr(expr.callee)
+        expr.arguments = [self._expr(arg) for arg in expr.arguments]
+        return expr
+
+    def visitInvoke(self, expr: Invoke) -> Expr:
+        expr.obj = self._expr(expr.obj)
+        expr.arguments = [self._expr(arg) for arg in expr.arguments]
+        return expr
+
+    def visitSubscriptable(self, expr: Subscriptable) -> Expr:
+        expr.subscribee = self._expr(expr.subscribee)
+        expr.index = self._expr(expr.index)
+        return expr
+
+    def visitGet(self, expr: Get) -> Expr:
+        expr.obj = self._expr(expr.obj)
+        return expr
+
+    def visitSet(self, expr: Set) -> Expr:
+        expr.obj = self._expr(expr.obj)
+        expr.value = self._expr(expr.value)
+        return expr
+
+    def visitThis(self, expr: This) -> Expr:
+        return expr
+
+    def visitParent(self, expr: Parent) -> Expr:
+        return expr
+
+    def visitConditional(self, expr: Conditional) -> Expr:
+        expr.condition = self._expr(expr.condition)
+        expr.then_clause = self._expr(expr.then_clause)
+        expr.else_clause = self._expr(expr.else_clause)
+        if isinstance(expr.condition, Literal):
+            if Interpreter._isTruthy(expr.condition.value):
+                return expr.then_clause
+            return expr.else_clause
+        return expr
+
+    ################################################
+
+    def _fold(self, expr: Unary | Binary) -> Expr:
+        try:
+            return Literal(self.evaluator._eval(expr))
+        except RunTimeError:
+            return expr
+
+    def _has_continue(self, stmt: Stmt) -> bool:
+        if isinstance(stmt, Continue): return True
+        if isinstance(stmt, Block):
+            return any(self._has_continue(statement) for statement in stmt.statements)
+        if isinstance(stmt, If):
+            return self._has_continue(stmt.thenBranch) or \
+                   (stmt.elseBranch is not None and self._has_continue(stmt.elseBranch))
+        return False
+
+    def _stmts(self, statements: List[Stmt], keep: Stmt | None = None) -> List[Stmt]:
+        optimized = []
+        for statement in statements:
+            result = self._stmt(statement)
+            if statement is keep or not isinstance(result, Empty):
+                optimized.append(result)
+        return optimized
+
+    def _stmt(self, stmt: Stmt) -> Stmt:
+        return stmt.accept(self)
+
+    def _expr(self, expr: Expr) -> Expr:
+        return expr.accept(self)
@@ -1,26 +1,77 @@
 #!/bin/python3
 import argparse
 from os import get_terminal_size, path, getcwd
-from typing import List, Type
+from typing import List, Type, Iterator
 from cmd import Cmd
+from sys import stderr
+from time import perf_counter
 
 from plox_token import PloxToken
 from tokenType import TokenType as TT
 from Stmt import Stmt
+from error_types import ParserError
 
-from scanner import Scanner
-from plox_parser import PloxParser
+from scanner import Scanner, RegexScanner, ArrayScanner
+from plox_parser import PloxParser, ArrayParser
 from resolver import Resolver
+from program_cache import ProgramCache
+from optimizer import Optimizer
 from interpreter import Interpreter
+from closure_interpreter import ClosureInterpreter
+from plox_vm import VM
+from py_runtime import PyInterpreter
+from profiler import ProfilingInterpreter
+from sampler import Sampler
+from timings import Timings
+from mem_stats import MemStatsInterpreter
+from plox_callable import method_cache_stats
 
 #temp import
 # from ast_printer import AstPrinter
 
 
+SCANNERS = {
+    "char": Scanner,
+    "regex": RegexScanner,
+    "arrays": ArrayScanner,
+}
+
+ENGINES = {
+    "tree": Interpreter,
+    "closure": ClosureInterpreter,
+    "vm": VM,
+}
+
+
 class PLox:
-    def __init__(self, args: List[str]):
+    def __init__(self, args: List[str], engine: str = "tree", cache_stats: bool = False, optimize: bool = False,
+                 compile_py: bool = False, py_out: str | None = None, use_cache: bool = True,
+                 startup_stats: bool = False, scanner: str = "regex", lazy: bool = False,
+                 profile: bool = False, profile_out: str | None = None, sample_out: str | None = None,
+                 sample_interval: float = 5, timings: bool = False, timings_json: bool = False,
+                 mem_stats: bool = False):
         self.args = args
         self.repl = False
+        self.cache_stats = cache_stats
+        self.optimize = optimize
+        self.use_cache = use_cache
+        self.startup_stats = startup_stats
+        self.scanner = SCANNERS[scanner]
+        self.lazy = lazy
+        self.profile = profile
+        self.profile_out = profile_out
+        self.sample_out = sample_out
+        self.sample_interval = sample_interval
+        self.timings_json = timings_json
+        self.timings = Timings() if timings or timings_json else None
+        engine = ENGINES[engine]
+        if compile_py:
+            engine = lambda error, repl=False: PyInterpreter(error, repl, py_out)
+        if profile:
+            engine = ProfilingInterpreter
+        self.mem_stats = mem_stats
+        if mem_stats:
+            engine = MemStatsInterpreter
 
         self.hadError = False
         self.hadRunTimeError = False
@@ -30,12 +81,12 @@ class PLox:
             exit(64)
 
         elif len(self.args) == 1:
-            self.interpreter = Interpreter(self.runtime_error)
+            self.interpreter = engine(self.runtime_error)
             self.runFile(self.args[0])
             
         else:
             self.repl = True
-            self.interpreter = Interpreter(self.runtime_error, repl=self.repl)
+            self.interpreter = engine(self.runtime_error, repl=self.repl)
             self.runPrompt()
 
     def runFile(self, file_path: str) -> None:
@@ -51,7 +102,20 @@ class PLox:
         with open(f_path, "r") as f:
             lines = f.read()
             f.close()
-        self.run(lines)
+        if self.sample_out:
+            sampler = Sampler(self.sample_interval / 1000)
+            sampler.start()
+        try:
+            self.run(lines, f_path)
+        finally:
+            if self.sample_out:
+                sampler.stop()
+                sampler.write(self.sample_out)
+                print(f"{sampler.samples} samples written to {self.sample_out}", file=stderr)
+        if self.cache_stats: self.report_cache_stats()
+        if self.profile: self.report_profile(lines)
+        if self.timings: self.timings.report(stderr, self.timings_json)
+        if self.mem_stats: self.interpreter.stats.report(lines, stderr)
         if self.hadError: exit(65)
         if self.hadRunTimeError: exit(70)
 
@@ -65,27 +129,72 @@ class PLox:
                 prompt.current_command = ""
                 print("\nEXCEPTION: Interrupted by user")
 
-    def run(self, source: str) -> None:
+    def run(self, source: str, file_path: str | None = None) -> None:
         try:
-            scanner = Scanner(source, self.scanning_error)
-            tokens: List[PloxToken] = scanner.scanTokens()
-
-            parser = PloxParser(tokens, self.parsing_error)
-            statements: List[Stmt] = parser.parse()
-
-            if self.hadError: return
-            resolver = Resolver(self.interpreter, self.resolve_error)
-            resolver.resolve(statements)
-            if self.hadError: return
-            self.interpreter.interpret(statements)
+            start = perf_counter()
+            cache = ProgramCache(file_path) if file_path and self.use_cache else None
+            statements = self.phase("cache load", cache.load, source) if cache else None
+            cached = statements is not None
+            if not cached:
+                statements = self.front_end(source)
+                if statements is None: return
+                # lazily parsed bodies hold on to their tokens and can't be cached
+                if cache and not self.lazy: self.phase("cache store", cache.store, source, statements)
+            if self.startup_stats:
+                origin = "loaded from cache" if cached else "parsed"
+                print(f"front end: {(perf_counter() - start) * 1000:.1f} ms ({origin})", file=stderr)
+            if self.optimize:
+                statements = self.phase("optimize", Optimizer().optimize, statements)
+            if self.timings: self.timings.count(statements)
+            self.phase("execute", self.interpreter.interpret, statements)
 
+        except ParserError:
+            # a lazily parsed function body had errors; they have been reported
+            return
         except KeyboardInterrupt:
             print("\nEXCEPTION: Interrupted by user")
         # print(AstPrinter().stringify(expression))
 
+    def front_end(self, source: str) -> List[Stmt] | None:
+        scanner = self.scanner(source, self.scanning_error)
+        if isinstance(scanner, ArrayScanner):
+            tokens = self.phase("scan", scanner.scanArrays)
+            parser = ArrayParser(tokens, self.parsing_error, self.lazy)
+        else:
+            tokens: Iterator[PloxToken] = scanner.tokenStream()
+            if self.timings:
+                # scan everything first so that scanning and parsing are timed apart
+                tokens = self.phase("scan", list, tokens)
+            parser = PloxParser(tokens, self.parsing_error, self.lazy)
+        if self.timings: self.timings.counts["tokens"] = len(tokens)
+        statements: List[Stmt] = self.phase("parse", parser.parse)
+
+        if self.hadError: return None
+        resolver = Resolver(self.resolve_error)
+        self.phase("resolve", resolver.resolve, statements)
+        if self.hadError: return None
+        return statements
+
+    def phase(self, name: str, action, *args):
+        if self.timings is None:
+            return action(*args)
+        return self.timings.measure(name, action, *args)
+
+    def report_cache_stats(self) -> None:
+        for stat, count in method_cache_stats().items():
+            print(f"{stat:>20}: {count}", file=stderr)
+
+    def report_profile(self, source: str) -> None:
+        if self.profile_out:
+            with open(self.profile_out, "w") as f:
+                self.interpreter.profile.report(source, f, limit=None)
+        else:
+            self.interpreter.profile.report(source, stderr)
+
     ############### ERROR handling #########################
     def runtime_error(self, err: Type[Exception]) -> None:
-        if self.repl:
+        if self.repl or err.token is None:
+            # a native's error about a literal argument has no line to point at
             print(f"RUNTIME ERROR:")
         else:
             print(f"RUNTIME ERROR [at line {err.token.line}]:")
@@ -190,5 +299,58 @@ class PloxCmd(Cmd):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Plox. The Python implementation of the LOX language.")
     parser.add_argument("arguments", type=str, nargs='*')
-    args = vars(parser.parse_args())['arguments']
-    w = PLox(args)
+    parser.add_argument("--engine", choices=ENGINES.keys(), default="tree",
+                        help="execution engine: the AST tree-walker, closure-compiled code or the bytecode VM")
+    parser.add_argument("--scanner", choices=SCANNERS.keys(), default="regex",
+                        help="tokenizer: one compiled regular expression (default), the same into parallel arrays "
+                             "instead of token objects, or the character-at-a-time scanner")
+    parser.add_argument("--cache-stats", action="store_true",
+                        help="print method table statistics to stderr after running a script")
+    parser.add_argument("-O", dest="optimize", action="store_true",
+                        help="fold constants and drop dead code before running")
+    parser.add_argument("--compile-py", action="store_true",
+                        help="transpile the program to Python and run the compiled code")
+    parser.add_argument("--py-out", metavar="FILE",
+                        help="with --compile-py, also write the generated Python source to FILE")
+    parser.add_argument("--no-cache", dest="use_cache", action="store_false",
+                        help="always parse the script instead of loading it from __ploxcache__")
+    parser.add_argument("--startup-stats", action="store_true",
+                        help="print how long scanning, parsing and resolving (or loading the cache) took")
+    parser.add_argument("--lazy", action="store_true",
+                        help="only brace-match function bodies up front; parse and resolve each on its first call")
+    parser.add_argument("--strict", action="store_true",
+                        help="parse every function body before running, even with --lazy, so that all syntax "
+                             "errors are reported")
+    parser.add_argument("--profile", action="store_true",
+                        help="time Lox functions and source lines and print the hottest to stderr (tree-walker only)")
+    parser.add_argument("--profile-out", metavar="FILE",
+                        help="with --profile, write the full report to FILE instead")
+    parser.add_argument("--sample", dest="sample_out", metavar="FILE",
+                        help="sample the Lox call stack while running and write collapsed stacks for flame graph "
+                             "tools to FILE (tree-walker only)")
+    parser.add_argument("--sample-interval", type=float, default=5, metavar="MS",
+                        help="milliseconds between --sample samples (default: 5)")
+    parser.add_argument("--timings", action="store_true",
+                        help="report wall time, CPU time and peak memory of each phase (scan, parse, resolve, "
+                             "execute, ...) with token, node and variable counts to stderr")
+    parser.add_argument("--timings-json", action="store_true",
+                        help="the same report as --timings, as JSON")
+    parser.add_argument("--mem-stats", action="store_true",
+                        help="count the environments, functions, bound methods and instances the program allocates, "
+                             "by kind and by source line, and trace its peak memory (tree-walker only)")
+    options = vars(parser.parse_args())
+    if options['profile'] and (options['engine'] != "tree" or options['compile_py']):
+        parser.error("--profile needs the tree-walking engine")
+    if options['mem_stats'] and (options['engine'] != "tree" or options['compile_py'] or options['profile']
+                                 or options['sample_out']):
+        parser.error("--mem-stats needs the tree-walking engine without --profile or --sample")
+    if options['sample_out'] and (options['engine'] != "tree" or options['compile_py'] or options['profile']):
+        parser.error("--sample needs the tree-walking engine without --profile")
+    w = PLox(options['arguments'], engine=options['engine'], cache_stats=options['cache_stats'],
+             optimize=options['optimize'], compile_py=options['compile_py'], py_out=options['py_out'],
+             use_cache=options['use_cache'], startup_stats=options['startup_stats'],
+             scanner=options['scanner'], lazy=options['lazy'] and not options['strict'],
+             profile=options['profile'], profile_out=options['profile_out'],
+             sample_out=options['sample_out'], sample_interval=options['sample_interval'],
+             timings=options['timings'], timings_json=options['timings_json'],
+             mem_stats=options['mem_stats'])
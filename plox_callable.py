@@ -1,8 +1,9 @@
 from __future__ import annotations
 from typing import Dict
+from weakref import WeakSet
 
 from error_types import RunTimeError
-from unwind_exceptions import *
+from completions import Completion, RETURN, TAIL_CALL
 
 from tokenType import TokenType as TT
 from plox_token import PloxToken
@@ -23,33 +24,59 @@ class ploxFunction(ploxCallable):
         self.declaration = declaration
         self.closure = closure
         self.isInitializer = isInitializer
+        self.isMethod = declaration.type == "method"
+        self.this : ploxInstance | None = None
+        self.owner : ploxClass | None = None
 
     def call(self, interpreter, arguments: list) -> object:
-        env = Environment(RunTimeError, self.closure)
-        for i, param in enumerate(self.declaration.params):
-            env.assign(param, arguments[i]["value"])
-        try:
-            interpreter._exec_block(self.declaration.body, env)
-        except ReturnException as r:
-            if self.isInitializer:
-                return self.closure.fetchAt(0, PloxToken(TT.THIS, "this", None, 0))
-            return r.value
-        if self.isInitializer:
-            return self.closure.fetchAt(0, PloxToken(TT.THIS, "this", None, 0))
-        return None
-    
+        return self.invoke(interpreter, self.this, arguments)
+
+    def invoke(self, interpreter, this: ploxInstance | None, arguments: list) -> object:
+        """Run the function. Calls in tail position come back as TAIL_CALL and
+        are executed in this same loop; instrumented subclasses override
+        {execute} rather than copying it."""
+        function = self
+        while True:
+            completion = function.execute(interpreter, this, arguments)
+            if function.isInitializer:
+                return this
+            if completion is RETURN:
+                return interpreter.return_value
+            if completion is not TAIL_CALL:
+                return None
+            function, receiver, arguments = interpreter.return_value
+            if not isinstance(function, ploxFunction):
+                # natives and classes aren't run by the loop
+                if receiver is not None:
+                    function = function.bind(receiver)
+                return function.call(interpreter, arguments)
+            this = function.this if receiver is None else receiver
+
+    def execute(self, interpreter, this: ploxInstance | None, arguments: list) -> Completion | None:
+        """One activation: the body run in a new frame, with {this} placed in
+        slot 0 for methods."""
+        env = Environment(self.closure, self.declaration.size)
+        if self.isMethod:
+            env.values[0] = this
+            env.values[1:len(arguments) + 1] = [argument["value"] for argument in arguments]
+        else:
+            env.values[:len(arguments)] = [argument["value"] for argument in arguments]
+        return interpreter._exec_block(self.declaration.body, env)
+
     def arity(self) -> int:
         return len(self.declaration.params)
     
-    def bind(self, instance: ploxInstance, callback: callable | None = None) -> ploxFunction:
-        env = Environment(RunTimeError, self.closure)
-        env.assign(PloxToken(TT.THIS, "this", None, 0), instance)
-        bound_method = ploxFunction(self.name, self.declaration, env, self.isInitializer)
-        if callback:
-            bound_method.to_str = callback
+    def bind(self, instance: ploxInstance, owner: ploxClass | None = None) -> ploxFunction:
+        bound_method = type(self)(self.name, self.declaration, self.closure, self.isInitializer)
+        bound_method.this = instance
+        bound_method.owner = owner
         return bound_method
     
     def to_str(self) -> str:
+        if self.owner:
+            if self.isInitializer:
+                return f"<initializer method of [{self.owner.name}]>"
+            return f"<method [{self.name}] member of [{self.owner.name}]>"
         if self.name:
             if self.declaration.type == "function":
                 return f"<fun [{self.name}]>"
@@ -66,41 +93,59 @@ class ploxFunction(ploxCallable):
 
 
 class ploxClass(ploxCallable):
+    # method table statistics, reported by --cache-stats
+    tables = 0
+    inherited = 0
+    lookups = 0
+    misses = 0
+
     def __init__(self, name: str, parentclass: ploxClass, methods: Dict[str, ploxFunction]) -> None:
         self.name = name
         self.parentclass = parentclass
         self.methods = methods
+        self.subclasses : WeakSet[ploxClass] = WeakSet()
+        # flattened method table: inherited methods overlaid with our own,
+        # so a lookup never walks the parent chain
+        self.table : Dict[str, ploxFunction] = dict()
+        if parentclass:
+            self.table.update(parentclass.table)
+            parentclass.subclasses.add(self)
+            ploxClass.inherited += len(parentclass.table.keys() - methods.keys())
+        self.table.update(methods)
+        ploxClass.tables += 1
+
+    def add_method(self, name: str, method: ploxFunction) -> None:
+        self.methods[name] = method
+        self._inherit(name, method)
+
+    def _inherit(self, name: str, method: ploxFunction) -> None:
+        # invalidate the flattened tables of subclasses that don't override it
+        self.table[name] = method
+        for subclass in self.subclasses:
+            if name not in subclass.methods:
+                subclass._inherit(name, method)
 
     def call(self, interpreter, arguments: list) -> object:
         instance = ploxInstance(self)
         initializer = self.find_method("init") # start here if you don't want parent to initalize
                                                # with every child instance
         if initializer:
-            initializer.bind(instance, self.init_print).call(interpreter, arguments)
+            initializer.invoke(interpreter, instance, arguments)
         return instance
 
-    def init_print(self):
-            return f"<initializer method of [{self.name}]>"
-
     def arity(self) -> int:
-        initializer = self.find_method("init")
+        initializer = self.table.get("init")
         if not initializer:
             return 0
         return initializer.arity()
     
     def find_method(self, name: str) -> ploxFunction | None:
-        method = self.methods.get(name)
-        if method:
-            method.to_str = self.method_print(method)
-        elif self.parentclass:
-            method = self.parentclass.find_method(name)
+        ploxClass.lookups += 1
+        method = self.table.get(name)
+        if method is None:
+            ploxClass.misses += 1
         return method
 
-    def method_print(self, method: ploxFunction) -> callable:
-        def wrapper():
-            return f"<method [{method.name}] member of [{self.name}]>"
-        return wrapper
-
     def __str__(self) -> str:
         if self.parentclass:
             return f"<class [{self.name}] child of [{self.parentclass.name}]>"
@@ -110,24 +155,65 @@ class ploxClass(ploxCallable):
         return self.__str__()
 
 
+def method_cache_stats() -> Dict[str, int]:
+    return {
+        "class tables built": ploxClass.tables,
+        "inherited entries": ploxClass.inherited,
+        "method lookups": ploxClass.lookups,
+        "lookup misses": ploxClass.misses,
+    }
+
+
+class Shape:
+    """Hidden class shared by instances that gained the same fields in the
+    same order. Maps field names to indices in the instance's value list."""
+    __slots__ = ("slots", "transitions")
+
+    def __init__(self, slots: Dict[str, int]) -> None:
+        self.slots = slots
+        self.transitions: Dict[str, Shape] = dict()
+
+    def add_field(self, name: str) -> Shape:
+        shape = self.transitions.get(name)
+        if shape is None:
+            slots = dict(self.slots)
+            slots[name] = len(slots)
+            shape = self.transitions[name] = Shape(slots)
+        return shape
+
+EMPTY_SHAPE = Shape(dict())
+
+
 class ploxInstance:
+    __slots__ = ("klass", "shape", "values")
+
     def __init__(self, klass: ploxClass) -> None:
         self.klass = klass
-        self.fields = dict()
+        self.shape = EMPTY_SHAPE
+        self.values = []
+
+    @property
+    def fields(self) -> Dict[str, object]:
+        return {name: self.values[slot] for name, slot in self.shape.slots.items()}
 
     def get(self, name: PloxToken) -> object:
-        if name.lexeme in self.fields.keys():
-            return self.fields.get(name.lexeme)
+        slot = self.shape.slots.get(name.lexeme)
+        if slot is not None:
+            return self.values[slot]
 
         method = self.klass.find_method(name.lexeme)
         if method:
-            callback = self.klass.init_print if name.lexeme =="init" else self.klass.method_print(method)
-            return method.bind(self, callback)
+            return method.bind(self, self.klass)
 
         raise RunTimeError(name, f"Undefined property {{{name.lexeme}}}")
 
     def set(self, name: PloxToken, value: object) -> None:
-        self.fields[name.lexeme] = value
+        slot = self.shape.slots.get(name.lexeme)
+        if slot is None:
+            self.shape = self.shape.add_field(name.lexeme)
+            self.values.append(value)
+        else:
+            self.values[slot] = value
 
     def __str__(self) -> str:
         return f"<[{self.klass.name}] instance>"
@@ -1,18 +1,34 @@
-from typing import List, Optional, Callable
+from typing import List, Optional, Callable, Iterable
 from error_types import ParserError
 
 from plox_token import PloxToken
+from scanner import TokenArrays, TOKEN_TYPES
+from lazy_function import LazyFuncExpr
 from tokenType import TokenType, TokenType as TT
 from Expr import *
 from Stmt import *
 
 
+# binding power of infix operators, loosest first
+ASSIGNMENT, CONDITIONAL, OR, AND, EQUALITY, COMPARISON, TERM, FACTOR = range(1, 9)
+
+
 class PloxParser:
-    def __init__(self, tokens: List[PloxToken], error:Callable[[PloxToken, str], None]) -> None:
-        self.tokens = tokens
-        self.current = 0
+    def __init__(self, tokens: Iterable[PloxToken], error:Callable[[PloxToken, str], None],
+                 lazy: bool = False) -> None:
         self.error = error
+        self.errors = 0
         self.loop_count = 0
+        self.lazy = lazy
+        self._read(tokens)
+
+    def _read(self, tokens: Iterable[PloxToken]) -> None:
+        # tokens are pulled as needed, so a Scanner.tokenStream() works as
+        # well as a list; the parser only looks one token back and one ahead
+        self.tokens = iter(tokens)
+        self.current : PloxToken = next(self.tokens)
+        self.previous : PloxToken | None = None
+        self.lookahead : PloxToken | None = None
 
     def parse(self) -> List[Stmt]:
         statements : List[Stmt, None] = []
@@ -64,9 +80,38 @@ class PloxParser:
                 params.append(self._consume(TT.IDENTIFIER, "Expected parameter name"))
         self._consume(TT.RIGHT_PAREN, "Expected {)} after parameters")
         self._consume(TT.LEFT_BRACE, "Expected { \"{\" } before %s body"%kind)
+        if self.lazy:
+            return LazyFuncExpr(params, kind, self._deferred_body())
         body : List[Stmt] = self.block()
         return FuncExpr(params, body, kind)
 
+    def _deferred_body(self) -> Callable[[], List[Stmt]]:
+        """Skip a function body, returning what parses it later on."""
+        tokens = self._skip_body()
+        parser_class, error, loop_count = type(self), self.error, self.loop_count
+        def parse() -> List[Stmt]:
+            parser = parser_class(tokens, error, lazy=True)
+            parser.loop_count = loop_count
+            body = parser.block()
+            if parser.errors:
+                raise ParserError
+            return body
+        return parse
+
+    def _skip_body(self) -> List[PloxToken]:
+        # brace-match up to and including the closing brace, which block() expects
+        tokens, depth = [], 1
+        while not self._isAtEnd():
+            token = self._advance()
+            tokens.append(token)
+            if token.type == TT.LEFT_BRACE: depth += 1
+            elif token.type == TT.RIGHT_BRACE:
+                depth -= 1
+                if depth == 0:
+                    tokens.append(PloxToken(TT.EOF, "", None, token.line))
+                    return tokens
+        raise self._error(self._peek(), "Expected { \"}\" } after block")
+
     def varDeclaration(self) -> Stmt:
         name : PloxToken = self._consume(TT.IDENTIFIER, "Expected a variable name")
         initializer : Expr = None
@@ -99,6 +144,7 @@ class PloxParser:
         return Return(keyword, value)
 
     def ifStatement(self) -> Stmt:
+        line = self._previous().line
         self._consume(TT.LEFT_PAREN, "Expected {(} after {'if'}")
         condition = self.expression()
         self._consume(TT.RIGHT_PAREN, "Expected {)} after if condition")
@@ -106,20 +152,22 @@ class PloxParser:
         elseBranch = None
         if self._match(TT.ELSE):
             elseBranch = self.statement()
-        return If(condition, thenBranch, elseBranch)
+        return If(condition, thenBranch, elseBranch, line)
 
     def whileStatement(self) -> Stmt:
         self.loop_count += 1
+        line = self._previous().line
         self._consume(TT.LEFT_PAREN, "Expected {(} after {'while'}")
         condition = self.expression()
         self._consume(TT.RIGHT_PAREN, "Expected {)} after if condition")
         body : Stmt = self.statement()
         body = Block([body, Empty()])
         self.loop_count -= 1
-        return While(condition, body)
+        return While(condition, body, line)
 
     def forStatement(self) -> Stmt:
         self.loop_count += 1
+        line = self._previous().line
         self._consume(TT.LEFT_PAREN, "Expected {(} after {'for'}")
         initializer = None
         if self._match(TT.SEMICOLON): initializer = None
@@ -132,17 +180,18 @@ class PloxParser:
         self._consume(TT.SEMICOLON, "Expected {;} after loop condition")
 
         increment = None
+        increment_line = self._peek().line
         if not self._check(TT.RIGHT_PAREN):
             increment = self.expression()
         self._consume(TT.RIGHT_PAREN, "Expected {)} after for clauses")
         body = self.statement()
 
         if increment:
-            body = Block([body, Expression(increment)])
+            body = Block([body, Expression(increment, increment_line)])
 
         if not condition:
             condition = Literal(True)
-        body = While(condition, body)
+        body = While(condition, body, line)
 
         if initializer:
             body = Block([initializer, body])
@@ -153,24 +202,28 @@ class PloxParser:
     def breakStatement(self) -> Stmt:
         if self.loop_count == 0:
             raise self._error(self._previous(), "break statement called but no loop was found")
+        line = self._previous().line
         self._consume(TT.SEMICOLON, "Expected {;} after break")
-        return Break()
+        return Break(line)
 
     def continueStatement(self) -> Stmt:
         if self.loop_count == 0:
             raise self._error(self._previous(), "continue statement called but no loop was found")
+        line = self._previous().line
         self._consume(TT.SEMICOLON, "Expected {;} after continue")
-        return Continue()
+        return Continue(line)
 
     def printStatement(self) -> Stmt:
+        line = self._previous().line
         value = self.expression()
         self._consume(TT.SEMICOLON, "Expected {;} after value")
-        return Print(value)
+        return Print(value, line)
 
     def expressionStatement(self) -> Stmt:
+        line = self._peek().line
         value = self.expression()
         self._consume(TT.SEMICOLON, "Expected {;} after expression")
-        return Expression(value)
+        return Expression(value, line)
 
     def block(self) -> List[Stmt]:
         statements : List[Stmt] = []
@@ -196,97 +249,51 @@ class PloxParser:
         return expr
 
     def assignment(self) -> Expr:
-        expr : Expr = self.conditional()
-
-        if self._match(TT.EQUAL):
-            equals = self._previous()
-            value = self.assignment()
-            if isinstance(expr, Variable):
-                name = expr.name
-                return Assign(name, value)
-            elif isinstance(expr, Get):
-                get = expr
-                return Set(get.obj, get.name, value)
-            self._error(equals, "Invalid assignment target")
-
-        return expr
+        return self.operators(ASSIGNMENT)
 
     def conditional(self) -> Expr:
-        expr : Expr = self.orExpr()
+        return self.operators(CONDITIONAL)
 
-        if self._match(TT.QUESTION):
-            then_clause : Expr = self.expression()
-            self._consume(TT.COLON, "Expected {:} after THEN expression")
-            else_clause : Expr = self.conditional()
-            expr = Conditional(expr, then_clause, else_clause)
-        
-        return expr
-    
-    def orExpr(self) -> Expr:
-        expr : Expr = self.andExpr()
-
-        while self._match(TT.OR):
-            operator : PloxToken = self._previous()
-            right = self.andExpr()
-            expr = Logical(expr, operator, right)
-
-        return expr
-
-    def andExpr(self) -> Expr:
-        expr : Expr = self.equality()
-
-        while self._match(TT.AND):
-            operator : PloxToken = self._previous()
-            right = self.equality()
-            expr = Logical(expr, operator, right)
-
-        return expr
-
-    def equality(self) -> Expr:
-        expr : Expr = self.comparison()
-
-        while self._match(TT.BANG_EQUAL, TT.EQUAL_EQUAL):
-            operator : PloxToken = self._previous()
-            right : Expr = self.comparison()
-            expr = Binary(expr, operator, right)
-
-        return expr
-
-    def comparison(self) -> Expr:
-        expr : Expr = self.term()
-
-        while self._match(TT.GREATER, TT.GREATER_EQUAL, TT.LESS, TT.LESS_EQUAL):
-            operator: PloxToken = self._previous()
-            right : Expr = self.term()
-            expr = Binary(expr, operator, right)
-
-        return expr
-
-    def term(self) -> Expr:
-        expr : Expr = self.factor()
-
-        while self._match(TT.MINUS, TT.PLUS):
-            operator: PloxToken = self._previous()
-            right : Expr = self.factor()
-            expr = Binary(expr, operator, right)
-
-        return expr
-
-    def factor(self) -> Expr:
+    def operators(self, precedence: int) -> Expr:
+        """Pratt loop: an operand, then every infix operator binding at least
+        as tightly as {precedence}, each parsing its own right-hand side."""
         expr : Expr = self.unary()
-
-        while self._match(TT.SLASH, TT.STAR):
-            operator: PloxToken = self._previous()
-            right: Expr = self.unary()
-            expr: Expr = Binary(expr, operator, right)
-
-        return expr
+        rules = self.infix_rules
+        while True:
+            rule = rules[self._peekType().value]
+            if rule is None or rule[0] < precedence:
+                return expr
+            operator : PloxToken = self._advance()
+            expr = rule[1](self, expr, operator, rule[0])
+
+    def assign(self, target: Expr, equals: PloxToken, precedence: int) -> Expr:
+        value = self.operators(ASSIGNMENT)
+        if isinstance(target, Variable):
+            name = target.name
+            return Assign(name, value)
+        elif isinstance(target, Get):
+            get = target
+            return Set(get.obj, get.name, value)
+        self._error(equals, "Invalid assignment target")
+        return target
+
+    def ternary(self, condition: Expr, question: PloxToken, precedence: int) -> Expr:
+        then_clause : Expr = self.expression()
+        self._consume(TT.COLON, "Expected {:} after THEN expression")
+        else_clause : Expr = self.operators(CONDITIONAL)
+        return Conditional(condition, then_clause, else_clause)
+
+    def logical(self, left: Expr, operator: PloxToken, precedence: int) -> Expr:
+        return self.operator_nodes[operator.type.value](left, operator, self.operators(precedence + 1))
+
+    def binary(self, left: Expr, operator: PloxToken, precedence: int) -> Expr:
+        return self.operator_nodes[operator.type.value](left, operator, self.operators(precedence + 1))
 
     def unary(self) -> Expr:
         if self._match(TT.MINUS, TT.BANG):
             operator: PloxToken = self._previous()
             right: Expr = self.unary()
-            return Unary(operator, right)
+            return Negate(operator, right) if operator.type == TT.MINUS else Not(operator, right)
         
         return self.call()
 
@@ -294,12 +301,16 @@ class PloxParser:
         expr : Expr = self.primary()
 
         while True:
-            if self._match(TT.LEFT_PAREN):
+            type = self._peekType()
+            if type is TT.LEFT_PAREN:
+                self._skip()
                 expr = self.finishCall(expr)
-            elif self._match(TT.DOT):
+            elif type is TT.DOT:
+                self._skip()
                 name = self._consume(TT.IDENTIFIER, "Expected property name after {.}")
                 expr = Get(expr, name)
-            elif self._match(TT.LEFT_BRACKET):
+            elif type is TT.LEFT_BRACKET:
+                self._skip()
                 if not self._check(TT.RIGHT_BRACKET):
                     index = self.expression()
                 else:
@@ -320,57 +331,114 @@ class PloxParser:
                 args.append(self.expression())
 
         paren = self._consume(TT.RIGHT_PAREN, "Expected {)} after arguments")
+        if isinstance(callee, Get):
+            return Invoke(callee.obj, callee.name, paren, args)
         return Call(callee, paren, args)
 
     def primary(self) -> Expr:
-        if self._match(TT.FALSE): return Literal(False)
-        if self._match(TT.TRUE): return Literal(True)
-        if self._match(TT.NIL): return Literal(None)
-        if self._match(TT.FUN): return self.functionBody("function")
-        if self._match(TT.THIS): return This(self._previous())
-        if self._match(TT.NUMBER, TT.STRING): return Literal(self._previous().literal)
-
-        if self._match(TT.SUPER, TT.PARENT):
-            keyword = self._previous()
-            self._consume(TT.DOT, f"Expected {{.}} after {{{keyword.lexeme}}}")
-            method = self._consume(TT.IDENTIFIER, "Expected a parent class method name")
-            keyword.lexeme = "parent"
-            return Parent(keyword, method)
-
-        if self._match(TT.LEFT_PAREN):
-            expr: Expr = self.expression()
-            self._consume(TT.RIGHT_PAREN, "Expected {)} after expression")
-            return Grouping(expr)
-
-        if self._match(TT.LEFT_BRACKET):
-            values = []
-            while not self._check(TT.RIGHT_BRACKET) and not self._isAtEnd():
-                values.append(self.conditional())
-                if not self._check(TT.RIGHT_BRACKET):
-                    self._consume(TT.COMMA, "Expected {,} after list item")
-            self._consume(TT.RIGHT_BRACKET, "Expected {]} after list")
-            return ListExpr(values)
-
-        if self._match(TT.IDENTIFIER): return Variable(self._previous())
-        
+        rule = self.prefix_rules[self._peekType().value]
+        if rule is None:
+            raise self._error(self._peek(), "Expected expression")
+        self._skip()
+        return rule(self)
+
+    def literal(self) -> Expr:
+        match self._previous().type:
+            case TT.FALSE: return Literal(False)
+            case TT.TRUE: return Literal(True)
+            case TT.NIL: return Literal(None)
+        return Literal(self._previous().literal)
+
+    def anonymous_function(self) -> Expr:
+        return self.functionBody("function")
+
+    def this(self) -> Expr:
+        return This(self._previous())
+
+    def parent(self) -> Expr:
+        keyword = self._previous()
+        self._consume(TT.DOT, f"Expected {{.}} after {{{keyword.lexeme}}}")
+        method = self._consume(TT.IDENTIFIER, "Expected a parent class method name")
+        keyword.lexeme = "parent"
+        return Parent(keyword, method)
+
+    def grouping(self) -> Expr:
+        expr: Expr = self.expression()
+        self._consume(TT.RIGHT_PAREN, "Expected {)} after expression")
+        return Grouping(expr)
+
+    def list_literal(self) -> Expr:
+        values = []
+        while not self._check(TT.RIGHT_BRACKET) and not self._isAtEnd():
+            values.append(self.conditional())
+            if not self._check(TT.RIGHT_BRACKET):
+                self._consume(TT.COMMA, "Expected {,} after list item")
+        self._consume(TT.RIGHT_BRACKET, "Expected {]} after list")
+        return ListExpr(values)
+
+    def variable(self) -> Expr:
+        return Variable(self._previous())
+
+    def missing_operand(self) -> None:
         # Error production
-        if self._match(
-            TT.BANG_EQUAL, TT.EQUAL_EQUAL,
-            TT.GREATER, TT.GREATER_EQUAL, TT.LESS, TT.LESS_EQUAL,
-            TT.PLUS,
-            TT.STAR, TT.SLASH,
-            ):
-            self._error(self._previous(), "Missing left-hand operand")
-            self.expression()
-            return
-
-        raise self._error(self._peek(), "Expected expression")
+        self._error(self._previous(), "Missing left-hand operand")
+        self.expression()
+        return
+
+    # rule tables, indexed by TokenType value
+    infix_rules = [None] * len(TT)
+    for types, rule in (
+        ((TT.EQUAL,), (ASSIGNMENT, assign)),
+        ((TT.QUESTION,), (CONDITIONAL, ternary)),
+        ((TT.OR,), (OR, logical)),
+        ((TT.AND,), (AND, logical)),
+        ((TT.BANG_EQUAL, TT.EQUAL_EQUAL), (EQUALITY, binary)),
+        ((TT.GREATER, TT.GREATER_EQUAL, TT.LESS, TT.LESS_EQUAL), (COMPARISON, binary)),
+        ((TT.MINUS, TT.PLUS), (TERM, binary)),
+        ((TT.SLASH, TT.STAR), (FACTOR, binary)),
+    ):
+        for type in types: infix_rules[type.value] = rule
+
+    prefix_rules = [None] * len(TT)
+    for types, rule in (
+        ((TT.FALSE, TT.TRUE, TT.NIL, TT.NUMBER, TT.STRING), literal),
+        ((TT.FUN,), anonymous_function),
+        ((TT.THIS,), this),
+        ((TT.SUPER, TT.PARENT), parent),
+        ((TT.LEFT_PAREN,), grouping),
+        ((TT.LEFT_BRACKET,), list_literal),
+        ((TT.IDENTIFIER,), variable),
+        ((TT.BANG_EQUAL, TT.EQUAL_EQUAL, TT.GREATER, TT.GREATER_EQUAL, TT.LESS, TT.LESS_EQUAL,
+          TT.PLUS, TT.STAR, TT.SLASH), missing_operand),
+    ):
+        for type in types: prefix_rules[type.value] = rule
+
+    # the node class each infix operator parses to
+    operator_nodes = [None] * len(TT)
+    for type, node in (
+        (TT.OR, Or), (TT.AND, And),
+        (TT.BANG_EQUAL, NotEqual), (TT.EQUAL_EQUAL, Equal),
+        (TT.GREATER, Greater), (TT.GREATER_EQUAL, GreaterEqual), (TT.LESS, Less), (TT.LESS_EQUAL, LessEqual),
+        (TT.MINUS, Subtract), (TT.PLUS, Add),
+        (TT.SLASH, Divide), (TT.STAR, Multiply),
+    ):
+        operator_nodes[type.value] = node
+    del types, rule, type, node
 
 #####################################################
 
     def _advance(self) -> PloxToken:
-        if not self._isAtEnd(): self.current += 1
-        return self._previous()
+        if not self._isAtEnd():
+            self.previous = self.current
+            if self.lookahead is None:
+                self.current = next(self.tokens)
+            else:
+                self.current, self.lookahead = self.lookahead, None
+        return self.previous
+
+    def _skip(self) -> None:
+        """{_advance} for callers that don't need the token."""
+        self._advance()
 
     def _match(self, *types: TokenType) -> bool:
         for t in types:
@@ -387,18 +455,23 @@ class PloxParser:
     def _checkNext(self, type: TokenType) -> bool:
         if self._isAtEnd():
             return False
-        if self.tokens[self.current + 1].type == TT.EOF:
+        if self.lookahead is None:
+            self.lookahead = next(self.tokens)
+        if self.lookahead.type == TT.EOF:
             return False
-        return self.tokens[self.current + 1].type == type
+        return self.lookahead.type == type
 
     def _isAtEnd(self) -> bool:
-        return self._peek().type == TT.EOF
+        return self.current.type == TT.EOF
+
+    def _peekType(self) -> TokenType:
+        return self.current.type
 
     def _peek(self) -> PloxToken:
-        return self.tokens[self.current]
+        return self.current
     
     def _previous(self) -> PloxToken:
-        return self.tokens[self.current - 1]
+        return self.previous
 
 ####################################################
 
@@ -408,6 +481,7 @@ class PloxParser:
         raise self._error(self._peek(), message)
 
     def _error(self, token: PloxToken, message: str) -> ParserError:
+        self.errors += 1
         self.error(token, message)
         return ParserError
         
@@ -432,6 +506,78 @@ class PloxParser:
 ####################################################
 
 
+class ArrayParser(PloxParser):
+    """PloxParser reading a TokenArrays: checks compare type values in place
+    and a PloxToken is only built for tokens the tree keeps or an error
+    reports."""
+    EOF = TT.EOF.value
+
+    def _read(self, tokens: TokenArrays) -> None:
+        self.tokens = tokens
+        self.types = tokens.types
+        self.current = 0
+        self.built = (-1, None)
+
+    def _advance(self) -> PloxToken:
+        if self.types[self.current] != self.EOF: self.current += 1
+        return self._previous()
+
+    def _skip_body(self) -> TokenArrays:
+        types, LEFT, RIGHT = self.types, TT.LEFT_BRACE.value, TT.RIGHT_BRACE.value
+        start, depth = self.current, 1
+        while types[self.current] != self.EOF:
+            type = types[self.current]
+            self.current += 1
+            if type == LEFT: depth += 1
+            elif type == RIGHT:
+                depth -= 1
+                if depth == 0:
+                    return self.tokens.slice(start, self.current)
+        raise self._error(self._peek(), "Expected { \"}\" } after block")
+
+    def _skip(self) -> None:
+        if self.types[self.current] != self.EOF: self.current += 1
+
+    def _match(self, *types: TokenType) -> bool:
+        current = self.types[self.current]
+        if current == self.EOF:
+            return False
+        for t in types:
+            if t.value == current:
+                self.current += 1
+                return True
+        return False
+
+    def _check(self, type: TokenType) -> bool:
+        current = self.types[self.current]
+        return current != self.EOF and current == type.value
+
+    def _checkNext(self, type: TokenType) -> bool:
+        if self.types[self.current] == self.EOF:
+            return False
+        following = self.types[self.current + 1]
+        return following != self.EOF and following == type.value
+
+    def _isAtEnd(self) -> bool:
+        return self.types[self.current] == self.EOF
+
+    def _peekType(self) -> TokenType:
+        return TOKEN_TYPES[self.types[self.current]]
+
+    def _peek(self) -> PloxToken:
+        return self._token(self.current)
+
+    def _previous(self) -> PloxToken:
+        return self._token(self.current - 1)
+
+    def _token(self, index: int) -> PloxToken:
+        # the same token is often asked for twice in a row (_consume, then
+        # _previous), and should be the same object both times
+        if self.built[0] != index:
+            self.built = (index, self.tokens.token(index))
+        return self.built[1]
+
+
 if __name__ == "__main__":
     tokens = [
         PloxToken(TT.PRINT, "print", None, 1),
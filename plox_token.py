@@ -1,10 +1,15 @@
+from sys import intern
+
 from tokenType import TokenType
 
 
 class PloxToken:
+    # lexemes are interned so every occurrence of a name shares one string
+    __slots__ = ("type", "lexeme", "literal", "line")
+
     def __init__(self, type:TokenType, lexeme:str, literal:object, line:int) -> None:
         self.type = type
-        self.lexeme = lexeme
+        self.lexeme = intern(lexeme)
         self.literal = literal
         self.line = line
 
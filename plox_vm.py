@@ -0,0 +1,462 @@
+from __future__ import annotations
+from typing import List, Callable, Type
+
+from error_types import RunTimeError
+
+from Stmt import Stmt
+from Expr import Expr, Get, Set, Invoke
+from plox_callable import *
+from bytecode_compiler import *
+from bytecode_compiler import BytecodeCompiler, FunctionProto, CallSite
+from interpreter import Interpreter
+
+
+MAX_FRAMES = 10000
+
+
+class vmClosure(ploxFunction):
+    """A compiled function together with the cells it captured."""
+    def __init__(self, proto: FunctionProto, cells: list, this: ploxInstance | None = None) -> None:
+        # top-level scripts have no declaration, so fill in ploxFunction's fields directly
+        self.name = proto.name
+        self.declaration = proto.declaration
+        self.closure = None
+        self.isInitializer = proto.is_initializer
+        self.isMethod = proto.is_method
+        self.owner = None
+        self.proto = proto
+        self.cells = cells
+        self.this = this
+
+    def call(self, interpreter, arguments: list) -> object:
+        return interpreter.call_value(self, [arg["value"] for arg in arguments])
+
+    def arity(self) -> int:
+        return self.proto.arity
+
+    def bind(self, instance: ploxInstance, owner: ploxClass | None = None) -> vmClosure:
+        bound_method = vmClosure(self.proto, self.cells, instance)
+        bound_method.owner = owner
+        return bound_method
+
+
+class VM(Interpreter):
+    """Stack-based virtual machine running code produced by BytecodeCompiler.
+
+    Values, classes, instances and natives are the same runtime objects the
+    tree-walker uses; functions are vmClosures. Each call gets a slot array
+    for its locals while temporaries share one operand stack.
+    """
+    def __init__(self, error: Callable[[Type[Exception]], None], repl: bool = False):
+        super().__init__(error, repl)
+        self.compiler = BytecodeCompiler(repl)
+        self.stack : list = []
+        self.frames : list = []
+
+    def interpret(self, statements: List[Stmt]) -> None:
+        try:
+            scripts = [self.compiler.compile(statement) for statement in statements if statement]
+            for script in scripts:
+                self.print_flag = False
+                self.run(vmClosure(script, []), [None] * script.num_slots)
+        except RunTimeError as err:
+            self.stack.clear()
+            self.frames.clear()
+            self.error(err)
+        except NotImplementedError as err:
+            print("Not yet implemented")
+
+    def call_value(self, callee: ploxCallable, args: list) -> object:
+        self.stack.append(callee)
+        self.stack.extend(args)
+        closure, slots = self._enter(callee, len(args))
+        return self.run(closure, slots)
+
+    def _enter(self, callee: vmClosure, argc: int, this: ploxInstance | None = None) -> tuple:
+        stack = self.stack
+        proto = callee.proto
+        slots = [None] * proto.num_slots
+        if proto.is_method:
+            slots[0] = callee.this if this is None else this
+            slots[1:argc + 1] = stack[len(stack) - argc:]
+        else:
+            slots[:argc] = stack[len(stack) - argc:]
+        del stack[len(stack) - argc - 1:]
+        for slot in proto.cell_slots:
+            slots[slot] = [slots[slot]]
+        return callee, slots
+
+    def run(self, closure: vmClosure, slots: list) -> object:
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        frames = self.frames
+        floor = len(frames)
+        globals = self.globals.values
+        stringify = self._stringify
+        numify = self._numify
+        truthy = self._isTruthy
+
+        proto = closure.proto
+        code = proto.code
+        constants = proto.constants
+        cells = closure.cells
+        ip = 0
+
+        while True:
+            op = code[ip]
+            if op == GET_LOCAL:
+                push(slots[code[ip + 1]])
+                ip += 2
+            elif op == CONSTANT:
+                push(constants[code[ip + 1]])
+                ip += 2
+            elif op == GET_GLOBAL:
+                token = constants[code[ip + 1]]
+                name = token.lexeme
+                if name not in globals:
+                    raise RunTimeError(token, f"Undefined variable {{{name}}}")
+                push(globals[name])
+                ip += 2
+            elif op == POP_JUMP_IF_FALSE:
+                value = pop()
+                if value is False or value is None or (value is not True and not truthy(value)):
+                    ip = code[ip + 1]
+                else:
+                    ip += 2
+            elif op == ADD:
+                b = pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a + b
+                elif isinstance(a, str) or isinstance(b, str):
+                    stack[-1] = stringify(a) + stringify(b)
+                else:
+                    stack[-1] = numify(a) + numify(b)
+                ip += 1
+            elif op == SUBTRACT:
+                b = pop()
+                a = stack[-1]
+                if not isinstance(a, float) or not isinstance(b, float):
+                    raise RunTimeError(constants[code[ip + 1]], "Operands must be numbers")
+                stack[-1] = a - b
+                ip += 2
+            elif op == LESS:
+                b = pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a < b
+                else:
+                    stack[-1] = numify(a) < numify(b)
+                ip += 1
+            elif op == LESS_EQUAL:
+                b = pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a <= b
+                else:
+                    stack[-1] = numify(a) <= numify(b)
+                ip += 1
+            elif op == STORE_LOCAL:
+                slots[code[ip + 1]] = pop()
+                ip += 2
+            elif op == SET_LOCAL:
+                slots[code[ip + 1]] = stack[-1]
+                ip += 2
+            elif op == POP:
+                pop()
+                ip += 1
+            elif op == JUMP:
+                ip = code[ip + 1]
+            elif op == GET_CELL:
+                push(slots[code[ip + 1]][0])
+                ip += 2
+            elif op == GET_UPVALUE:
+                push(cells[code[ip + 1]][0])
+                ip += 2
+            elif op == CALL or op == CALL_METHOD:
+                argc = code[ip + 1]
+                this = None
+                if op == CALL_METHOD:
+                    # GET_METHOD left [method, receiver] or [field value, None]
+                    this = stack[-argc - 1]
+                    del stack[-argc - 1]
+                callee = stack[-argc - 1]
+                if this is not None or type(callee) is vmClosure:
+                    callee_proto = callee.proto
+                    if argc != callee_proto.arity:
+                        raise RunTimeError(constants[code[ip + 2]].paren,
+                                           f"Expected {callee_proto.arity} arguments, but got {argc}")
+                elif isinstance(callee, ploxClass):
+                    if argc != callee.arity():
+                        raise RunTimeError(constants[code[ip + 2]].paren,
+                                           f"Expected {callee.arity()} arguments, but got {argc}")
+                    this = ploxInstance(callee)
+                    callee = callee.find_method("init")
+                    if callee is None:
+                        del stack[-argc - 1:]
+                        push(this)
+                        ip += 3
+                        continue
+                else:
+                    self._call_native(callee, argc, constants[code[ip + 2]])
+                    ip += 3
+                    continue
+                if code[ip + 3] != RETURN:
+                    if len(frames) - floor >= MAX_FRAMES:
+                        raise RunTimeError(constants[code[ip + 2]].paren, "Stack overflow")
+                    frames.append((closure, slots, ip + 3))
+                # else: a call in tail position takes over the current frame
+                closure, slots = self._enter(callee, argc, this)
+                proto = closure.proto
+                code = proto.code
+                constants = proto.constants
+                cells = closure.cells
+                ip = 0
+            elif op == RETURN:
+                result = pop()
+                if len(frames) == floor:
+                    return result
+                closure, slots, ip = frames.pop()
+                proto = closure.proto
+                code = proto.code
+                constants = proto.constants
+                cells = closure.cells
+                push(result)
+            elif op == GET_PROPERTY:
+                obj = stack[-1]
+                site : Get = constants[code[ip + 1]]
+                if not isinstance(obj, ploxInstance):
+                    raise RunTimeError(site.name, "Only instances have properties")
+                shape = obj.shape
+                cache = site.cache
+                if shape is cache.shape:
+                    stack[-1] = obj.values[cache.slot]
+                else:
+                    slot = shape.slots.get(site.name.lexeme)
+                    if slot is not None:
+                        cache.shape = shape
+                        cache.slot = slot
+                        stack[-1] = obj.values[slot]
+                    else:
+                        stack[-1] = obj.get(site.name)
+                ip += 2
+            elif op == GET_METHOD:
+                obj = stack[-1]
+                site : Invoke = constants[code[ip + 1]]
+                if not isinstance(obj, ploxInstance):
+                    raise RunTimeError(site.name, "Only instances have properties")
+                shape = obj.shape
+                cache = site.cache
+                if shape is cache.shape and obj.klass is cache.klass:
+                    stack[-1] = cache.method
+                    push(obj)
+                else:
+                    name = site.name.lexeme
+                    slot = shape.slots.get(name)
+                    if slot is not None:
+                        stack[-1] = obj.values[slot]
+                        push(None)
+                    else:
+                        method = obj.klass.find_method(name)
+                        if method is None:
+                            raise RunTimeError(site.name, f"Undefined property {{{name}}}")
+                        cache.shape = shape
+                        cache.klass = obj.klass
+                        cache.method = method
+                        stack[-1] = method
+                        push(obj)
+                ip += 2
+            elif op == SET_PROPERTY:
+                value = pop()
+                obj = stack[-1]
+                site : Set = constants[code[ip + 1]]
+                if not isinstance(obj, ploxInstance):
+                    raise RunTimeError(site.name, "Only instances have fields")
+                shape = obj.shape
+                cache = site.cache
+                if shape is cache.shape:
+                    if cache.next_shape is shape:
+                        obj.values[cache.slot] = value
+                    else:
+                        obj.shape = cache.next_shape
+                        obj.values.append(value)
+                else:
+                    obj.set(site.name, value)
+                    cache.shape = shape
+                    cache.next_shape = obj.shape
+                    cache.slot = obj.shape.slots[site.name.lexeme]
+                stack[-1] = value
+                ip += 2
+            elif op == MULTIPLY:
+                b = pop()
+                a = stack[-1]
+                if not isinstance(a, float) or not isinstance(b, float):
+                    raise RunTimeError(constants[code[ip + 1]], "Operands must be numbers")
+                stack[-1] = a * b
+                ip += 2
+            elif op == DIVIDE:
+                b = pop()
+                a = stack[-1]
+                token = constants[code[ip + 1]]
+                if not isinstance(a, float) or not isinstance(b, float):
+                    raise RunTimeError(token, "Operands must be numbers")
+                try:
+                    stack[-1] = a / b
+                except ZeroDivisionError:
+                    raise RunTimeError(token, "Tried dividing by zero")
+                ip += 2
+            elif op == GREATER:
+                b = pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a > b
+                else:
+                    stack[-1] = numify(a) > numify(b)
+                ip += 1
+            elif op == GREATER_EQUAL:
+                b = pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a >= b
+                else:
+                    stack[-1] = numify(a) >= numify(b)
+                ip += 1
+            elif op == EQUAL:
+                b = pop()
+                stack[-1] = stack[-1] == b
+                ip += 1
+            elif op == NOT_EQUAL:
+                b = pop()
+                stack[-1] = not (stack[-1] == b)
+                ip += 1
+            elif op == JUMP_IF_FALSE:
+                value = stack[-1]
+                if value is False or value is None or (value is not True and not truthy(value)):
+                    ip = code[ip + 1]
+                else:
+                    ip += 2
+            elif op == JUMP_IF_TRUE:
+                value = stack[-1]
+                if value is False or value is None or (value is not True and not truthy(value)):
+                    ip += 2
+                else:
+                    ip = code[ip + 1]
+            elif op == SET_CELL:
+                slots[code[ip + 1]][0] = stack[-1]
+                ip += 2
+            elif op == SET_UPVALUE:
+                cells[code[ip + 1]][0] = stack[-1]
+                ip += 2
+            elif op == NEW_CELL:
+                slots[code[ip + 1]] = [None]
+                ip += 2
+            elif op == STORE_CELL:
+                slots[code[ip + 1]][0] = pop()
+                ip += 2
+            elif op == SET_GLOBAL:
+                token = constants[code[ip + 1]]
+                name = token.lexeme
+                if name not in globals:
+                    raise RunTimeError(token, f"Undefined variable {{{name}}}")
+                globals[name] = stack[-1]
+                ip += 2
+            elif op == DEFINE_GLOBAL:
+                globals[constants[code[ip + 1]].lexeme] = pop()
+                ip += 2
+            elif op == NIL:
+                push(None)
+                ip += 1
+            elif op == TRUE:
+                push(True)
+                ip += 1
+            elif op == FALSE:
+                push(False)
+                ip += 1
+            elif op == NOT:
+                stack[-1] = not truthy(stack[-1])
+                ip += 1
+            elif op == NEGATE:
+                if not isinstance(stack[-1], float):
+                    raise RunTimeError(constants[code[ip + 1]], "Operand must be a number")
+                stack[-1] = - stack[-1]
+                ip += 2
+            elif op == PRINT:
+                self.print_flag = True
+                print(stringify(pop()))
+                ip += 1
+            elif op == REPL_PRINT:
+                value = pop()
+                if not self.print_flag:
+                    print(stringify(value))
+                ip += 1
+            elif op == CLOSURE:
+                function : FunctionProto = constants[code[ip + 1]]
+                push(vmClosure(function, [slots[index] if is_local else cells[index]
+                                          for is_local, index in function.upvalues]))
+                ip += 2
+            elif op == CHECK_INSTANCE:
+                if not isinstance(stack[-1], ploxInstance):
+                    raise RunTimeError(constants[code[ip + 1]], "Only instances have fields")
+                ip += 2
+            elif op == GET_PARENT:
+                instance = pop()
+                parentclass : ploxClass = stack[-1]
+                token = constants[code[ip + 1]]
+                method = parentclass.find_method(token.lexeme)
+                if method is None:
+                    raise RunTimeError(token, f"Undefined property {{{token.lexeme}}}")
+                stack[-1] = method.bind(instance)
+                ip += 2
+            elif op == BUILD_LIST:
+                count = code[ip + 1]
+                if count:
+                    values = stack[-count:]
+                    del stack[-count:]
+                else:
+                    values = []
+                push(values)
+                ip += 2
+            elif op == INDEX:
+                index = pop()
+                subscribee = stack[-1]
+                subscribee_expr, index_expr = constants[code[ip + 1]]
+                if not isinstance(subscribee, list) and not isinstance(subscribee, str):
+                    raise RunTimeError(subscribee_expr, "Only subscriptable objects currently available are lists and strings")
+                try:
+                    index = int(index)
+                except:
+                    raise RunTimeError(index_expr, "Index must be a number. Other types of indexing not yet implemented")
+                if index > len(subscribee):
+                    raise RunTimeError(index_expr, f"Index {{{index}}} is out of range")
+                stack[-1] = subscribee[index]
+                ip += 2
+            elif op == CLASS:
+                token = constants[code[ip + 1]]
+                parentclass = None
+                if code[ip + 2]:
+                    parentclass = pop()
+                    if not isinstance(parentclass, ploxClass):
+                        raise RunTimeError(token, "A parent class must be a class")
+                push(ploxClass(token.lexeme, parentclass, dict()))
+                ip += 3
+            elif op == PARENT_OF:
+                push(stack[-1].parentclass)
+                ip += 1
+            elif op == METHOD:
+                method = pop()
+                stack[-1].add_method(constants[code[ip + 1]], method)
+                ip += 2
+            else:
+                raise RuntimeError(f"Unknown opcode {op}")
+
+    def _call_native(self, callee: object, argc: int, site: CallSite) -> None:
+        stack = self.stack
+        if not isinstance(callee, ploxCallable):
+            raise RunTimeError(site.paren, "Tried to call non-callable object")
+        if argc != callee.arity():
+            raise RunTimeError(site.paren, f"Expected {callee.arity()} arguments, but got {argc}")
+        values = stack[len(stack) - argc:]
+        del stack[len(stack) - argc - 1:]
+        args = [{"expr": expr, "value": value} for expr, value in zip(site.arguments, values)]
+        stack.append(callee.call(self, args))
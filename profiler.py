@@ -0,0 +1,179 @@
+from __future__ import annotations
+from time import perf_counter
+from typing import Dict, List, Callable, Type, TextIO
+
+from Expr import Expr, FuncExpr
+from Stmt import *
+from plox_token import PloxToken
+from plox_callable import ploxFunction, ploxInstance
+from completions import Completion
+from interpreter import Interpreter
+from quickening import fields
+
+
+def first_line(node: object) -> int:
+    """Line of the first token under an AST node, 0 when it has none."""
+    if isinstance(node, PloxToken):
+        return node.line
+    if isinstance(node, (Print, Expression, If, While, Break, Continue)):
+        # statements whose fields may hold no token at all, like print "x";
+        # or while (true) {...}, carry their line
+        return node.line
+    if isinstance(node, list):
+        for item in node:
+            line = first_line(item)
+            if line: return line
+        return 0
+    if isinstance(node, FuncExpr):
+        # reading the body of a lazily parsed function would parse it
+        return first_line(node.params)
+    if isinstance(node, (Expr, Stmt)):
+        for name in fields(node):
+            line = first_line(getattr(node, name))
+            if line: return line
+    return 0
+
+
+class Entry:
+    """Counts and times of one function or source line. Inclusive time is
+    only added by the outermost of recursive activations."""
+    __slots__ = ("calls", "inclusive", "exclusive", "active")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+        self.active = 0
+
+
+class Frame:
+    __slots__ = ("key", "entry", "start", "children")
+
+    def __init__(self, key: object, entry: Entry) -> None:
+        self.key = key
+        self.entry = entry
+        self.start = perf_counter()
+        self.children = 0.0
+
+
+class Profile:
+    """Wall time and call counts of Lox functions, keyed by (name, line),
+    and of source lines. Functions and lines keep separate frame stacks
+    since a statement can call a function and a function runs statements."""
+    def __init__(self) -> None:
+        self.functions : Dict[tuple, Entry] = dict()
+        self.lines : Dict[int, Entry] = dict()
+        self.function_frames : List[Frame] = []
+        self.line_frames : List[Frame] = []
+        self.start = perf_counter()
+        self.elapsed = 0.0
+
+    def enter(self, table: dict, frames: List[Frame], key: object) -> None:
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = Entry()
+        entry.calls += 1
+        entry.active += 1
+        frames.append(Frame(key, entry))
+
+    def leave(self, frames: List[Frame]) -> None:
+        frame = frames.pop()
+        elapsed = perf_counter() - frame.start
+        entry = frame.entry
+        entry.exclusive += elapsed - frame.children
+        entry.active -= 1
+        if not entry.active:
+            entry.inclusive += elapsed
+        if frames:
+            frames[-1].children += elapsed
+
+    def finish(self) -> None:
+        while self.function_frames:
+            self.leave(self.function_frames)
+        while self.line_frames:
+            self.leave(self.line_frames)
+        self.elapsed = perf_counter() - self.start
+
+    def report(self, source: str | None = None, out: TextIO | None = None, limit: int | None = 20) -> None:
+        """Prints functions and lines sorted by exclusive time; {limit} caps
+        the number of lines shown."""
+        source_lines = source.splitlines() if source else []
+        total = self.elapsed or 1e-9
+        print(f"Lox profile: {self.elapsed * 1000:.1f} ms", file=out)
+        print(f"\n{'calls':>9} {'incl ms':>10} {'excl ms':>10} {'excl %':>7}  function", file=out)
+        for (name, line), entry in sorted(self.functions.items(), key=lambda item: -item[1].exclusive):
+            where = f" (line {line})" if line else ""
+            print(f"{entry.calls:>9} {entry.inclusive * 1000:>10.2f} {entry.exclusive * 1000:>10.2f} "
+                  f"{entry.exclusive / total:>7.1%}  {name}{where}", file=out)
+        lines = sorted(self.lines.items(), key=lambda item: -item[1].exclusive)
+        print(f"\n{'hits':>9} {'incl ms':>10} {'excl ms':>10} {'excl %':>7}  line", file=out)
+        for line, entry in lines[:limit]:
+            text = source_lines[line - 1].strip() if 0 < line <= len(source_lines) else ""
+            print(f"{entry.calls:>9} {entry.inclusive * 1000:>10.2f} {entry.exclusive * 1000:>10.2f} "
+                  f"{entry.exclusive / total:>7.1%}  {line:>5}: {text}", file=out)
+        if limit is not None and len(lines) > limit:
+            print(f"{'':>40}  ... {len(lines) - limit} more lines", file=out)
+
+
+class profiledFunction(ploxFunction):
+    """A ploxFunction whose activations are recorded in the interpreter's
+    profile; tail calls are still run in the one loop."""
+    def execute(self, interpreter: ProfilingInterpreter, this: ploxInstance | None, arguments: list) -> Completion | None:
+        profile = interpreter.profile
+        profile.enter(profile.functions, profile.function_frames, interpreter.names[self.declaration])
+        try:
+            return super().execute(interpreter, this, arguments)
+        finally:
+            profile.leave(profile.function_frames)
+
+
+class ProfilingInterpreter(Interpreter):
+    """The tree-walker with every statement and Lox function activation
+    timed, swapped in for --profile so that a normal run pays nothing."""
+    function_type = profiledFunction
+
+    def __init__(self, error: Callable[[Type[Exception]], None], repl: bool = False):
+        super().__init__(error, repl)
+        self.profile = Profile()
+        # declaration -> (qualified name, declaring line)
+        self.names : Dict[FuncExpr, tuple] = dict()
+        self.statement_lines : Dict[Stmt, int] = dict()
+
+    def interpret(self, statements: List[Stmt]) -> None:
+        profile = self.profile
+        profile.start = perf_counter()
+        profile.enter(profile.functions, profile.function_frames, ("<script>", 0))
+        try:
+            super().interpret(statements)
+        finally:
+            profile.finish()
+
+    def visitFunction(self, stmt: Function) -> None:
+        self.names[stmt.function] = (stmt.name.lexeme, stmt.name.line)
+        super().visitFunction(stmt)
+
+    def visitClassStmt(self, stmt: ClassStmt) -> None:
+        for method in stmt.methods:
+            self.names[method.function] = (f"{stmt.name.lexeme}.{method.name.lexeme}", method.name.line)
+        super().visitClassStmt(stmt)
+
+    def visitFuncExpr(self, expr: FuncExpr) -> object:
+        if expr not in self.names:
+            # declared on the line of the statement evaluating it
+            frames = self.profile.line_frames
+            self.names[expr] = ("<anonymous fun>", frames[-1].key if frames else 0)
+        return super().visitFuncExpr(expr)
+
+    def _exec(self, stmt: Stmt) -> Completion | None:
+        if type(stmt) in (Block, Empty):
+            # the placeholder ending loop bodies isn't on a line of its own
+            return stmt.accept(self)
+        line = self.statement_lines.get(stmt)
+        if line is None:
+            line = self.statement_lines[stmt] = first_line(stmt)
+        profile = self.profile
+        profile.enter(profile.lines, profile.line_frames, line)
+        try:
+            return stmt.accept(self)
+        finally:
+            profile.leave(profile.line_frames)
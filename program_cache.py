@@ -0,0 +1,69 @@
+import pickle
+from hashlib import sha256
+from os import path, makedirs
+from sys import version_info
+from typing import List
+
+from Stmt import Stmt
+
+CACHE_DIR = "__ploxcache__"
+# an entry's header: the key, then the digest of the pickled tree
+KEY_SIZE = DIGEST_SIZE = sha256().digest_size
+# modules whose changes make a cached tree stale
+FRONT_END = ["scanner.py", "plox_parser.py", "resolver.py", "Expr.py", "Stmt.py",
+             "plox_token.py", "tokenType.py", "program_cache.py"]
+
+_version = None
+
+def interpreter_version() -> str:
+    """Digest of the front end's sources and the Python version, standing in
+    for a magic number."""
+    global _version
+    if _version is None:
+        digest = sha256(f"{version_info.major}.{version_info.minor}".encode())
+        here = path.dirname(path.abspath(__file__))
+        for module in FRONT_END:
+            with open(path.join(here, module), "rb") as f:
+                digest.update(f.read())
+        _version = digest.hexdigest()
+    return _version
+
+
+class ProgramCache:
+    """Resolved programs pickled to __ploxcache__/<name>.ploxc next to their
+    source. An entry starts with a key over the source text and the
+    interpreter version, then a digest of the pickled tree that follows; the
+    tree is only unpickled when the key matches and it is intact."""
+    def __init__(self, source_path: str) -> None:
+        directory, name = path.split(source_path)
+        self.cache_path = path.join(directory, CACHE_DIR, path.splitext(name)[0] + ".ploxc")
+
+    @staticmethod
+    def key(source: str) -> bytes:
+        return sha256((interpreter_version() + source).encode()).digest()
+
+    def load(self, source: str) -> List[Stmt] | None:
+        try:
+            with open(self.cache_path, "rb") as f:
+                if f.read(KEY_SIZE) != self.key(source):
+                    return None
+                digest = f.read(DIGEST_SIZE)
+                tree = f.read()
+            if sha256(tree).digest() != digest:
+                # truncated or damaged
+                return None
+            return pickle.loads(tree)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, RecursionError):
+            return None
+
+    def store(self, source: str, statements: List[Stmt]) -> None:
+        try:
+            tree = pickle.dumps(statements, pickle.HIGHEST_PROTOCOL)
+            makedirs(path.dirname(self.cache_path), exist_ok=True)
+            with open(self.cache_path, "wb") as f:
+                f.write(self.key(source))
+                f.write(sha256(tree).digest())
+                f.write(tree)
+        except (OSError, pickle.PicklingError, RecursionError):
+            # a missing cache only costs a re-parse
+            pass
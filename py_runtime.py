@@ -0,0 +1,252 @@
+from typing import List, Dict, Callable, Type
+
+from error_types import RunTimeError
+from Expr import *
+from Stmt import Stmt
+from plox_token import PloxToken
+from plox_callable import *
+from interpreter import Interpreter
+from py_transpiler import PyTranspiler
+
+
+class tailCall:
+    """A call a transpiled function made in tail position, returned for the
+    runtime helper that called the function to make in a loop, so tail
+    recursion doesn't grow the Python stack."""
+    __slots__ = ("fn", "args")
+
+    def __init__(self, fn: Callable, args: list) -> None:
+        self.fn = fn
+        self.args = args
+
+
+class pyFunction(ploxFunction):
+    """A Lox function whose body was transpiled into the Python function {fn}.
+    Methods take the receiver as their first argument."""
+    def __init__(self, name: str, declaration: FuncExpr, fn: Callable, isInitializer: bool = False) -> None:
+        super().__init__(name, declaration, None, isInitializer)
+        self.fn = fn
+        self.nparams = len(declaration.params)
+
+    def invoke(self, interpreter, this: ploxInstance | None, arguments: list) -> object:
+        values = [argument["value"] for argument in arguments]
+        if self.isMethod:
+            result = self.fn(this, *values)
+        else:
+            result = self.fn(*values)
+        while type(result) is tailCall:
+            result = result.fn(*result.args)
+        return result
+
+    def arity(self) -> int:
+        return self.nparams
+
+    def bind(self, instance: ploxInstance, owner: ploxClass | None = None) -> ploxFunction:
+        bound_method = pyFunction(self.name, self.declaration, self.fn, self.isInitializer)
+        bound_method.this = instance
+        bound_method.owner = owner
+        return bound_method
+
+
+class PyRuntime:
+    """The helpers transpiled code calls into; {namespace} builds the globals
+    a transpiled program runs with."""
+    def __init__(self, interpreter: Interpreter) -> None:
+        self.interpreter = interpreter
+
+    def namespace(self, constants: list) -> Dict[str, object]:
+        return {
+            "G": self.interpreter.globals.values,
+            "K": constants,
+            "I": self.interpreter,
+            "_stringify": Interpreter._stringify,
+            "_truthy": Interpreter._isTruthy,
+            "_numify": Interpreter._numify,
+            "_call": self.call,
+            "_lookup": self.lookup,
+            "_invoke": self.invoke,
+            "_tail_call": self.tail_call,
+            "_tail_invoke": self.tail_invoke,
+            "_get": self.get,
+            "_instance": self.instance,
+            "_set": self.set,
+            "_subscriptable": self.subscriptable,
+            "_index": self.index,
+            "_add": self.add,
+            "_div": self.div,
+            "_operand_error": self.operand_error,
+            "_operands_error": self.operands_error,
+            "_undefined": self.undefined,
+            "_assign_global": self.assign_global,
+            "_setcell": self.setcell,
+            "_function": pyFunction,
+            "_class": ploxClass,
+            "_parent_class": self.parent_class,
+            "_parent": self.parent,
+        }
+
+    def call(self, callee: object, args: list, site: Call | Invoke) -> object:
+        if type(callee) is pyFunction:
+            if len(args) != callee.nparams:
+                raise RunTimeError(site.paren, f"Expected {callee.nparams} arguments, but got {len(args)}")
+            if callee.isMethod:
+                result = callee.fn(callee.this, *args)
+            else:
+                result = callee.fn(*args)
+            while type(result) is tailCall:
+                result = result.fn(*result.args)
+            return result
+        if not isinstance(callee, ploxCallable):
+            raise RunTimeError(site.paren, "Tried to call non-callable object")
+        if len(args) != callee.arity():
+            raise RunTimeError(site.paren, f"Expected {callee.arity()} arguments, but got {len(args)}")
+        if type(callee) is ploxClass:
+            instance = ploxInstance(callee)
+            initializer = callee.find_method("init")
+            if initializer:
+                initializer.fn(instance, *args)
+            return instance
+        # natives still get the argument expressions
+        arguments = [{"expr": expr, "value": value} for expr, value in zip(site.arguments, args)]
+        return callee.call(self.interpreter, arguments)
+
+    def lookup(self, obj: object, name: PloxToken) -> tuple:
+        """Callee and receiver of obj.name(...); the receiver is None when
+        the name is a field holding a callable."""
+        if not isinstance(obj, ploxInstance):
+            raise RunTimeError(name, "Only instances have properties")
+        slot = obj.shape.slots.get(name.lexeme)
+        if slot is not None:
+            return obj.values[slot], None
+        method = obj.klass.find_method(name.lexeme)
+        if method is None:
+            raise RunTimeError(name, f"Undefined property {{{name.lexeme}}}")
+        return method, obj
+
+    def invoke(self, target: tuple, args: list, site: Invoke) -> object:
+        callee, this = target
+        if this is None:
+            return self.call(callee, args, site)
+        if len(args) != callee.nparams:
+            raise RunTimeError(site.paren, f"Expected {callee.nparams} arguments, but got {len(args)}")
+        result = callee.fn(this, *args)
+        while type(result) is tailCall:
+            result = result.fn(*result.args)
+        return result
+
+    def tail_call(self, callee: object, args: list, site: Call) -> object:
+        """{call} for a call in tail position: a transpiled function is
+        checked and handed back as a tailCall, anything else is called now."""
+        if type(callee) is pyFunction:
+            if len(args) != callee.nparams:
+                raise RunTimeError(site.paren, f"Expected {callee.nparams} arguments, but got {len(args)}")
+            if callee.isMethod:
+                return tailCall(callee.fn, [callee.this, *args])
+            return tailCall(callee.fn, args)
+        return self.call(callee, args, site)
+
+    def tail_invoke(self, target: tuple, args: list, site: Invoke) -> object:
+        callee, this = target
+        if this is None:
+            return self.tail_call(callee, args, site)
+        if len(args) != callee.nparams:
+            raise RunTimeError(site.paren, f"Expected {callee.nparams} arguments, but got {len(args)}")
+        return tailCall(callee.fn, [this, *args])
+
+    def get(self, obj: object, name: PloxToken) -> object:
+        if isinstance(obj, ploxInstance):
+            return obj.get(name)
+        raise RunTimeError(name, "Only instances have properties")
+
+    def instance(self, obj: object, name: PloxToken) -> ploxInstance:
+        if isinstance(obj, ploxInstance):
+            return obj
+        raise RunTimeError(name, "Only instances have fields")
+
+    def set(self, obj: ploxInstance, name: PloxToken, value: object) -> object:
+        obj.set(name, value)
+        return value
+
+    def subscriptable(self, subscribee: object, expr: Subscriptable) -> list | str:
+        if not isinstance(subscribee, list) and not isinstance(subscribee, str):
+            raise RunTimeError(expr.subscribee, "Only subscriptable objects currently available are lists and strings")
+        return subscribee
+
+    def index(self, subscribee: list | str, index: object, expr: Subscriptable) -> object:
+        try:
+            index = int(index)
+        except:
+            raise RunTimeError(expr.index, "Index must be a number. Other types of indexing not yet implemented")
+        if index > len(subscribee):
+            raise RunTimeError(expr.index, f"Index {{{index}}} is out of range")
+        return subscribee[index]
+
+    def add(self, left: object, right: object) -> object:
+        if isinstance(left, str) or isinstance(right, str):
+            return Interpreter._stringify(left) + Interpreter._stringify(right)
+        return Interpreter._numify(left) + Interpreter._numify(right)
+
+    def div(self, left: object, right: object, operator: PloxToken) -> float:
+        Interpreter._check_number(operator, left, right)
+        try:
+            return left / right
+        except ZeroDivisionError:
+            raise RunTimeError(operator, "Tried dividing by zero")
+
+    def operand_error(self, operator: PloxToken) -> None:
+        raise RunTimeError(operator, "Operand must be a number")
+
+    def operands_error(self, operator: PloxToken) -> None:
+        raise RunTimeError(operator, "Operands must be numbers")
+
+    def undefined(self, name: PloxToken) -> None:
+        raise RunTimeError(name, f"Undefined variable {{{name.lexeme}}}")
+
+    def assign_global(self, name: PloxToken, value: object) -> object:
+        self.interpreter.globals.assign_existing(name, value)
+        return value
+
+    def setcell(self, cell: list, value: object) -> object:
+        cell[0] = value
+        return value
+
+    def parent_class(self, parentclass: object, name: PloxToken) -> ploxClass:
+        if not isinstance(parentclass, ploxClass):
+            raise RunTimeError(name, "A parent class must be a class")
+        return parentclass
+
+    def parent(self, parentclass: ploxClass, this: ploxInstance, method: PloxToken) -> ploxFunction:
+        bound = parentclass.find_method(method.lexeme)
+        if bound is None:
+            raise RunTimeError(method, f"Undefined property {{{method.lexeme}}}")
+        return bound.bind(this)
+
+
+class PyInterpreter(Interpreter):
+    """Runs programs by transpiling them to Python and executing the compiled
+    code object. Natives and globals are shared with the tree-walker."""
+    def __init__(self, error: Callable[[Type[Exception]], None], repl: bool = False, out_path: str | None = None):
+        super().__init__(error, repl)
+        self.transpiler = PyTranspiler(repl)
+        self.runtime = PyRuntime(self)
+        self.out_path = out_path
+
+    def interpret(self, statements: List[Stmt]) -> None:
+        statements = [statement for statement in statements if statement]
+        try:
+            source, constants = self.transpiler.transpile(statements)
+            if self.out_path:
+                with open(self.out_path, "w") as f:
+                    f.write(source)
+            namespace = self.runtime.namespace(constants)
+            exec(compile(source, self.out_path or "<plox>", "exec"), namespace)
+        except (SyntaxError, RecursionError, MemoryError):
+            # beyond what Python can compile, e.g. loops nested more than 20
+            # deep: the tree-walker runs it instead
+            return super().interpret(statements)
+        try:
+            namespace["_main"]()
+        except RunTimeError as err:
+            self.error(err)
+        except NotImplementedError as err:
+            print("Not yet implemented")
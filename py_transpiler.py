@@ -0,0 +1,463 @@
+from typing import List, Dict, Tuple, Optional, Callable
+from math import isfinite
+
+from Expr import *
+from Expr import Assign
+from Stmt import *
+from Stmt import Expression, Var
+from tokenType import TokenType as TT
+
+
+ARITHMETIC = {TT.MINUS: "-", TT.STAR: "*"}
+COMPARISON = {TT.GREATER: ">", TT.GREATER_EQUAL: ">=", TT.LESS: "<", TT.LESS_EQUAL: "<="}
+# longer chains of left-associative operators are emitted as a sequence of
+# assignments to one temporary, as nesting them runs into the parser's limits
+CHAIN_LIMIT = 8
+
+
+class _Local:
+    def __init__(self, name: str, key: int, function: "_FunctionState", cell: bool) -> None:
+        self.name = name
+        self.key = key
+        self.function = function
+        self.cell = cell
+
+
+class _FunctionState:
+    def __init__(self, enclosing: Optional["_FunctionState"], kind: str) -> None:
+        self.enclosing = enclosing
+        self.kind = kind
+        self.this : Optional[_Local] = None
+        self.free : Dict[str, None] = dict()
+        self.loops : List[Tuple[While, int]] = []
+
+
+class PyTranspiler(ExprVisitor, StmtVisitor):
+    """Translates resolved statements into the source of a Python function, {_main}.
+
+    Lox blocks don't map onto Python scopes, so every local gets a unique
+    Python name. Locals captured by an inner function are single-element
+    list cells, passed into each nested def as keyword defaults so that a
+    closure keeps the cells it was created with. Like the bytecode compiler,
+    the program is translated again whenever new captures show up.
+    Globals stay in the interpreter's dict ({G}) and tokens and nodes
+    needed for error reporting in a constant list ({K}).
+    """
+    def __init__(self, repl: bool = False) -> None:
+        self.repl = repl
+
+    def transpile(self, statements: List[Stmt]) -> Tuple[str, list]:
+        captured : set = set()
+        while True:
+            source = self._module(statements, captured)
+            if self.found <= captured:
+                return source, self.constants
+            captured |= self.found
+
+    def _module(self, statements: List[Stmt], captured: set) -> str:
+        self.captured = captured
+        self.found : set = set()
+        self.constants : list = []
+        self.constant_index : Dict[int, int] = dict()
+        self.scopes : List[Dict[str, _Local]] = []
+        self.counter = 0
+        self.in_continue = False
+        self.function = _FunctionState(None, "script")
+        self.lines = ["def _main():"]
+        self.indent = 1
+        start = len(self.lines)
+        for statement in statements:
+            if self.repl: self._emit("I.print_flag = False")
+            self._stmt(statement)
+        self._end_suite(start)
+        return "\n".join(self.lines) + "\n"
+
+    ################ Statements ####################
+
+    def visitEmpty(self, stmt: Empty) -> None:
+        return
+
+    def visitBlock(self, stmt: Block) -> None:
+        self.scopes.append(dict())
+        for statement in stmt.statements:
+            self._stmt(statement)
+        self.scopes.pop()
+
+    def visitExpression(self, stmt: Expression) -> None:
+        expr = stmt.expression
+        if self.repl:
+            self._emit(f"_value = {self._expr(expr)}")
+            self._emit("if not I.print_flag: print(_stringify(_value))")
+        elif isinstance(expr, Assign):
+            value = self._expr(expr.value)
+            self._emit(self._store(expr, value))
+        else:
+            self._emit(self._expr(expr))
+
+    def visitIf(self, stmt: If) -> None:
+        self._emit(f"if {self._test(stmt.condition)}:")
+        self._suite(stmt.thenBranch)
+        if stmt.elseBranch:
+            self._emit("else:")
+            self._suite(stmt.elseBranch)
+
+    def visitWhile(self, stmt: While) -> None:
+        self._emit(f"while {self._test(stmt.condition)}:")
+        self.function.loops.append((stmt, len(self.scopes)))
+        self._suite(stmt.body)
+        self.function.loops.pop()
+
+    def visitBreak(self, stmt: Break) -> None:
+        if not self.function.loops:
+            self._emit(self._return("None"))
+            return
+        self._emit("break")
+
+    def visitContinue(self, stmt: Continue) -> None:
+        if not self.function.loops:
+            self._emit(self._return("None"))
+            return
+        loop, depth = self.function.loops[-1]
+        if not self.in_continue and isinstance(loop.body, Block) and loop.body.statements:
+            # {continue} re-runs the last statement of the loop body in a fresh
+            # scope, the way the tree-walker does
+            scopes = self.scopes
+            self.scopes = scopes[:depth] + [dict(scopes[depth]) if depth < len(scopes) else dict()]
+            self.in_continue = True
+            self._stmt(loop.body.statements[-1])
+            self.in_continue = False
+            self.scopes = scopes
+        self._emit("continue")
+
+    def visitPrint(self, stmt: Print) -> None:
+        if self.repl: self._emit("I.print_flag = True")
+        self._emit(f"print(_stringify({self._expr(stmt.expression)}))")
+
+    def visitVar(self, stmt: Var) -> None:
+        local = self._declare(stmt.name.lexeme, stmt, stmt.slot)
+        if local is not None and local.cell:
+            self._emit(f"{local.name} = [None]")
+        value = "None" if stmt.Initializer is None else self._expr(stmt.Initializer)
+        self._emit(self._define(stmt.name.lexeme, local, value))
+
+    def visitClassStmt(self, stmt: ClassStmt) -> None:
+        parent = "None"
+        if stmt.parentclass:
+            parent = f"_parent_class({self._expr(stmt.parentclass)}, {self._const(stmt.parentclass.name)})"
+        local = self._declare(stmt.name.lexeme, stmt.name, stmt.slot)
+        if stmt.parentclass:
+            # evaluated before the class name is defined, as in the tree-walker
+            parent_value = self._temp()
+            self._emit(f"{parent_value} = {parent}")
+            parent = parent_value
+        if local is not None and local.cell:
+            self._emit(f"{local.name} = [None]")
+        else:
+            self._emit(self._define(stmt.name.lexeme, local, "None"))
+        if stmt.parentclass:
+            self.scopes.append(dict())
+            scope = self._declare("parent", stmt, 0)
+            self._emit(f"{scope.name} = [{parent}]" if scope.cell else f"{scope.name} = {parent}")
+        methods = []
+        for method in stmt.methods:
+            name = method.name.lexeme
+            kind = "initializer" if name == "init" else "method"
+            function = self._function(method.function, kind)
+            methods.append(f"{name!r}: _function({name!r}, {self._const(method.function)}, "
+                           f"{function}, {name == 'init'})")
+        if stmt.parentclass:
+            self.scopes.pop()
+        klass = f"_class({stmt.name.lexeme!r}, {parent}, {{{', '.join(methods)}}})"
+        self._emit(self._define(stmt.name.lexeme, local, klass))
+
+    def visitFunction(self, stmt: Function) -> None:
+        name = stmt.name.lexeme
+        local = self._declare(name, stmt, stmt.slot)
+        if local is not None and local.cell:
+            self._emit(f"{local.name} = [None]")
+        function = self._function(stmt.function, "function")
+        self._emit(self._define(name, local, f"_function({name!r}, {self._const(stmt.function)}, {function})"))
+
+    def visitReturn(self, stmt: Return) -> None:
+        if stmt.tail_call:
+            # handed back as a tailCall, which the caller's runtime helper makes
+            call = stmt.value
+            if isinstance(call, Invoke):
+                target = f"_lookup({self._expr(call.obj)}, {self._const(call.name)})"
+                value = f"_tail_invoke({target}, {self._arguments(call.arguments)}, {self._const(call)})"
+            else:
+                value = f"_tail_call({self._expr(call.callee)}, {self._arguments(call.arguments)}, {self._const(call)})"
+        else:
+            value = "None" if stmt.value is None else self._expr(stmt.value)
+        self._emit(self._return(value))
+
+    ################ Expressions ###################
+
+    def visitFuncExpr(self, expr: FuncExpr) -> str:
+        function = self._function(expr, "function")
+        return f"_function(None, {self._const(expr)}, {function})"
+
+    def visitAssign(self, expr: Assign) -> str:
+        value = self._expr(expr.value)
+        if expr.depth is None:
+            return f"_assign_global({self._const(expr.name)}, {value})"
+        local = self._local(expr.name.lexeme, expr.depth)
+        if local.cell:
+            return f"_setcell({self._cell(local)}, {value})"
+        return f"({self._cell(local)} := {value})"
+
+    def visitLiteral(self, expr: Literal) -> str:
+        value = expr.value
+        if isinstance(value, float) and not isfinite(value):
+            return self._const(value)
+        return repr(value)
+
+    def visitListExpr(self, expr: ListExpr) -> str:
+        return f"[{', '.join(self._expr(value) for value in expr.values)}]"
+
+    def visitVariable(self, expr: Variable) -> str:
+        if expr.depth is None:
+            name = expr.name.lexeme
+            return f"(G[{name!r}] if {name!r} in G else _undefined({self._const(expr.name)}))"
+        return self._load(self._local(expr.name.lexeme, expr.depth))
+
+    def visitLogical(self, expr: Logical) -> str:
+        return self._chain(expr, Logical, self._logical)
+
+    def _logical(self, expr: Logical, left_code: str) -> str:
+        left = self._temp()
+        test = self._truth(f"({left} := {left_code})", left, expr.left)
+        right = self._expr(expr.right)
+        if expr.operator.type == TT.OR:
+            return f"({left} if {test} else {right})"
+        return f"({right} if {test} else {left})"
+
+    def visitGrouping(self, expr: Grouping) -> str:
+        return self._expr(expr.expression)
+
+    def visitUnary(self, expr: Unary) -> str:
+        match expr.operator.type:
+            case TT.MINUS:
+                right = self._temp()
+                return (f"(-{right} if type({right} := {self._expr(expr.right)}) is float "
+                        f"else _operand_error({self._const(expr.operator)}))")
+            case TT.BANG:
+                return f"(not {self._test(expr.right)})"
+        return "None"
+
+    def visitBinary(self, expr: Binary) -> str:
+        return self._chain(expr, Binary, self._binary)
+
+    def _binary(self, expr: Binary, left: str) -> str:
+        op = expr.operator.type
+        right = self._expr(expr.right)
+        if op in (TT.EQUAL_EQUAL, TT.BANG_EQUAL):
+            equal = f"({left} == {right})"
+            return equal if op == TT.EQUAL_EQUAL else f"(not {equal})"
+        if op == TT.SLASH:
+            return f"_div({left}, {right}, {self._const(expr.operator)})"
+        a, b = self._temp(), self._temp()
+        # both operands are evaluated before either is checked, hence the
+        # non-short-circuiting {&}
+        floats = f"(type({a} := {left}) is float) & (type({b} := {right}) is float)"
+        if op in ARITHMETIC:
+            return f"({a} {ARITHMETIC[op]} {b} if {floats} else _operands_error({self._const(expr.operator)}))"
+        if op == TT.PLUS:
+            return f"({a} + {b} if {floats} else _add({a}, {b}))"
+        if op in COMPARISON:
+            symbol = COMPARISON[op]
+            return f"({a} {symbol} {b} if {floats} else _numify({a}) {symbol} _numify({b}))"
+        return "None"
+
+    def visitCall(self, expr: Call) -> str:
+        return f"_call({self._expr(expr.callee)}, {self._arguments(expr.arguments)}, {self._const(expr)})"
+
+    def visitInvoke(self, expr: Invoke) -> str:
+        target = f"_lookup({self._expr(expr.obj)}, {self._const(expr.name)})"
+        return f"_invoke({target}, {self._arguments(expr.arguments)}, {self._const(expr)})"
+
+    def visitSubscriptable(self, expr: Subscriptable) -> str:
+        site = self._const(expr)
+        return f"_index(_subscriptable({self._expr(expr.subscribee)}, {site}), {self._expr(expr.index)}, {site})"
+
+    def visitGet(self, expr: Get) -> str:
+        return f"_get({self._expr(expr.obj)}, {self._const(expr.name)})"
+
+    def visitSet(self, expr: Set) -> str:
+        name = self._const(expr.name)
+        return f"_set(_instance({self._expr(expr.obj)}, {name}), {name}, {self._expr(expr.value)})"
+
+    def visitThis(self, expr: This) -> str:
+        return self._load(self._local("this", expr.depth))
+
+    def visitParent(self, expr: Parent) -> str:
+        parent = self._load(self._local("parent", expr.depth))
+        this = self._load(self._local("this", expr.depth - 1))
+        return f"_parent({parent}, {this}, {self._const(expr.method)})"
+
+    def visitConditional(self, expr: Conditional) -> str:
+        test = self._test(expr.condition)
+        return f"({self._expr(expr.then_clause)} if {test} else {self._expr(expr.else_clause)})"
+
+    ################################################
+
+    def _function(self, function: FuncExpr, kind: str) -> str:
+        """Emit a nested def for {function}, returning its Python name."""
+        name = f"_f{self._next()}"
+        enclosing, scopes, in_continue = self.function, self.scopes, self.in_continue
+        self.function = _FunctionState(enclosing, kind)
+        self.scopes = scopes + [dict()]
+        self.in_continue = False
+        header = len(self.lines)
+        self.lines.append("")
+        self.indent += 1
+
+        params = []
+        if kind in ("method", "initializer"):
+            self.function.this = self._declare("this", function, 0)
+            params.append(self.function.this)
+        for param in function.params:
+            params.append(self._declare(param.lexeme, param, 0))
+        for param in params:
+            if param.cell:
+                self._emit(f"{param.name} = [{param.name}]")
+        start = len(self.lines)
+        for statement in function.body:
+            self._stmt(statement)
+        if kind == "initializer":
+            self._emit(self._return("None"))
+        self._end_suite(start)
+
+        self.indent -= 1
+        signature = [param.name for param in params]
+        if self.function.free:
+            signature.append("*")
+            signature += [f"{free}={free}" for free in self.function.free]
+        self.lines[header] = "    " * self.indent + f"def {name}({', '.join(signature)}):"
+        self.function, self.scopes, self.in_continue = enclosing, scopes, in_continue
+        return name
+
+    def _return(self, value: str) -> str:
+        if self.function.kind == "initializer":
+            return f"return {self._load(self.function.this)}"
+        return f"return {value}"
+
+    def _declare(self, name: str, key: object, slot: int | None) -> _Local | None:
+        if slot is None:
+            return None
+        local = _Local(f"{name}_{self._next()}", id(key), self.function, id(key) in self.captured)
+        self.scopes[-1][name] = local
+        return local
+
+    def _define(self, name: str, local: _Local | None, value: str) -> str:
+        if local is None:
+            return f"G[{name!r}] = {value}"
+        if local.cell:
+            return f"{local.name}[0] = {value}"
+        return f"{local.name} = {value}"
+
+    def _store(self, expr: Assign, value: str) -> str:
+        if expr.depth is None:
+            return f"_assign_global({self._const(expr.name)}, {value})"
+        local = self._local(expr.name.lexeme, expr.depth)
+        if local.cell:
+            return f"{self._cell(local)}[0] = {value}"
+        return f"{self._cell(local)} = {value}"
+
+    def _local(self, name: str, depth: int) -> _Local:
+        return self.scopes[-1 - depth][name]
+
+    def _load(self, local: _Local) -> str:
+        if local.cell:
+            return f"{self._cell(local)}[0]"
+        self._cell(local)
+        return local.name
+
+    def _cell(self, local: _Local) -> str:
+        # a local used by an inner function is threaded through every def in between
+        function = self.function
+        if function is not local.function:
+            self.found.add(local.key)
+            while function is not local.function:
+                function.free[local.name] = None
+                function = function.enclosing
+        return local.name
+
+    def _chain(self, expr: Expr, kind: type, operation: Callable[[Expr, str], str]) -> str:
+        """{operation} applied along the left operands of {expr} that are also
+        of {kind}, the innermost first."""
+        chain = [expr]
+        while isinstance(chain[-1].left, kind):
+            chain.append(chain[-1].left)
+        if len(chain) <= CHAIN_LIMIT:
+            code = self._expr(chain[-1].left)
+            for node in reversed(chain):
+                code = operation(node, code)
+            return code
+        value = self._temp()
+        steps = [f"{value} := {self._expr(chain[-1].left)}"]
+        for node in reversed(chain):
+            steps.append(f"{value} := {operation(node, value)}")
+        return f"({', '.join(steps)})[-1]"
+
+    def _test(self, expr: Expr) -> str:
+        if self._is_bool(expr):
+            return self._expr(expr)
+        value = self._temp()
+        return self._truth(f"({value} := {self._expr(expr)})", value, expr)
+
+    def _truth(self, code: str, value: str, expr: Expr) -> str:
+        """Lox truthiness of {code}, whose result is also bound to {value}."""
+        if self._is_bool(expr):
+            return code
+        return f"({code} is True or ({value} is not False and {value} is not None and _truthy({value})))"
+
+    def _is_bool(self, expr: Expr) -> bool:
+        if isinstance(expr, Grouping):
+            return self._is_bool(expr.expression)
+        if isinstance(expr, Literal):
+            return isinstance(expr.value, bool)
+        if isinstance(expr, Unary):
+            return expr.operator.type == TT.BANG
+        if isinstance(expr, Binary):
+            return expr.operator.type in COMPARISON or expr.operator.type in (TT.EQUAL_EQUAL, TT.BANG_EQUAL)
+        if isinstance(expr, Logical):
+            return self._is_bool(expr.left) and self._is_bool(expr.right)
+        return False
+
+    def _arguments(self, arguments: List[Expr]) -> str:
+        return f"[{', '.join(self._expr(argument) for argument in arguments)}]"
+
+    def _const(self, value: object) -> str:
+        index = self.constant_index.get(id(value))
+        if index is None:
+            index = self.constant_index[id(value)] = len(self.constants)
+            self.constants.append(value)
+        return f"K[{index}]"
+
+    def _temp(self) -> str:
+        return f"_t{self._next()}"
+
+    def _next(self) -> int:
+        self.counter += 1
+        return self.counter
+
+    def _suite(self, stmt: Stmt) -> None:
+        self.indent += 1
+        start = len(self.lines)
+        self._stmt(stmt)
+        self._end_suite(start)
+        self.indent -= 1
+
+    def _end_suite(self, start: int) -> None:
+        if len(self.lines) == start:
+            self._emit("pass")
+
+    def _emit(self, line: str) -> None:
+        self.lines.append("    " * self.indent + line)
+
+    def _stmt(self, stmt: Stmt) -> None:
+        stmt.accept(self)
+
+    def _expr(self, expr: Expr) -> str:
+        return expr.accept(self)
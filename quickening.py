@@ -0,0 +1,62 @@
+from Expr import Add, Greater, GreaterEqual, Less, LessEqual
+
+# guard failures after which a site stops respecializing and stays generic
+RESPECIALIZE_LIMIT = 4
+
+
+# Operator nodes that take several kinds of operands rewrite their own
+# __class__ into one of these the first time the tree-walker evaluates them,
+# after the operand types it saw. Each specialized visit guards on those
+# types and hands the operands back to the generic code when they differ.
+# They add no fields, so the layouts match and a node can switch between
+# them and its operator's class freely.
+
+class AddNumbers(Add):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visitAddNumbers(self)
+
+
+class ConcatStrings(Add):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visitConcatStrings(self)
+
+
+class GreaterNumbers(Greater):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visitGreaterNumbers(self)
+
+
+class GreaterEqualNumbers(GreaterEqual):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visitGreaterEqualNumbers(self)
+
+
+class LessNumbers(Less):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visitLessNumbers(self)
+
+
+class LessEqualNumbers(LessEqual):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visitLessEqualNumbers(self)
+
+
+def fields(node: object) -> tuple:
+    """The slots of a syntax tree node, which operator and quickened node
+    classes leave to the class they're derived from."""
+    for klass in type(node).__mro__:
+        slots = klass.__dict__.get("__slots__")
+        if slots: return slots
+    return ()
@@ -1,24 +1,26 @@
-from typing import List, Callable, Type
+from typing import List, Dict, Callable, Type
 
 from Expr import *
 from Stmt import *
 from plox_token import PloxToken
+from error_types import ParserError
+from lazy_function import LazyFuncExpr
 
 class Resolver(StmtVisitor, ExprVisitor):
-    def __init__(self, interpreter, error: Callable[[PloxToken, str], None]) -> None:
-        self.interpreter = interpreter
+    def __init__(self, error: Callable[[PloxToken, str], None]) -> None:
         self.error = error
         self.scopes: List[dict] = []
+        self.slots: List[Dict[str, int]] = []
         self.current_function = None
         self.current_class = None
 
     def visitBlock(self, stmt: Block) -> None:
         self.begin_scope()
         self.resolve(stmt.statements)
-        self.end_scope()
+        stmt.size = self.end_scope()
 
     def visitVar(self, stmt: Var) -> None:
-        self.declare(stmt.name)
+        stmt.slot = self.declare(stmt.name)
         if stmt.Initializer is not None:
             self._resolve(stmt.Initializer)
         self.define(stmt.name)
@@ -35,7 +37,7 @@ class Resolver(StmtVisitor, ExprVisitor):
     def visitClassStmt(self, stmt: ClassStmt) -> None:
         enclosing_class = self.current_class
         self.current_class = "class"
-        self.declare(stmt.name)
+        stmt.slot = self.declare(stmt.name)
         self.define(stmt.name)
         if stmt.parentclass:
             self.current_class = "childclass"
@@ -44,20 +46,17 @@ class Resolver(StmtVisitor, ExprVisitor):
                 return
             self._resolve(stmt.parentclass)
             self.begin_scope()
-            self.scopes[-1]["parent"] = True
-        self.begin_scope()
-        self.scopes[-1]["this"] = True
+            self.declare_implicit("parent")
         for method in stmt.methods:
             declaration = "method"
             if method.name.lexeme == "init":
                 declaration = "initializer"
             self.resolveFunction(method.function, declaration)
-        self.end_scope()
         if stmt.parentclass: self.end_scope()
         self.current_class = enclosing_class
 
     def visitFunction(self, stmt: Function) -> None:
-        self.declare(stmt.name)
+        stmt.slot = self.declare(stmt.name)
         self.define(stmt.name)
         self.resolveFunction(stmt.function, "function")
 
@@ -67,7 +66,7 @@ class Resolver(StmtVisitor, ExprVisitor):
     def visitIf(self, stmt: If) -> None:
         self._resolve(stmt.condition)
         self._resolve(stmt.thenBranch)
-        if stmt.elseBranch: self._resolve(stmt.thenBranch)
+        if stmt.elseBranch: self._resolve(stmt.elseBranch)
 
     def visitPrint(self, stmt: Print) -> None:
         self._resolve(stmt.expression)
@@ -79,6 +78,7 @@ class Resolver(StmtVisitor, ExprVisitor):
             if self.current_function == "initializer":
                 self.error(stmt.keyword, "Can't return a value from an initializer")
             self._resolve(stmt.value)
+            stmt.tail_call = isinstance(stmt.value, (Call, Invoke))
 
     def visitWhile(self, stmt: While) -> None:
         self._resolve(stmt.condition)
@@ -106,6 +106,11 @@ class Resolver(StmtVisitor, ExprVisitor):
         for arg in expr.arguments:
             self._resolve(arg)
 
+    def visitInvoke(self, expr: Invoke) -> None:
+        self._resolve(expr.obj)
+        for arg in expr.arguments:
+            self._resolve(arg)
+
     def visitSubscriptable(self, expr: Subscriptable) -> None:
         self._resolve(expr.subscribee)
         self._resolve(expr.index)
@@ -152,36 +157,64 @@ class Resolver(StmtVisitor, ExprVisitor):
     def visitUnary(self, expr: Unary) -> None:
         self._resolve(expr.right)
 
-    def declare(self, name: PloxToken) -> None:
-        if len(self.scopes) == 0: return
+    def declare(self, name: PloxToken) -> int | None:
+        if len(self.scopes) == 0: return None
         scope = self.scopes[-1]
         if name.lexeme in scope.keys():
             self.error(name, "Already a variable with this name in this scope")
         self.scopes[-1][name.lexeme] = False
+        return self.slots[-1].setdefault(name.lexeme, len(self.slots[-1]))
+
+    def declare_implicit(self, name: str) -> None:
+        self.scopes[-1][name] = True
+        self.slots[-1][name] = len(self.slots[-1])
 
     def define(self, name: PloxToken) -> None:
         if len(self.scopes) == 0: return
         self.scopes[-1][name.lexeme] = True
 
     def resolveLocal(self, expr: Expr, name: PloxToken) -> None:
-        for scope in reversed(self.scopes):
+        for i, scope in reversed(list(enumerate(self.scopes))):
             if name.lexeme in scope.keys():
-                depth = len(self.scopes) - self.scopes.index(scope)
-                # print(name.lexeme, depth, len(self.scopes))
-                self.interpreter._resolve(expr, depth)
+                expr.depth = len(self.scopes) - 1 - i
+                expr.slot = self.slots[i][name.lexeme]
                 return
             
     def resolveFunction(self, function: FuncExpr, type: str) -> None:
+        if isinstance(function, LazyFuncExpr) and function.deferred():
+            function.resolve_body = self.deferred(type)
+            return
         enclosing_function = self.current_function
         self.current_function = type
         self.begin_scope()
+        if type in ("method", "initializer"):
+            # a method's receiver lives in slot 0 of its own frame
+            self.declare_implicit("this")
         for param in function.params:
             self.declare(param)
             self.define(param)
         self.resolve(function.body)
-        self.end_scope()
+        function.size = self.end_scope()
         self.current_function = enclosing_function
 
+    def deferred(self, type: str) -> Callable[[FuncExpr], None]:
+        """Resolves a lazily parsed function later, against copies of the
+        scopes as they are now."""
+        scopes = [dict(scope) for scope in self.scopes]
+        slots = [dict(slot) for slot in self.slots]
+        current_class, error = self.current_class, self.error
+        def resolve(function: FuncExpr) -> None:
+            errors = []
+            def report(token: PloxToken, message: str) -> None:
+                errors.append(message)
+                error(token, message)
+            resolver = Resolver(report)
+            resolver.scopes, resolver.slots, resolver.current_class = scopes, slots, current_class
+            resolver.resolveFunction(function, type)
+            if errors:
+                raise ParserError
+        return resolve
+
     def resolve(self, statements: List[Stmt]) -> None:
         for statement in statements:
             self._resolve(statement)
@@ -191,6 +224,8 @@ class Resolver(StmtVisitor, ExprVisitor):
 
     def begin_scope(self) -> None:
         self.scopes.append(dict())
+        self.slots.append(dict())
 
-    def end_scope(self) -> None:
+    def end_scope(self) -> int:
         self.scopes.pop()
+        return len(self.slots.pop())
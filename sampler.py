@@ -0,0 +1,104 @@
+import sys
+import threading
+from collections import Counter
+from typing import Dict, List
+
+from Expr import FuncExpr
+from Stmt import Stmt
+from plox_callable import ploxFunction, ploxInstance
+from interpreter import Interpreter
+from profiler import first_line
+
+EXECUTE = ploxFunction.execute.__code__
+EXEC = Interpreter._exec.__code__
+
+
+class Sampler:
+    """Records the Lox call stack of the interpreting thread every {interval}
+    seconds from a background thread, by walking the Python frames of the
+    tree-walker: each ploxFunction.execute frame is a Lox function and the
+    innermost Interpreter._exec frame under it the line it is running.
+    Nothing is added to the interpreter itself, so the cost is the walk."""
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks : Counter = Counter()
+        self.samples = 0
+        self.names : Dict[FuncExpr, str] = dict()
+        self.lines : Dict[Stmt, int] = dict()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="plox-sampler", daemon=True)
+
+    def start(self) -> None:
+        # the sampler waits for the GIL between samples; a short switch interval
+        # keeps it from waiting up to the default 5ms each time
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self.switch_interval, self.interval / 10))
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+        sys.setswitchinterval(self.switch_interval)
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = self.lox_stack(frame)
+            del frame
+            if stack:
+                self.stacks[stack] += 1
+                self.samples += 1
+
+    def lox_stack(self, frame) -> tuple:
+        """Frames as "name (line N)" from the script down to the running
+        function, N being the line each one is executing."""
+        stack : List[str] = []
+        line = None
+        while frame is not None:
+            code = frame.f_code
+            if code is EXEC:
+                if line is None:
+                    line = self._line(frame.f_locals["stmt"])
+            elif code is EXECUTE:
+                local = frame.f_locals
+                name = self._name(local["self"], local["this"])
+                stack.append(f"{name} (line {line})" if line else name)
+                line = None
+            frame = frame.f_back
+        if line is None:
+            # not executing statements yet (or any more)
+            return ()
+        stack.append(f"<script> (line {line})")
+        return tuple(reversed(stack))
+
+    def _line(self, stmt: Stmt) -> int:
+        line = self.lines.get(stmt)
+        if line is None:
+            line = self.lines[stmt] = first_line(stmt)
+        return line
+
+    def _name(self, function: ploxFunction, this: ploxInstance | None) -> str:
+        name = self.names.get(function.declaration)
+        if name is None:
+            name = function.name or "<anonymous fun>"
+            if function.isMethod and this is not None:
+                # the class that declared the method, which this's class may only inherit from
+                klass = this.klass
+                while klass is not None:
+                    method = klass.methods.get(function.name)
+                    if method is not None and method.declaration is function.declaration:
+                        name = f"{klass.name}.{name}"
+                        break
+                    klass = klass.parentclass
+            self.names[function.declaration] = name
+        return name
+
+    def write(self, file_path: str) -> None:
+        """Collapsed stacks, one "frame;frame;frame count" line per distinct
+        stack, as flamegraph.pl, speedscope and inferno read them."""
+        with open(file_path, "w") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{';'.join(stack)} {count}\n")
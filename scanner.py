@@ -1,4 +1,6 @@
-from typing import List, Callable
+from typing import List, Callable, Iterator
+from array import array
+import re
 
 from typing import Callable
 from plox_token import PloxToken
@@ -45,6 +47,17 @@ class Scanner:
 
         self.tokens.append(PloxToken(TT.EOF, "", None, self.line))
         return self.tokens
+
+    def tokenStream(self) -> Iterator[PloxToken]:
+        """Tokens one at a time, ending with EOF, so parsing can start before
+        the whole source is scanned; {tokens} only holds the latest few."""
+        while not self.isAtEnd():
+            self.start = self.current
+            self.scanToken()
+            if self.tokens:
+                yield from self.tokens
+                self.tokens.clear()
+        yield PloxToken(TT.EOF, "", None, self.line)
     
     def isAtEnd(self) -> bool:
         return self.current >= len(self.source)
@@ -180,3 +193,156 @@ class Scanner:
     def addToken(self, type: TokenType, literal: object = None) -> None:
         text = self.source[self.start:self.current]
         self.tokens.append(PloxToken(type, text, literal, self.line))
+
+
+
+class RegexScanner(Scanner):
+    """Produces the same tokens as Scanner, but matches a whole token at a
+    time with one compiled pattern and slices lexemes out of the source
+    instead of building them a character at a time."""
+    TOKEN = re.compile(r"""
+        (?P<space>[ \t\r\n]+)
+      | (?P<comment>//[^\n\0]*)
+      | (?P<block>/\*)
+      | (?P<number>[0-9]+(?:\.[0-9]*)?)
+      | (?P<name>[A-Za-z_][A-Za-z_0-9]*)
+      | (?P<string>"[^"\0]*"?)
+      | (?P<operator>[!=<>]=?|[(){}\[\],.\-+;*?:/])
+    """, re.VERBOSE)
+
+    operators = {
+        "(": TT.LEFT_PAREN, ")": TT.RIGHT_PAREN, "{": TT.LEFT_BRACE, "}": TT.RIGHT_BRACE,
+        "[": TT.LEFT_BRACKET, "]": TT.RIGHT_BRACKET, ",": TT.COMMA, ".": TT.DOT,
+        "-": TT.MINUS, "+": TT.PLUS, ";": TT.SEMICOLON, "*": TT.STAR, "?": TT.QUESTION,
+        ":": TT.COLON, "/": TT.SLASH, "!": TT.BANG, "!=": TT.BANG_EQUAL, "=": TT.EQUAL,
+        "==": TT.EQUAL_EQUAL, "<": TT.LESS, "<=": TT.LESS_EQUAL, ">": TT.GREATER,
+        ">=": TT.GREATER_EQUAL,
+    }
+
+    def scanTokens(self) -> List[PloxToken]:
+        self.tokens.extend(self.tokenStream())
+        return self.tokens
+
+    def tokenStream(self) -> Iterator[PloxToken]:
+        source = self.source
+        for type, start, end, line in self.spans():
+            lexeme = source[start:end]
+            if type is TT.STRING:
+                yield PloxToken(type, lexeme, lexeme[1:-1], line)
+            elif type is TT.NUMBER:
+                yield PloxToken(type, lexeme, float(lexeme), line)
+            else:
+                yield PloxToken(type, lexeme, None, line)
+
+    def spans(self) -> Iterator[tuple]:
+        """(type, start, end, line) of every token, EOF included."""
+        source = self.source
+        match_token, keywords, operators = self.TOKEN.match, self.keywords, self.operators
+        line, pos, end = self.line, 0, len(source)
+        while pos < end:
+            m = match_token(source, pos)
+            if m is None:
+                self.error(line, f"Unexpected Character {{{source[pos]}}}")
+                pos += 1
+                continue
+            kind, start, pos = m.lastgroup, pos, m.end()
+            if kind == "name":
+                yield keywords.get(m.group(), TT.IDENTIFIER), start, pos, line
+            elif kind == "operator":
+                yield operators[m.group()], start, pos, line
+            elif kind == "space":
+                line += source.count("\n", start, pos)
+            elif kind == "number":
+                if source[pos - 1] == ".":
+                    self.error(line, "Number value format is incorrect.")
+                    continue
+                yield TT.NUMBER, start, pos, line
+            elif kind == "string":
+                line += source.count("\n", start, pos)
+                if pos - start < 2 or source[pos - 1] != '"':
+                    self.error(line, "Unterminated string")
+                    continue
+                yield TT.STRING, start, pos, line
+            elif kind == "block":
+                pos, line = self.block_comment(pos, line)
+        self.line, self.current = line, pos
+        yield TT.EOF, pos, pos, line
+
+    def block_comment(self, pos: int, line: int) -> tuple:
+        """Skip a /* */ comment the way Scanner does, nesting included;
+        returns the position and line after it."""
+        source, end = self.source, len(self.source)
+        nested = 0
+        while pos < end and source[pos] != '\0':
+            c = source[pos]
+            pos += 1
+            following = source[pos] if pos < end else '\0'
+            if c == '/' and following == '*': nested += 1
+            if c == '*' and following == '/':
+                if nested < 1:
+                    break
+                nested -= 1
+                pos += 1
+            if c == '\n': line += 1
+        if pos < end: pos += 1 # consume last slash
+        return pos, line
+
+
+TOKEN_TYPES = list(TT) # TokenType by value
+
+
+class TokenArrays:
+    """A token stream kept as parallel arrays of type values, source offsets,
+    lengths and lines. Lexemes and literals stay in the source and
+    {token} only builds a PloxToken for the tokens someone asks for."""
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self.types = array("B")
+        self.starts = array("I")
+        self.lengths = array("I")
+        self.lines = array("I")
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def slice(self, start: int, stop: int) -> "TokenArrays":
+        """Tokens [start, stop) as a stream of their own, ending in EOF."""
+        tokens = TokenArrays(self.source)
+        tokens.types = self.types[start:stop]
+        tokens.starts = self.starts[start:stop]
+        tokens.lengths = self.lengths[start:stop]
+        tokens.lines = self.lines[start:stop]
+        end = self.starts[stop - 1] + self.lengths[stop - 1]
+        tokens.types.append(TT.EOF.value)
+        tokens.starts.append(end)
+        tokens.lengths.append(0)
+        tokens.lines.append(self.lines[stop - 1])
+        return tokens
+
+    def lexeme(self, index: int) -> str:
+        start = self.starts[index]
+        return self.source[start:start + self.lengths[index]]
+
+    def token(self, index: int) -> PloxToken:
+        type, lexeme = TOKEN_TYPES[self.types[index]], self.lexeme(index)
+        literal = None
+        if type is TT.STRING: literal = lexeme[1:-1]
+        elif type is TT.NUMBER: literal = float(lexeme)
+        return PloxToken(type, lexeme, literal, self.lines[index])
+
+
+class ArrayScanner(RegexScanner):
+    def scanArrays(self) -> TokenArrays:
+        tokens = TokenArrays(self.source)
+        types, starts, lengths, lines = tokens.types, tokens.starts, tokens.lengths, tokens.lines
+        for type, start, end, line in self.spans():
+            types.append(type.value)
+            starts.append(start)
+            lengths.append(end - start)
+            lines.append(line)
+        return tokens
+
+    def scanTokens(self) -> List[PloxToken]:
+        tokens = self.scanArrays()
+        self.tokens.extend(tokens.token(index) for index in range(len(tokens)))
+        return self.tokens
@@ -0,0 +1,285 @@
+import pickle
+import subprocess
+import sys
+from os import path
+
+import pytest
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+PLOX = path.join(ROOT, "plox.py")
+ENGINES = ["tree", "closure", "vm"]
+ENGINE_FLAGS = [f"--engine={engine}" for engine in ENGINES] + ["--compile-py"]
+
+sys.path.insert(0, ROOT)
+
+from Expr import Literal, Add, Less
+from interpreter import Interpreter
+from quickening import AddNumbers, ConcatStrings, LessNumbers, RESPECIALIZE_LIMIT
+from scanner import RegexScanner
+from plox_parser import PloxParser
+from resolver import Resolver
+from optimizer import Optimizer
+from plox import ENGINES as ENGINE_CLASSES
+from py_runtime import PyInterpreter
+
+
+def fail(*details) -> None:
+    raise AssertionError(details)
+
+
+def run(tmp_path, source: str, *flags: str) -> str:
+    """What plox.py prints running {source} as a script, stdout then stderr."""
+    script = tmp_path / "script.lox"
+    script.write_text(source)
+    result = subprocess.run([sys.executable, PLOX, str(script), *flags], capture_output=True, text=True)
+    return result.stdout + result.stderr
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_shadowed_locals_and_else_branches(tmp_path, engine):
+    source = """
+        { var a = 1; { var a = 2; print a; } print a; }
+        fun f(x) { if (x) print "t"; else { var y = 3; print y; } }
+        f(false); f(true);
+    """
+    assert run(tmp_path, source, f"--engine={engine}") == "2\n1\n3\nt\n"
+
+
+@pytest.mark.parametrize("flag", ENGINE_FLAGS)
+def test_set_on_non_instance_is_reported_before_the_value(tmp_path, flag):
+    report = run(tmp_path, "var x = 3;\nx.foo = undefinedVar;\n", flag)
+    assert "Only instances have fields" in report
+    assert "undefinedVar" not in report
+
+
+@pytest.mark.parametrize("flag", ENGINE_FLAGS)
+def test_struct_labels(tmp_path, flag):
+    source = "class A { mk() { return A; } }\nvar a = A();\nprint struct(a.mk());\nprint struct(a);\n"
+    labels = [line for line in run(tmp_path, source, flag).splitlines() if line.startswith("INPUT")]
+    assert labels == ["INPUT {EXPRESSION}:", "INPUT {a}:"]
+
+
+@pytest.mark.parametrize("flag", ENGINE_FLAGS)
+def test_io_natives(tmp_path, flag):
+    script = tmp_path / "script.lox"
+    script.write_text('print chr(getc()) + chr(getc());\nprint getc();\nprint_error("oops");\nexit(3);\nprint "after";\n')
+    result = subprocess.run([sys.executable, PLOX, str(script), flag], input="hi", capture_output=True, text=True)
+    assert (result.stdout, result.stderr, result.returncode) == ("hi\n-1\n", "oops\n", 3)
+
+
+@pytest.mark.parametrize("flag", ENGINE_FLAGS)
+def test_native_argument_errors(tmp_path, flag):
+    report = run(tmp_path, 'var c = "x";\nprint chr(c);\n', flag)
+    assert report == "RUNTIME ERROR [at line 2]:\n\t argument must be a character code\n"
+    assert run(tmp_path, "exit(nil);\n", flag) == "RUNTIME ERROR:\n\t argument must be a number\n"
+    assert run(tmp_path, "var s = 1;\nexit(\ns == 1);\n", flag).startswith("RUNTIME ERROR [at line 3]:")
+
+
+def test_optimize_leaves_unfoldable_operators_to_runtime(tmp_path):
+    source = 'print "before";\nif (false) print 1 + nil;\nprint 1 - 2 * 3;\nprint 1 / 0;\n'
+    assert run(tmp_path, source, "-O") == "before\n-5\nRUNTIME ERROR [at line 4]:\n\t Tried dividing by zero\n"
+
+
+def test_lazy_optimize_leaves_bodies_unparsed(tmp_path):
+    source = "fun never() { print ; }\nfun f() { return 1 + 2; }\nprint f();\n"
+    assert run(tmp_path, source, "--lazy", "-O") == "3\n"
+
+
+def test_lazy_bodies_are_optimized_when_parsed():
+    source = "fun f() { return 1 + 2; }"
+    statements = PloxParser(RegexScanner(source, fail).tokenStream(), fail, lazy=True).parse()
+    Resolver(fail).resolve(statements)
+    Optimizer().optimize(statements)
+    function = statements[0].function
+    assert function.deferred()
+    value = function.body[0].value
+    assert isinstance(value, Literal) and value.value == 3
+
+
+def test_inline_caches_are_not_pickled():
+    statements = PloxParser(RegexScanner("a.b; a.c = 1; a.m();", fail).tokenStream(), fail).parse()
+    sites = [statement.expression for statement in statements]
+    for site in sites:
+        site.cache.shape = site.cache.klass = object()
+        assert "cache" not in site.__getstate__()
+    for site, loaded in zip(sites, pickle.loads(pickle.dumps(sites, pickle.HIGHEST_PROTOCOL))):
+        assert type(loaded) is type(site) and loaded.name.lexeme == site.name.lexeme
+        assert loaded.cache.shape is None and loaded.cache.klass is None
+
+
+@pytest.mark.parametrize("flag", ENGINE_FLAGS)
+def test_closures_capture_loop_variables(tmp_path, flag):
+    source = """
+        var a; var b;
+        for (var i = 0; i < 2; i = i + 1) { var j = i; fun f() { return j; } if (i == 0) a = f; else b = f; }
+        print a(); print b();
+        var c; var d;
+        for (var i = 0; i < 2; i = i + 1) { fun g() { return i; } if (i == 0) c = g; else d = g; }
+        print c(); print d();
+        var k = 0; var e;
+        while (k < 3) { var m = k * 10; k = k + 1; if (k == 2) { fun h() { return m; } e = h; } }
+        print e();
+    """
+    # each body run gets its own {j} and {m}; the loop variable {i} is shared
+    assert run(tmp_path, source, flag) == "0\n1\n2\n2\n10\n"
+
+
+@pytest.mark.parametrize("flag", ENGINE_FLAGS)
+def test_shadowing(tmp_path, flag):
+    source = """
+        var a = "global";
+        { var a = "outer"; { var a = "inner"; print a; } print a; }
+        print a;
+        { fun show() { print a; } show(); var a = "block"; show(); print a; }
+        fun p(a) { print a; { var a = "local"; print a; } print a; }
+        p("param");
+        { var x = 1; { var y = x + 1; var x = y + 1; print x; } print x; }
+    """
+    expected = ["inner", "outer", "global", "global", "global", "block", "param", "local", "param", "3", "1"]
+    assert run(tmp_path, source, flag).splitlines() == expected
+
+
+@pytest.mark.parametrize("flag", ENGINE_FLAGS)
+def test_globals_and_locals(tmp_path, flag):
+    source = """
+        fun early() { return later; }
+        var later = "defined after";
+        print early();
+        var g = 1;
+        fun bump() { g = g + 1; var g = 100; return g; }
+        print bump(); print g;
+        { var s = 1; print s; } { var t = 2; print t; }
+        fun counter() { var n = 0; fun inc() { n = n + 1; return n; } return inc; }
+        var c1 = counter(); var c2 = counter(); c1(); print c1(); print c2();
+    """
+    expected = ["defined after", "100", "2", "1", "2", "2", "1"]
+    assert run(tmp_path, source, flag).splitlines() == expected
+
+
+@pytest.mark.parametrize("engine", list(ENGINE_CLASSES.values()) + [PyInterpreter])
+def test_repl_redefinitions(capsys, engine):
+    # each line is resolved on its own, as the REPL does, against globals
+    # that earlier lines defined
+    lines = ["var a = 1;", "fun f() { return a; }", "var a = 2;", "print f();",
+             "fun f() { return a + 10; }", "print f();",
+             "fun g() { return h(); }", "fun h() { return \"h\"; }", "print g();",
+             "a;", "var a = \"again\"; print a;", "{ var a = 5; print a; }", "print a;"]
+    interpreter = engine(fail, repl=True)
+    for line in lines:
+        statements = PloxParser(RegexScanner(line, fail).tokenStream(), fail).parse()
+        Resolver(fail).resolve(statements)
+        interpreter.interpret(statements)
+    assert capsys.readouterr().out.splitlines() == ["2", "12", "h", "2", "again", "5", "again"]
+
+
+def test_quickened_operators_deoptimize(capsys):
+    source = "fun add(a, b) { return a + b; }\nfun less(a, b) { return a < b; }"
+    statements = PloxParser(RegexScanner(source, fail).tokenStream(), fail).parse()
+    Resolver(fail).resolve(statements)
+    interpreter = Interpreter(fail)
+    interpreter.interpret(statements)
+    add, less = interpreter.globals.values["add"], interpreter.globals.values["less"]
+    plus = add.declaration.body[0].value
+    compare = less.declaration.body[0].value
+
+    assert add.call(interpreter, [{"expr": None, "value": 1.0}, {"expr": None, "value": 2.0}]) == 3.0
+    assert type(plus) is AddNumbers
+    assert add.call(interpreter, [{"expr": None, "value": "a"}, {"expr": None, "value": "b"}]) == "ab"
+    assert type(plus) is Add and interpreter.guard_failures[plus] == 1
+    assert add.call(interpreter, [{"expr": None, "value": "c"}, {"expr": None, "value": "d"}]) == "cd"
+    assert type(plus) is ConcatStrings
+    assert add.call(interpreter, [{"expr": None, "value": 1.0}, {"expr": None, "value": "x"}]) == "1x"
+    assert type(plus) is Add and interpreter.guard_failures[plus] == 2
+    # a site that keeps switching types stops being specialized
+    for _ in range(RESPECIALIZE_LIMIT):
+        add.call(interpreter, [{"expr": None, "value": 1.0}, {"expr": None, "value": 2.0}])
+        add.call(interpreter, [{"expr": None, "value": "a"}, {"expr": None, "value": "b"}])
+    assert interpreter.guard_failures[plus] == RESPECIALIZE_LIMIT
+    assert add.call(interpreter, [{"expr": None, "value": 1.0}, {"expr": None, "value": 2.0}]) == 3.0
+    assert type(plus) is Add
+
+    assert less.call(interpreter, [{"expr": None, "value": 1.0}, {"expr": None, "value": 2.0}]) is True
+    assert type(compare) is LessNumbers
+    assert less.call(interpreter, [{"expr": None, "value": "b"}, {"expr": None, "value": 2.0}]) is False
+    assert type(compare) is Less and interpreter.guard_failures[compare] == 1
+
+
+def test_program_cache_follows_source_edits(tmp_path):
+    assert run(tmp_path, 'print "one";', "--startup-stats").endswith("(parsed)\n")
+    assert run(tmp_path, 'print "one";', "--startup-stats").endswith("(loaded from cache)\n")
+    report = run(tmp_path, 'print "two";', "--startup-stats")
+    assert report.startswith("two\n") and report.endswith("(parsed)\n")
+
+
+@pytest.mark.parametrize("damage", ["truncate", "flip", "empty"])
+def test_program_cache_ignores_damaged_entries(tmp_path, damage):
+    source = "class A { init() { this.v = 1; } }\nfun f(n) { return n + A().v; }\nprint f(41);\n"
+    run(tmp_path, source)
+    entry = tmp_path / "__ploxcache__" / "script.ploxc"
+    data = bytearray(entry.read_bytes())
+    if damage == "truncate":
+        del data[len(data) // 2:]
+    elif damage == "flip":
+        data[-20] ^= 0xff
+    else:
+        data.clear()
+    entry.write_bytes(bytes(data))
+    report = run(tmp_path, source, "--startup-stats")
+    assert report.startswith("42\n") and report.endswith("(parsed)\n")
+    # and the entry is written again
+    assert run(tmp_path, source, "--startup-stats").endswith("(loaded from cache)\n")
+
+
+TAIL_CALLS = """
+    class A { init() { this.v = 7; } get() { return this.v; } go() { return this.get(); } }
+    print A().go();
+    fun sum(n, acc) { if (n == 0) return acc; return sum(n - 1, acc + n); }
+    print sum(20000, 0);
+"""
+
+
+def test_compile_py_tail_calls(tmp_path):
+    assert run(tmp_path, TAIL_CALLS, "--compile-py") == "7\n200010000\n"
+
+
+def test_compile_py_long_chains(tmp_path):
+    terms = " + ".join(["a"] * 100)
+    source = (f"var a = 1; print {terms}; print \"s\" + {terms};\n"
+              f"var i = 0; while ({' + '.join(['i'] * 100)} < 200) i = i + 1; print i;\n"
+              f"print {' or '.join(['nil'] * 100)}; print {' and '.join(['true'] * 100)};\n")
+    expected = "100\ns" + "1" * 100 + "\n2\nnil\ntrue\n"
+    assert run(tmp_path, source) == expected
+    assert run(tmp_path, source, "--compile-py") == expected
+
+
+def test_compile_py_deeply_nested_loops(tmp_path):
+    source = "".join(f"var i{k} = 0; while (i{k} < 1) {{ i{k} = i{k} + 1; " for k in range(25))
+    source += 'print "deep";' + "}" * 25
+    assert run(tmp_path, source, "--compile-py") == "deep\n"
+
+
+def test_profile_tail_calls(tmp_path):
+    assert run(tmp_path, TAIL_CALLS, "--profile").startswith("7\n200010000\n")
+
+
+def test_mem_stats_tail_calls(tmp_path):
+    report = run(tmp_path, TAIL_CALLS, "--mem-stats")
+    assert report.startswith("7\n200010000\n")
+    assert "RecursionError" not in report
+
+
+def test_profile_lines_of_statements_without_tokens(tmp_path):
+    report = run(tmp_path, 'print "x";\nvar i = 0;\nwhile (true) {\n  i = i + 1;\n  if (i > 2) break;\n}\n', "--profile")
+    assert '1: print "x";' in report
+    assert "3: while (true) {" in report
+    assert " 0: " not in report
+
+
+def test_coverage_skips_method_declarations(tmp_path):
+    script = tmp_path / "script.lox"
+    script.write_text("class A {\n  f() {\n    print 1;\n  }\n}\nprint A;\n")
+    result = subprocess.run([sys.executable, path.join(ROOT, "tools", "coverage.py"), str(script)],
+                            capture_output=True, text=True)
+    assert "#####:     2:" not in result.stdout
+    assert "#####:     3:" in result.stdout
+    assert "2 of 3 statement lines ran" in result.stdout
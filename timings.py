@@ -0,0 +1,98 @@
+import json
+from sys import platform
+from collections import Counter
+from time import perf_counter, process_time
+from typing import Dict, List, TextIO
+
+from Expr import *
+from Stmt import *
+from lazy_function import LazyFuncExpr
+from quickening import fields
+
+try:
+    from resource import getrusage, RUSAGE_SELF
+except ImportError:
+    getrusage = None
+
+
+def peak_rss() -> float | None:
+    """The process's peak resident memory so far in KiB, where the platform reports it."""
+    if getrusage is None:
+        return None
+    peak = getrusage(RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if platform == "darwin" else peak
+
+
+COUNTS = ["tokens", "nodes", "local declarations", "global declarations", "local references", "global references"]
+
+
+def census(statements: List[Stmt]) -> Counter:
+    """Syntax tree nodes, and how the resolver placed variable references
+    and declarations. Bodies of lazily parsed functions that haven't been
+    parsed yet aren't counted."""
+    counts = Counter()
+    stack : list = list(statements)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        if not isinstance(node, (Expr, Stmt)):
+            continue
+        counts["nodes"] += 1
+        if isinstance(node, (Variable, Assign)):
+            counts["global references" if node.depth is None else "local references"] += 1
+        elif isinstance(node, (This, Parent)):
+            counts["local references"] += 1
+        elif isinstance(node, (Var, Function, ClassStmt)):
+            counts["global declarations" if node.slot is None else "local declarations"] += 1
+        if isinstance(node, FuncExpr):
+            if not (isinstance(node, LazyFuncExpr) and node.deferred()):
+                stack.append(node.body)
+            continue
+        for name in fields(node):
+            stack.append(getattr(node, name))
+    return counts
+
+
+class Timings:
+    """Wall time, CPU time and memory of each phase of a run, with token,
+    node and variable counts. Memory is the process's peak resident size
+    when the phase finished and how much the phase raised it: tracing
+    allocations would slow the phases down several times over."""
+    def __init__(self) -> None:
+        self.phases : Dict[str, Dict[str, float]] = dict()
+        self.counts : Counter = Counter()
+
+    def measure(self, phase: str, action, *args):
+        rss = peak_rss()
+        wall, cpu = perf_counter(), process_time()
+        try:
+            return action(*args)
+        finally:
+            wall, cpu = perf_counter() - wall, process_time() - cpu
+            stats = self.phases[phase] = {"wall_ms": wall * 1000, "cpu_ms": cpu * 1000}
+            if rss is not None:
+                stats["peak_rss_kib"] = peak_rss()
+                stats["peak_rss_growth_kib"] = stats["peak_rss_kib"] - rss
+
+    def count(self, statements: List[Stmt]) -> None:
+        self.counts.update(census(statements))
+
+    def report(self, out: TextIO, as_json: bool = False) -> None:
+        if as_json:
+            counts = {name: self.counts[name] for name in COUNTS if name in self.counts}
+            json.dump({"phases": self.phases, "counts": counts}, out, indent=2)
+            print(file=out)
+            return
+        print(f"{'phase':>12} {'wall ms':>10} {'cpu ms':>10} {'peak RSS KiB':>13} {'growth':>8}", file=out)
+        for phase, stats in self.phases.items():
+            memory = ""
+            if "peak_rss_kib" in stats:
+                memory = f" {stats['peak_rss_kib']:>13.0f} {stats['peak_rss_growth_kib']:>+8.0f}"
+            print(f"{phase:>12} {stats['wall_ms']:>10.2f} {stats['cpu_ms']:>10.2f}{memory}", file=out)
+        print(f"{'total':>12} {sum(stats['wall_ms'] for stats in self.phases.values()):>10.2f} "
+              f"{sum(stats['cpu_ms'] for stats in self.phases.values()):>10.2f}", file=out)
+        for name in COUNTS:
+            if name in self.counts:
+                print(f"{name:>20}: {self.counts[name]}", file=out)
@@ -0,0 +1,62 @@
+import argparse
+import sys
+from os import path
+from collections import Counter
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from Expr import Expr
+from Stmt import Stmt
+from plox_token import PloxToken
+from scanner import RegexScanner
+from plox_parser import PloxParser
+from resolver import Resolver
+
+
+def footprint(obj: object) -> int:
+    """Bytes held by the object itself, its instance dict included."""
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+def walk(root: object):
+    """Every node and token reachable from the tree, once each."""
+    seen, stack = set(), [root]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, list):
+            stack.extend(obj)
+            continue
+        if not isinstance(obj, (Expr, Stmt, PloxToken)) or id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        yield obj
+        if isinstance(obj, PloxToken):
+            continue
+        for name in vars(obj) if hasattr(obj, "__dict__") else obj.__slots__:
+            stack.append(getattr(obj, name))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="bytes per syntax tree node and token of a resolved program")
+    parser.add_argument("file", nargs="?", default=path.join(path.dirname(path.abspath(__file__)), "loxlox.lox"))
+    args = parser.parse_args()
+    with open(args.file) as f:
+        source = f.read()
+    statements = PloxParser(RegexScanner(source, print).tokenStream(), print).parse()
+    Resolver(print).resolve(statements)
+
+    counts, sizes = Counter(), Counter()
+    for obj in walk(statements):
+        kind = type(obj).__name__
+        counts[kind] += 1
+        sizes[kind] += footprint(obj)
+    lexemes = {id(obj.lexeme) for obj in walk(statements) if isinstance(obj, PloxToken)}
+
+    print(f"{'class':>14} {'count':>8} {'bytes/node':>11} {'total':>10}")
+    for kind, count in counts.most_common():
+        print(f"{kind:>14} {count:>8} {sizes[kind] / count:>11.1f} {sizes[kind]:>10}")
+    total = sum(sizes.values())
+    print(f"{'all':>14} {sum(counts.values()):>8} {total / sum(counts.values()):>11.1f} {total:>10}")
+    print(f"distinct lexeme objects: {len(lexemes)} for {counts['PloxToken']} tokens")
@@ -0,0 +1,261 @@
+import argparse
+import io
+import json
+import platform
+import sys
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from hashlib import sha256
+from os import path
+from statistics import mean, median, stdev
+from time import perf_counter
+
+HERE = path.dirname(path.abspath(__file__))
+sys.path.insert(0, path.dirname(path.dirname(HERE)))
+sys.setrecursionlimit(10_000)
+
+from error_types import ParserError
+from scanner import ArrayScanner
+from plox_parser import PloxParser, ArrayParser
+from resolver import Resolver
+from optimizer import Optimizer
+from py_runtime import PyInterpreter
+from plox import SCANNERS, ENGINES
+
+# name -> (script, file fed to the script's standard input)
+BENCHMARKS = {
+    "fib": ("fib.lox", None),
+    "loops": ("loops.lox", None),
+    "strings": ("strings.lox", None),
+    "lists": ("lists.lox", None),
+    "classes": ("classes.lox", None),
+    "inheritance": ("inheritance.lox", None),
+    "closures": ("closures.lox", None),
+    "loxlox": (path.join("..", "loxlox.lox"), "loxlox_sample.lox"),
+}
+
+PHASES = ["scan", "parse", "resolve", "optimize", "execute"]
+# |t| of Welch's test above which a difference in means counts as real
+T_CRITICAL = 2.0
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+class Run:
+    """One run of a script through the front end and an engine, timing
+    each phase. {trace} also records the peak traced allocation per phase."""
+    def __init__(self, options: argparse.Namespace, source: str, stdin: str | None, trace: bool = False) -> None:
+        self.options = options
+        self.source = source
+        self.stdin = stdin
+        self.trace = trace
+        self.errors : list = []
+        self.times : dict = dict()
+        self.peaks : dict = dict()
+        self.output = ""
+
+    def error(self, *args) -> None:
+        self.errors.append(" ".join(str(arg) for arg in args))
+
+    def phase(self, name: str, action, *args):
+        if self.trace: tracemalloc.reset_peak()
+        start = perf_counter()
+        result = action(*args)
+        self.times[name] = perf_counter() - start
+        if self.trace: self.peaks[name] = tracemalloc.get_traced_memory()[1]
+        if self.errors:
+            raise BenchmarkError(f"{name}: {self.errors[0]}")
+        return result
+
+    def __call__(self) -> "Run":
+        options = self.options
+        scanner = SCANNERS[options.scanner](self.source, self.error)
+        if isinstance(scanner, ArrayScanner):
+            tokens = self.phase("scan", scanner.scanArrays)
+            parser = ArrayParser(tokens, self.error, options.lazy)
+        else:
+            tokens = self.phase("scan", lambda: list(scanner.tokenStream()))
+            parser = PloxParser(tokens, self.error, options.lazy)
+        statements = self.phase("parse", parser.parse)
+        self.phase("resolve", Resolver(self.error).resolve, statements)
+        if options.optimize:
+            statements = self.phase("optimize", Optimizer().optimize, statements)
+        if options.compile_py:
+            interpreter = PyInterpreter(self.error)
+        else:
+            interpreter = ENGINES[options.engine](self.error)
+
+        output, stdin = io.StringIO(), sys.stdin
+        sys.stdin = io.StringIO(self.stdin or "")
+        try:
+            with redirect_stdout(output):
+                self.phase("execute", interpreter.interpret, statements)
+        except SystemExit as err:
+            raise BenchmarkError(f"execute: exited with {err.code}")
+        except ParserError:
+            raise BenchmarkError(f"execute: {self.errors[0] if self.errors else 'lazily parsed body failed'}")
+        finally:
+            sys.stdin = stdin
+        self.output = output.getvalue()
+        return self
+
+
+def summarize(samples: list) -> dict:
+    return {
+        "samples": samples,
+        "mean": mean(samples),
+        "median": median(samples),
+        "min": min(samples),
+        "stdev": stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+def bench(name: str, options: argparse.Namespace) -> dict:
+    script, stdin = BENCHMARKS[name]
+    with open(path.join(HERE, script)) as f:
+        source = f.read()
+    if stdin:
+        with open(path.join(HERE, stdin)) as f:
+            stdin = f.read()
+
+    runs = []
+    for i in range(options.warmup + options.iterations):
+        run = Run(options, source, stdin)()
+        if i >= options.warmup: runs.append(run)
+    tracemalloc.start()
+    try:
+        traced = Run(options, source, stdin, trace=True)()
+    finally:
+        tracemalloc.stop()
+
+    phases = [phase for phase in PHASES if phase in runs[0].times]
+    totals = [sum(run.times.values()) for run in runs]
+    return {
+        "output_sha256": sha256(runs[0].output.encode()).hexdigest(),
+        "iterations": len(runs),
+        "phases": {phase: summarize([run.times[phase] for run in runs]) for phase in phases},
+        "total": summarize(totals),
+        "iterations_per_sec": 1 / mean(totals),
+        "peak_memory": dict(traced.peaks, total=max(traced.peaks.values())),
+    }
+
+def run(options: argparse.Namespace) -> int:
+    names = options.benchmarks or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"unknown benchmark {{{name}}}, expected one of: {', '.join(BENCHMARKS)}", file=sys.stderr)
+            return 2
+    results = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "engine": "py" if options.compile_py else options.engine,
+            "scanner": options.scanner,
+            "optimize": options.optimize,
+            "lazy": options.lazy,
+        },
+        "benchmarks": dict(),
+    }
+    failed = False
+    print(f"{'benchmark':>12} {'total ms':>10} {'±':>7} {'iter/s':>8} {'peak KiB':>9}   per phase ms", file=sys.stderr)
+    for name in names:
+        try:
+            result = bench(name, options)
+        except BenchmarkError as err:
+            print(f"{name:>12} FAILED {err}", file=sys.stderr)
+            results["benchmarks"][name] = {"error": str(err)}
+            failed = True
+            continue
+        results["benchmarks"][name] = result
+        total = result["total"]
+        phases = " ".join(f"{phase} {stats['mean'] * 1000:.1f}" for phase, stats in result["phases"].items())
+        print(f"{name:>12} {total['mean'] * 1000:>10.1f} {total['stdev'] * 1000:>7.1f} "
+              f"{result['iterations_per_sec']:>8.2f} {result['peak_memory']['total'] / 1024:>9.0f}   {phases}",
+              file=sys.stderr)
+
+    if options.out:
+        with open(options.out, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    return 1 if failed else 0
+
+
+def welch_t(old: list, new: list) -> float:
+    """Welch's t statistic for the difference of the two sample means."""
+    if len(old) < 2 or len(new) < 2:
+        return float("inf")
+    error = (stdev(old) ** 2 / len(old) + stdev(new) ** 2 / len(new)) ** 0.5
+    if error == 0:
+        return float("inf") if mean(old) != mean(new) else 0.0
+    return (mean(new) - mean(old)) / error
+
+def verdict(change: float, significant: bool, words: tuple = ("slower", "faster")) -> str:
+    if not significant:
+        return "~"
+    return words[0] if change > 0 else words[1]
+
+def compare(options: argparse.Namespace) -> int:
+    """Reports the change in every phase, the total and the peak memory of
+    the benchmarks both files have. A change is significant when it is at
+    least {threshold} percent and, for timings, Welch's t clears T_CRITICAL.
+    Exits with 1 when any total time or peak memory regressed."""
+    with open(options.old) as f:
+        old = json.load(f)["benchmarks"]
+    with open(options.new) as f:
+        new = json.load(f)["benchmarks"]
+    threshold = options.threshold / 100
+    regressed = False
+
+    print(f"{'benchmark':>12} {'measure':>14} {'old':>12} {'new':>12} {'change':>8}")
+    for name in [name for name in new if name in old]:
+        if "error" in old[name] or "error" in new[name]:
+            print(f"{name:>12} skipped: {old[name].get('error') or new[name].get('error')}")
+            continue
+        if old[name]["output_sha256"] != new[name]["output_sha256"]:
+            print(f"{name:>12} output differs between the two runs")
+        timings = [(phase, old[name]["phases"][phase], new[name]["phases"][phase])
+                   for phase in PHASES if phase in old[name]["phases"] and phase in new[name]["phases"]]
+        timings.append(("total", old[name]["total"], new[name]["total"]))
+        for measure, before, after in timings:
+            change = (after["mean"] - before["mean"]) / before["mean"] if before["mean"] else 0.0
+            significant = abs(change) >= threshold and abs(welch_t(before["samples"], after["samples"])) >= T_CRITICAL
+            if measure == "total" and significant and change > 0: regressed = True
+            print(f"{name:>12} {measure + ' ms':>14} {before['mean'] * 1000:>12.2f} {after['mean'] * 1000:>12.2f} "
+                  f"{change:>+8.1%} {verdict(change, significant)}")
+        before, after = old[name]["peak_memory"]["total"], new[name]["peak_memory"]["total"]
+        change = (after - before) / before if before else 0.0
+        significant = abs(change) >= threshold
+        if significant and change > 0: regressed = True
+        print(f"{name:>12} {'peak KiB':>14} {before / 1024:>12.0f} {after / 1024:>12.0f} "
+              f"{change:>+8.1%} {verdict(change, significant, ('more', 'less'))}")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="run the Lox benchmark suite or compare two of its result files")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="time the benchmarks and write the results as JSON")
+    run_parser.add_argument("benchmarks", nargs="*", help=f"any of: {', '.join(BENCHMARKS)} (default: all)")
+    run_parser.add_argument("-n", "--iterations", type=int, default=5, help="timed runs of each benchmark")
+    run_parser.add_argument("--warmup", type=int, default=1, help="untimed runs before the timed ones")
+    run_parser.add_argument("-o", "--out", metavar="FILE", help="write the JSON results to FILE instead of stdout")
+    run_parser.add_argument("--engine", choices=ENGINES.keys(), default="tree")
+    run_parser.add_argument("--scanner", choices=SCANNERS.keys(), default="regex")
+    run_parser.add_argument("-O", dest="optimize", action="store_true", help="run the optimizer pass")
+    run_parser.add_argument("--compile-py", action="store_true", help="transpile to Python instead of using --engine")
+    run_parser.add_argument("--lazy", action="store_true", help="parse function bodies on their first call")
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=5.0,
+                                help="smallest change in percent that is reported as significant")
+
+    options = parser.parse_args()
+    exit(run(options) if options.command == "run" else compare(options))
@@ -0,0 +1,66 @@
+import argparse
+import sys
+from os import path
+from collections import Counter
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from Stmt import Stmt, Block, Empty, ClassStmt
+from scanner import RegexScanner
+from plox_parser import PloxParser
+from resolver import Resolver
+from interpreter import Interpreter
+from profiler import first_line
+from quickening import fields
+
+
+def statement_lines(node: object, lines: set) -> set:
+    """Lines of every statement in the tree, blocks and method declarations
+    excepted: a class declaration never runs its methods' Function statements."""
+    if isinstance(node, list):
+        for item in node:
+            statement_lines(item, lines)
+    elif isinstance(node, ClassStmt):
+        lines.add(first_line(node))
+        for method in node.methods:
+            statement_lines(method.function, lines)
+    elif hasattr(node, "__slots__") and hasattr(node, "accept"):
+        if isinstance(node, Stmt) and type(node) not in (Block, Empty):
+            lines.add(first_line(node))
+        for name in fields(node):
+            statement_lines(getattr(node, name), lines)
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="run a Lox script and print its source with how often each "
+                                                 "statement line ran; ##### marks lines that never did")
+    parser.add_argument("file")
+    args = parser.parse_args()
+    with open(args.file) as f:
+        source = f.read()
+
+    def error(*details) -> None:
+        print(*details, file=sys.stderr)
+        exit(65)
+    statements = PloxParser(RegexScanner(source, error).tokenStream(), error).parse()
+    Resolver(error).resolve(statements)
+
+    def runtime_error(err) -> None:
+        where = f" [at line {err.token.line}]" if err.token else ""
+        print(f"RUNTIME ERROR{where}: {err}", file=sys.stderr)
+    interpreter = Interpreter(runtime_error)
+    hits = Counter()
+    interpreter.add_hook("line", lambda line, statement: hits.update((line,)))
+    output, sys.stdout = sys.stdout, sys.stderr
+    try:
+        interpreter.interpret(statements)
+    finally:
+        sys.stdout = output
+
+    executable = statement_lines(statements, set())
+    for number, text in enumerate(source.splitlines(), 1):
+        count = f"{hits[number]}" if hits[number] else "#####" if number in executable else "-"
+        print(f"{count:>9}: {number:>5}: {text}")
+    covered = len(executable & hits.keys())
+    print(f"\n{covered} of {len(executable)} statement lines ran ({covered / max(len(executable), 1):.1%})")
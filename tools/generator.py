@@ -1,46 +1,85 @@
+from __future__ import annotations
 import argparse
 
-def define_ast(output_dir:str, name:str, types:dict) -> None:
+def define_ast(output_dir:str, name:str, types:dict, operators: dict | None = None) -> None:
+    operators = operators or {}
     path = output_dir + "/" + name + ".py"
     with open(path, "w") as f:
         f.write("from typing import List\n\n")
         f.write("from plox_token import PloxToken\n")
+        if name == "Expr":
+            f.write("from inline_cache import InlineCache\n")
         if name != "Expr":
             f.write("from Expr import Expr\n\n")
         f.write(f"\nclass {name}:\n")
+        f.write("\t__slots__ = ()\n\n")
         f.write("\tdef accept(self, visitor):\n")
         f.write("\t\tpass\n\n\n")
 
         for type, fields in types.items():
             define_type(f, name, type, fields)
+        for operator, base in operators.items():
+            define_operator(f, operator, base)
         arg = "expr" if name == "Expr" else "stmt"
-        define_visitor(f, name, types, arg)
+        define_visitor(f, name, types, arg, operators)
 
         f.close()
 
-def define_visitor(file, basename:str, types: dict, arg: str) -> None:
+def define_visitor(file, basename:str, types: dict, arg: str, operators: dict) -> None:
     file.write(f"class {basename}Visitor:\n")
     for type in types.keys():
         file.write(f"\tdef visit{type}(self, {arg}: {type}):\n")
         file.write("\t\traise NotImplementedError\n\n")
+    # visitors that don't tell operators apart handle them as their base node
+    for operator, base in operators.items():
+        file.write(f"\tdef visit{operator}(self, {arg}: {operator}):\n")
+        file.write(f"\t\treturn self.visit{base}({arg})\n\n")
+
+def define_operator(file, classname: str, base: str) -> None:
+    # one class per operator, so evaluating a node dispatches on its class
+    # instead of its operator token
+    file.write(f"class {classname}({base}):\n")
+    file.write("\t__slots__ = ()\n\n")
+    file.write(f"\tdef accept(self, visitor):\n")
+    file.write(f"\t\treturn visitor.visit{classname}(self)\n")
+    file.write(f"\n\n")
 
 def define_type(file, basename: str, classname:str, fields: list) -> None:
     file.write(f"class {classname}({basename}):\n")
+    # no per-node __dict__: smaller nodes and faster attribute access
+    slots = "".join(f"\"{field['name']}\", " for field in fields)
+    file.write(f"\t__slots__ = ({slots.rstrip()})\n\n")
     init_args = ""
     for field in fields:
+        if "default" in field: continue
         init_args += ", " + field['name'] + ": " + field["type"]
     file.write(f"\tdef __init__(self{init_args}):\n")
     #file.write(f"\t\tprint(\"generating {basename} {classname}\")\n")
     if fields:
         for field in fields:
             temp_name = field['name']
-            file.write(f"\t\tself.{temp_name} = {temp_name}\n")
+            # annotation fields are filled in by later passes (e.g. the Resolver)
+            value = field.get("default", temp_name)
+            file.write(f"\t\tself.{temp_name} = {value}\n")
     else:
         file.write(f"\t\tpass\n")
 
     file.write(f"\n\tdef accept(self, visitor):\n")
     file.write(f"\t\treturn visitor.visit{classname}(self)\n")
 
+    # runtime state kept on a node isn't pickled with the tree, and starts
+    # out fresh when the tree is loaded
+    transient = [field for field in fields if field.get("transient")]
+    if transient:
+        kept = "".join(f"\"{field['name']}\", " for field in fields if not field.get("transient"))
+        file.write(f"\n\tdef __getstate__(self):\n")
+        file.write(f"\t\treturn {{name: getattr(self, name) for name in ({kept.rstrip()})}}\n")
+        file.write(f"\n\tdef __setstate__(self, state):\n")
+        file.write(f"\t\tfor name, value in state.items():\n")
+        file.write(f"\t\t\tsetattr(self, name, value)\n")
+        for field in transient:
+            file.write(f"\t\tself.{field['name']} = {field['default']}\n")
+
     file.write(f"\n\n")
 
 if __name__ == "__main__":
@@ -56,6 +95,8 @@ if __name__ == "__main__":
         "Assign": [
             {"type": "PloxToken", "name": "name"},
             {"type": "Expr", "name": "value"},
+            {"type": "int", "name": "depth", "default": "None"},
+            {"type": "int", "name": "slot", "default": "None"},
         ],
         "Binary": [
             {"type": "Expr", "name": "left"},
@@ -89,21 +130,34 @@ if __name__ == "__main__":
             {"type": "PloxToken", "name": "paren"},
             {"type": "List[Expr]", "name": "arguments"},
         ],
+        "Invoke": [
+            {"type": "Expr", "name": "obj"},
+            {"type": "PloxToken", "name": "name"},
+            {"type": "PloxToken", "name": "paren"},
+            {"type": "List[Expr]", "name": "arguments"},
+            {"type": "InlineCache", "name": "cache", "default": "InlineCache()", "transient": True},
+        ],
         "Get": [
             {"type": "Expr", "name": "obj"},
             {"type": "PloxToken", "name": "name"},
+            {"type": "InlineCache", "name": "cache", "default": "InlineCache()", "transient": True},
         ],
         "Set": [
             {"type": "Expr", "name": "obj"},
             {"type": "PloxToken", "name": "name"},
             {"type": "Expr", "name": "value"},
+            {"type": "InlineCache", "name": "cache", "default": "InlineCache()", "transient": True},
         ],
         "Parent": [
             {"type": "PloxToken", "name": "keyword"},
             {"type": "PloxToken", "name": "method"},
+            {"type": "int", "name": "depth", "default": "None"},
+            {"type": "int", "name": "slot", "default": "None"},
         ],
         "This": [
             {"type": "PloxToken", "name": "keyword"},
+            {"type": "int", "name": "depth", "default": "None"},
+            {"type": "int", "name": "slot", "default": "None"},
         ],
         "Conditional": [
             {"type": "Expr", "name": "condition"},
@@ -112,56 +166,86 @@ if __name__ == "__main__":
         ],
         "Variable": [
             {"type": "PloxToken", "name": "name"},
+            {"type": "int", "name": "depth", "default": "None"},
+            {"type": "int", "name": "slot", "default": "None"},
         ],
         "FuncExpr": [
             {"type": "List[PloxToken]", "name": "params"},
             {"type": "list", "name": "body"},
             {"type": "str", "name": "type"},
+            {"type": "int", "name": "size", "default": "0"},
         ],
     }
 
     stmt = {
         "Expression": [
             {"type": "Expr", "name": "expression"},
+            {"type": "int", "name": "line"},
         ],
         "If": [
             {"type": "Expr", "name": "condition"},
             {"type": "Stmt", "name": "thenBranch"},
             {"type": "Stmt", "name": "elseBranch"},
+            {"type": "int", "name": "line"},
         ],
         "While": [
             {"type": "Expr", "name": "condition"},
             {"type": "Stmt", "name": "body"},
+            {"type": "int", "name": "line"},
         ],
         "Print": [
             {"type": "Expr", "name": "expression"},
+            {"type": "int", "name": "line"},
         ],
         "Block": [
             {"type": "List[Stmt]", "name": "statements"},
+            {"type": "int", "name": "size", "default": "0"},
         ],
         "Var": [
             {"type": "PloxToken", "name": "name"},
             {"type": "Expr", "name": "Initializer"},
+            {"type": "int", "name": "slot", "default": "None"},
         ],
         "Function": [
             {"type": "PloxToken", "name": "name"},
             {"type": "Expr", "name": "function"},
+            {"type": "int", "name": "slot", "default": "None"},
         ],
         "Return": [
             {"type": "PloxToken", "name": "keyword"},
             {"type": "Expr", "name": "value"},
+            {"type": "bool", "name": "tail_call", "default": "False"},
         ],
         "Break": [
+            {"type": "int", "name": "line"},
         ],
         "Continue": [
+            {"type": "int", "name": "line"},
         ],
         "ClassStmt": [
             {"type": "PloxToken", "name": "name"},
             {"type": "Expr", "name": "parentclass"},
             {"type": "List[Function]", "name": "methods"},
+            {"type": "int", "name": "slot", "default": "None"},
         ],
         "Empty": [
         ],
     }
-    define_ast(output, "Expr", expr)
+    operators = {
+        "Add": "Binary",
+        "Subtract": "Binary",
+        "Multiply": "Binary",
+        "Divide": "Binary",
+        "Greater": "Binary",
+        "GreaterEqual": "Binary",
+        "Less": "Binary",
+        "LessEqual": "Binary",
+        "Equal": "Binary",
+        "NotEqual": "Binary",
+        "And": "Logical",
+        "Or": "Logical",
+        "Negate": "Unary",
+        "Not": "Unary",
+    }
+    define_ast(output, "Expr", expr, operators)
     define_ast(output, "Stmt", stmt)
\ No newline at end of file
@@ -1,12 +0,0 @@
-class BreakException(Exception):
-    pass
-
-
-class ContinueException(Exception):
-    pass
-
-
-class ReturnException(Exception):
-    def __init__(self, value: object):
-        # super().__init__()
-        self.value = value